@@ -86,12 +86,22 @@ TEMPLATE_LOADERS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'soc.profiling.middleware.RpcStatsMiddleware',
+    'soc.profiling.middleware.ProfilingMiddleware',
 #    'django.middleware.common.CommonMiddleware',
 #    'django.contrib.sessions.middleware.SessionMiddleware',
 #    'django.contrib.auth.middleware.AuthenticationMiddleware',
 #    'django.middleware.doc.XViewMiddleware',
 )
 
+# Fraction of the requests that is profiled, see
+# soc.profiling.middleware.ProfilingMiddleware
+PROFILE_SAMPLE_RATE = 0.001
+
+# Fraction of the requests of which the RPCs are accounted and logged, see
+# soc.profiling.middleware.RpcStatsMiddleware
+RPC_STATS_SAMPLE_RATE = 0.001
+
 ROOT_URLCONF = 'urls'
 
 ROOT_PATH = os.path.dirname(__file__)
@@ -0,0 +1,122 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module contains the in-process cache for dynamically built forms.
+
+Form classes (and the fields they contain) can not be pickled, so unlike
+the other soc.cache modules this one does not use memcache, instead the
+forms are kept in process memory for as long as the instance lives.
+"""
+
+__authors__ = [
+    '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+#: Mapping from a key as constructed by key() to the cached form
+_FORMS = {}
+
+
+def _freeze(value):
+  """Returns a hashable representation of value.
+
+  Lists and tuples are frozen element by element, dicts are frozen into a
+  sorted tuple of their items. Any other value is used as is, which means
+  that form fields and clean methods are compared by identity.
+
+  Raises:
+    TypeError if value (or one of its elements) can not be hashed
+  """
+
+  if isinstance(value, (list, tuple)):
+    return tuple([_freeze(i) for i in value])
+
+  if isinstance(value, dict):
+    items = [(k, _freeze(v)) for k, v in value.iteritems()]
+    items.sort()
+    return tuple(items)
+
+  hash(value)
+  return value
+
+
+def key(kind, *args):
+  """Returns the cache key for a form of the specified kind.
+
+  Args:
+    kind: a string describing what kind of form is cached, for
+      example 'create', 'edit' or 'survey'
+    args: the values the form is built from, e.g. the model, the
+      dynabase, the field overrides or the survey content version
+
+  Returns:
+    The key, or None if any of the args can not be hashed, in
+    which case the form should not be cached.
+  """
+
+  try:
+    return (kind,) + _freeze(args)
+  except TypeError:
+    return None
+
+
+def get(cache_key):
+  """Retrieves the form for the specified key from the cache.
+  """
+
+  if cache_key is None:
+    return None
+
+  return _FORMS.get(cache_key)
+
+
+def put(form, cache_key):
+  """Stores the form under the specified key.
+
+  Args:
+    form: the form to be cached
+    cache_key: the key as returned by key()
+  """
+
+  if cache_key is None:
+    return
+
+  _FORMS[cache_key] = form
+
+
+def flush():
+  """Removes all forms from the cache.
+  """
+
+  _FORMS.clear()
+
+
+def getOrBuild(cache_key, builder, *args, **kwargs):
+  """Returns the cached form for cache_key, building it if needed.
+
+  Args:
+    cache_key: the key as returned by key()
+    builder: the function used to build the form on a cache miss,
+      it is called with args and kwargs
+  """
+
+  form = get(cache_key)
+
+  if form is None:
+    form = builder(*args, **kwargs)
+    put(form, cache_key)
+
+  return form
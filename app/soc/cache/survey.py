@@ -0,0 +1,118 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module contains survey schema caching functions.
+
+A parsed schema is cached per version of its SurveyContent, both in
+process memory and in memcache. Since the version is part of the key
+there is no need to flush the cache when a SurveyContent is modified.
+"""
+
+__authors__ = [
+    '"Daniel Diniz" <ajaksu@gmail.com>',
+  ]
+
+
+from google.appengine.api import memcache
+
+
+#: Mapping from a SurveyContent key to a (version, parsed schema) tuple
+_PARSED = {}
+
+
+def version(survey_content):
+  """Returns the version of the specified SurveyContent.
+  """
+
+  modified = survey_content.modified
+  return modified.isoformat() if modified else ''
+
+
+def key(survey_content):
+  """Returns the memcache key for the parsed schema of survey_content.
+  """
+
+  return 'survey_schema_for_%s_%s' % (survey_content.key(),
+                                      version(survey_content))
+
+
+def get(survey_content):
+  """Retrieves the parsed schema for survey_content from the cache.
+
+  Process memory is tried first, after which memcache is consulted.
+  """
+
+  content_key = survey_content.key()
+  content_version = version(survey_content)
+
+  cached = _PARSED.get(content_key)
+  if cached and cached[0] == content_version:
+    return cached[1], None
+
+  memcache_key = key(survey_content)
+  # pylint: disable-msg=E1101
+  data = memcache.get(memcache_key)
+
+  if data:
+    _PARSED[content_key] = (content_version, data)
+
+  return data, memcache_key
+
+
+def put(data, memcache_key, survey_content):
+  """Sets the parsed schema for survey_content in the cache.
+
+  Args:
+    data: the parsed schema to be cached
+    memcache_key: the key as returned by key()
+  """
+
+  _PARSED[survey_content.key()] = (version(survey_content), data)
+
+  # the data never changes for a version, so it is kept for a day
+  retention = 24*60*60
+  # pylint: disable-msg=E1101
+  memcache.set(memcache_key, data, retention)
+
+
+def flush(survey_content):
+  """Removes the parsed schema for survey_content from the cache.
+  """
+
+  _PARSED.pop(survey_content.key(), None)
+
+  memcache_key = key(survey_content)
+  # pylint: disable-msg=E1101
+  memcache.delete(memcache_key)
+
+
+def getOrParse(survey_content, parser):
+  """Returns the cached parsed schema, parsing it if needed.
+
+  Args:
+    survey_content: a saved SurveyContent entity
+    parser: called with survey_content on a cache miss
+  """
+
+  data, memcache_key = get(survey_content)
+
+  if data:
+    return data
+
+  data = parser(survey_content)
+  put(data, memcache_key or key(survey_content), survey_content)
+
+  return data
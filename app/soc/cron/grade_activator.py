@@ -0,0 +1,131 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cron job handler for activating the grades of a GradingProjectSurvey.
+"""
+
+__authors__ = [
+    '"Lennard de Rijk" <ljvderijk@gmail.com>',
+  ]
+
+
+from google.appengine.ext import db
+
+from django.utils import simplejson
+
+from soc.logic.models.job import logic as job_logic
+from soc.logic.models.student_project import logic as project_logic
+from soc.logic.models.survey import GRADE_UPDATED
+from soc.logic.models.survey import grading_logic
+from soc.models.survey_record_group import SurveyRecordGroup
+
+
+# amount of projects to process before updating, this is also the amount
+# of values used in the IN filter for the SurveyRecordGroups (max 30)
+DEF_PROJECT_STEP_SIZE = 25
+
+
+def activateGrades(job_entity):
+  """Job that activates the grades of a GradingProjectSurvey.
+
+  The projects in the survey's program are walked in key order, for each
+  batch the SurveyRecordGroups are retrieved with one query and all
+  modified entities are stored with a single batch put.
+
+  Args:
+    job_entity: a Job entity with key_data set to
+                [survey, last_completed_project] and text_data set to
+                a JSON dictionary with the outcome counts so far
+  """
+
+  from soc.cron.job import FatalJobError
+
+
+  # retrieve the data we need to continue our work
+  key_data = job_entity.key_data
+  survey_key = key_data[0]
+  survey = grading_logic.getFromKeyName(survey_key.name())
+
+  if not survey:
+    raise FatalJobError('The survey with key %s could not be found' % (
+        survey_key.name()))
+
+  program = grading_logic.getScope(survey)
+
+  if job_entity.text_data:
+    counts = simplejson.loads(job_entity.text_data)
+  else:
+    counts = {}
+
+  project_fields = {'program': program}
+
+  if len(key_data) >= 2:
+    # start where we left off
+    project_fields['__key__ >'] = key_data[1]
+
+  projects = project_logic.getForFields(project_fields,
+                                        limit=DEF_PROJECT_STEP_SIZE)
+
+  while projects:
+    # retrieve the record groups for the entire batch at once
+    groups = SurveyRecordGroup.all().filter('project IN', projects)
+
+    groups_for_project = {}
+    for group in groups:
+      project_key = SurveyRecordGroup.project.get_value_for_datastore(group)
+      groups_for_project.setdefault(project_key, []).append(group)
+
+    to_put = []
+
+    for project in projects:
+      candidates = groups_for_project.get(project.key(), [])
+      record_group = None
+
+      for group in candidates:
+        if group.initial_status == project.status:
+          record_group = group
+          break
+
+      outcome = grading_logic.gradeProject(project, record_group)
+      counts[outcome] = counts.get(outcome, 0) + 1
+
+      if outcome == GRADE_UPDATED:
+        to_put.extend([project, record_group])
+
+    if to_put:
+      db.put(to_put)
+
+    # update our own job
+    last_project_key = projects[-1].key()
+
+    if len(key_data) >= 2:
+      key_data[1] = last_project_key
+    else:
+      key_data.append(last_project_key)
+
+    updated_job_fields = {
+        'key_data': key_data,
+        'text_data': simplejson.dumps(counts),
+        }
+    job_logic.updateEntityProperties(job_entity, updated_job_fields)
+
+    # rinse and repeat
+    project_fields['__key__ >'] = last_project_key
+    projects = project_logic.getForFields(project_fields,
+                                          limit=DEF_PROJECT_STEP_SIZE)
+
+  # we are finished
+  return
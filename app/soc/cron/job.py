@@ -28,9 +28,14 @@ import logging
 from google.appengine.ext import db
 from google.appengine.runtime import DeadlineExceededError
 
+from soc.cron import grade_activator
+from soc.cron import project_indexer
+from soc.cron import search_indexer
 from soc.cron import student_proposal_mailer
+from soc.cron import survey_aggregator
 from soc.cron import unique_user_id_adder
 from soc.models.job import Job
+from soc.modules import callback
 
 
 class Error(Exception):
@@ -73,6 +78,29 @@ class Handler(object):
         unique_user_id_adder.setupUniqueUserIdAdder
     self.tasks['addUniqueUserIds'] = \
         unique_user_id_adder.addUniqueUserIds
+    self.tasks['activateGrades'] = \
+        grade_activator.activateGrades
+    self.tasks['buildSearchIndex'] = \
+        search_indexer.buildSearchIndex
+    self.tasks['updateSearchIndex'] = \
+        search_indexer.updateSearchIndex
+    self.tasks['rebuildSurveyAggregate'] = \
+        survey_aggregator.rebuildSurveyAggregate
+    self.tasks['rebuildProjectIndices'] = \
+        project_indexer.rebuildProjectIndices
+
+  def getTask(self, task_name):
+    """Returns the task that runs the jobs with the specified task_name,
+    or None if there is no such task.
+
+    The tasks of the modules are registered with the core, see
+    soc.modules.core.Core.registerJobTask.
+    """
+
+    if task_name in self.tasks:
+      return self.tasks[task_name]
+
+    return callback.getCore().getJobTasks().get(task_name)
 
   def claimJob(self, job_key):
     """A transaction to claim a job.
@@ -163,13 +191,13 @@ class Handler(object):
         # someone already claimed the job
         return self.ALREADY_CLAIMED
 
-      if job.task_name not in self.tasks:
+      task = self.getTask(job.task_name)
+
+      if not task:
         logging.error("Unknown job %s" % job.task_name)
         db.run_in_transaction(self.abortJob, job_key)
         return self.ABORTED
 
-      task = self.tasks[job.task_name]
-
       # execute the actual job
       task(job)
 
@@ -0,0 +1,95 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cron job handler for rebuilding the project indices of a Program.
+"""
+
+__authors__ = [
+    '"Lennard de Rijk" <ljvderijk@gmail.com>',
+  ]
+
+
+from google.appengine.ext import db
+
+from soc.logic.models.job import logic as job_logic
+from soc.logic.models.project_index import logic as project_index_logic
+from soc.models.project_index import UserProjectIndex
+
+
+# amount of indices to rebuild before updating the job
+DEF_INDEX_STEP_SIZE = 20
+
+
+def rebuildProjectIndices(job_entity):
+  """Job that rebuilds all existing project indices of a program.
+
+  The indices are walked in key order and each is replaced by one built
+  from queries, a project that changes while its index is rebuilt may be
+  missed until the next rebuild.
+
+  Args:
+    job_entity: a Job entity with key_data set to [program, last_index]
+  """
+
+  from soc.cron.job import FatalJobError
+
+
+  key_data = job_entity.key_data
+  program_key = key_data[0]
+
+  if not db.get(program_key):
+    raise FatalJobError('The program with key %s could not be found' % (
+        program_key.name()))
+
+  def getIndices(last_index_key):
+    """Returns the next batch of indices of the program.
+    """
+
+    query = UserProjectIndex.all().filter('program =', program_key)
+
+    if last_index_key:
+      query.filter('__key__ >', last_index_key)
+
+    query.order('__key__')
+    return query.fetch(DEF_INDEX_STEP_SIZE)
+
+  if len(key_data) >= 2:
+    # start where we left off
+    indices = getIndices(key_data[1])
+  else:
+    indices = getIndices(None)
+
+  while indices:
+    for index in indices:
+      user_key = UserProjectIndex.user.get_value_for_datastore(index)
+      project_index_logic.buildIndex(user_key, program_key, replace=True)
+
+    # update our own job
+    last_index_key = indices[-1].key()
+
+    if len(key_data) >= 2:
+      key_data[1] = last_index_key
+    else:
+      key_data.append(last_index_key)
+
+    updated_job_fields = {'key_data': key_data}
+    job_logic.updateEntityProperties(job_entity, updated_job_fields)
+
+    # rinse and repeat
+    indices = getIndices(last_index_key)
+
+  # we are finished
+  return
@@ -0,0 +1,195 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cron job handlers for building and updating the search index.
+"""
+
+__authors__ = [
+    '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+from google.appengine.ext import db
+
+from soc.logic import search
+from soc.logic.models.job import logic as job_logic
+from soc.logic.models.priority_group import logic as priority_logic
+
+
+# amount of entities to index before updating the job
+DEF_ENTITY_STEP_SIZE = 20
+
+# amount of documents whose posting lists are updated together
+DEF_DOCUMENT_STEP_SIZE = 20
+
+
+def startSearchIndexBuild(kind_name):
+  """Starts a job that adds all entities of a kind to the search index.
+
+  No job is started if one is already waiting to be run for the kind.
+
+  Args:
+    kind_name: the name of the datastore kind to index, for example
+               'Organization' or a kind that derives from it
+
+  Returns:
+    The Job entity that will build the index.
+  """
+
+  priority_group = priority_logic.getGroup(priority_logic.SEARCH)
+  job_fields = {
+      'priority_group': priority_group,
+      'task_name': 'buildSearchIndex',
+      'text_data': kind_name,
+      'status': 'waiting',
+      }
+
+  # text_data can not be filtered on, so compare it for each waiting job
+  query_fields = job_fields.copy()
+  del query_fields['text_data']
+
+  for job in job_logic.getForFields(query_fields):
+    if job.text_data == kind_name:
+      return job
+
+  return job_logic.updateOrCreateFromFields(job_fields)
+
+
+def startSearchIndexBuilds():
+  """Starts a job that builds the search index for each known kind that is
+  indexed, including the kinds that derive from an indexed kind.
+
+  Returns:
+    A list with the Job entities that will build the index.
+  """
+
+  # pylint: disable-msg=W0212
+  kind_names = [name for name, model in db._kind_map.iteritems()
+                if search.getIndexedKindForModel(model)]
+
+  return [startSearchIndexBuild(i) for i in sorted(kind_names)]
+
+
+def startSearchIndexUpdate():
+  """Starts a job that updates the posting lists of the search index if
+  there are documents pending and no such job is waiting to be run.
+
+  Returns:
+    The Job entity that will update the index, or None if nothing is
+    pending.
+  """
+
+  if not search.getPendingDocuments(1):
+    return None
+
+  priority_group = priority_logic.getGroup(priority_logic.SEARCH)
+  job_fields = {
+      'priority_group': priority_group,
+      'task_name': 'updateSearchIndex',
+      'status': 'waiting',
+      }
+
+  job = job_logic.getForFields(job_fields, unique=True)
+
+  if job:
+    return job
+
+  return job_logic.updateOrCreateFromFields(job_fields)
+
+
+def updateSearchIndex(job_entity):
+  """Job that updates the posting lists for all pending documents.
+
+  The documents are handled DEF_DOCUMENT_STEP_SIZE at a time, updating
+  documents that are no longer pending is harmless, so the job can safely
+  be restarted.
+
+  Args:
+    job_entity: a Job entity, it carries no data
+  """
+
+  # pylint: disable-msg=W0613
+  documents = search.getPendingDocuments(DEF_DOCUMENT_STEP_SIZE)
+
+  while documents:
+    search.updatePending(documents)
+
+    # rinse and repeat
+    documents = search.getPendingDocuments(DEF_DOCUMENT_STEP_SIZE)
+
+  # we are finished
+  return
+
+
+def buildSearchIndex(job_entity):
+  """Job that adds all entities of a kind to the search index.
+
+  The entities are walked in key order and marked for indexing, entities
+  that are already indexed with their current terms do not cause any
+  writes, so the job can safely be restarted. The posting lists are then
+  updated by the updateSearchIndex job.
+
+  Args:
+    job_entity: a Job entity with text_data set to the kind to index and
+                key_data set to [last_completed_entity]
+  """
+
+  from soc.cron.job import FatalJobError
+
+
+  kind_name = job_entity.text_data
+
+  try:
+    model = db.class_for_kind(kind_name)
+  except db.KindError:
+    raise FatalJobError('The kind %s does not exist' % kind_name)
+
+  if not search.getIndexedKindForModel(model):
+    raise FatalJobError('The kind %s is not indexed' % kind_name)
+
+  key_data = job_entity.key_data
+  query = model.all()
+
+  if key_data:
+    # start where we left off
+    query.filter('__key__ >', key_data[0])
+
+  query.order('__key__')
+  entities = query.fetch(DEF_ENTITY_STEP_SIZE)
+
+  while entities:
+    search.indexEntities(entities)
+
+    # update our own job
+    last_entity_key = entities[-1].key()
+
+    if key_data:
+      key_data[0] = last_entity_key
+    else:
+      key_data.append(last_entity_key)
+
+    updated_job_fields = {'key_data': key_data}
+    job_logic.updateEntityProperties(job_entity, updated_job_fields)
+
+    # rinse and repeat
+    query = model.all().filter('__key__ >', last_entity_key)
+    query.order('__key__')
+    entities = query.fetch(DEF_ENTITY_STEP_SIZE)
+
+  startSearchIndexUpdate()
+
+  # we are finished
+  return
@@ -87,7 +87,7 @@ def setupStudentProposalMailing(job_entity):
     for student in students:
 
       job_query_fields['key_data'] = student.key()
-      mail_job = job_logic.getForFields(job_query_fields, unique=True)
+      mail_job = job_logic.getKeysForFields(job_query_fields, unique=True)
 
       if not mail_job:
         # this student did not receive mail yet
@@ -0,0 +1,150 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cron job handler for recounting the aggregated results of a Survey.
+"""
+
+__authors__ = [
+    '"Daniel Diniz" <ajaksu@gmail.com>',
+  ]
+
+
+from google.appengine.ext import db
+
+from django.utils import simplejson
+
+from soc.logic.models.job import logic as job_logic
+from soc.logic.models.survey_aggregate import logic as aggregate_logic
+
+
+# amount of records to count before updating the job
+DEF_RECORD_STEP_SIZE = 50
+
+
+def rebuildSurveyAggregate(job_entity):
+  """Job that recounts the statistics of a survey from all its records.
+
+  A snapshot of the statistics is taken first, then the records are
+  walked in key order and the statistics counted so far are kept in the
+  job. Once all records have been counted they replace the contents of
+  each shard in the snapshot, changes made to the shards while the
+  records were counted are kept. A record that is stored during the
+  rebuild and has not been walked yet is therefore counted twice, but
+  no change is lost.
+
+  Args:
+    job_entity: a Job entity with key_data set to [survey, last_record]
+                and text_data set to a JSON dictionary with the 'kind' of
+                the records, the 'snapshot' of the statistics, the 'total'
+                and 'questions' counted so far and the 'replaced' shards
+  """
+
+  from soc.cron.job import FatalJobError
+
+
+  key_data = job_entity.key_data
+  survey = db.get(key_data[0])
+
+  if not survey:
+    raise FatalJobError('The survey with key %s could not be found' % (
+        key_data[0]))
+
+  data = simplejson.loads(job_entity.text_data)
+
+  try:
+    model = db.class_for_kind(data['kind'])
+  except db.KindError:
+    raise FatalJobError('The kind %s does not exist' % data['kind'])
+
+  if 'snapshot' not in data:
+    data['snapshot'] = aggregate_logic.getSnapshot(survey)
+    updated_job_fields = {
+        'text_data': simplejson.dumps(data),
+        }
+    job_logic.updateEntityProperties(job_entity, updated_job_fields)
+
+  total = data.get('total', 0)
+  questions = data.get('questions', {})
+
+  def getRecords(last_record_key):
+    """Returns the next batch of records of the survey.
+    """
+
+    query = model.all().filter('survey =', survey)
+
+    if last_record_key:
+      query.filter('__key__ >', last_record_key)
+
+    query.order('__key__')
+    return query.fetch(DEF_RECORD_STEP_SIZE)
+
+  if len(key_data) >= 2:
+    # start where we left off
+    records = getRecords(key_data[1])
+  else:
+    records = getRecords(None)
+
+  while records:
+    for record in records:
+      values = aggregate_logic.getValues(survey, record)
+      delta = aggregate_logic.getDelta(survey, {}, values)
+      # pylint: disable-msg=W0212
+      aggregate_logic._merge(questions, delta)
+      total += 1
+
+    # update our own job
+    last_record_key = records[-1].key()
+
+    if len(key_data) >= 2:
+      key_data[1] = last_record_key
+    else:
+      key_data.append(last_record_key)
+
+    data['total'] = total
+    data['questions'] = questions
+
+    updated_job_fields = {
+        'key_data': key_data,
+        'text_data': simplejson.dumps(data),
+        }
+    job_logic.updateEntityProperties(job_entity, updated_job_fields)
+
+    # rinse and repeat
+    records = getRecords(last_record_key)
+
+  snapshot = data['snapshot']
+  replaced = data.setdefault('replaced', [])
+
+  for shard in range(aggregate_logic.getNumShards()):
+    if shard in replaced:
+      continue
+
+    # the counted statistics are stored in the first shard
+    if shard:
+      aggregate_logic.replaceShard(survey, shard, 0, {},
+                                   snapshot.get(str(shard)))
+    else:
+      aggregate_logic.replaceShard(survey, shard, total, questions,
+                                   snapshot.get(str(shard)))
+
+    replaced.append(shard)
+    updated_job_fields = {
+        'text_data': simplejson.dumps(data),
+        }
+    job_logic.updateEntityProperties(job_entity, updated_job_fields)
+
+  # we are finished
+  return
@@ -81,7 +81,7 @@ def setupUniqueUserIdAdder(job_entity):
     for user in m_users:
 
       job_query_fields['key_data'] = user.key()
-      adder_job = job_logic.getForFields(job_query_fields, unique=True)
+      adder_job = job_logic.getKeysForFields(job_query_fields, unique=True)
 
       if not adder_job:
         # this user doesn't have unique id yet
@@ -25,7 +25,9 @@ __authors__ = [
   ]
 
 
+import heapq
 import logging
+import time
 
 from google.appengine.ext import db
 
@@ -33,8 +35,14 @@ from django.utils.translation import ugettext
 
 from soc.cache import sidebar
 from soc.logic import dicts
+from soc.logic import parallel
+from soc.logic import planner
+from soc.logic import search
+from soc.profiling import queries
 from soc.views import out_of_band
 
+import soc.models.program
+
 
 class Error(Exception):
   """Base class for all exceptions raised by this module.
@@ -59,6 +67,17 @@ class NoEntityError(InvalidArgumentError):
   pass
 
 
+class _Descending(object):
+  """Wraps a value so that it compares in descending order.
+  """
+
+  def __init__(self, value):
+    self.value = value
+
+  def __cmp__(self, other):
+    return cmp(other.value, self.value)
+
+
 class Logic(object):
   """Base logic for entity classes.
 
@@ -110,6 +129,22 @@ class Logic(object):
     depth = self._scope_logic.logic.getScopeDepth()
     return None if (depth is None) else (depth + 1)
 
+  def getBoundingFields(self):
+    """Returns the fields an equality filter on which bounds the amount of
+    matching entities, see soc.logic.planner.
+
+    The scope does not bound the entities of kinds whose scope is a
+    program, a program has thousands of students for example.
+    """
+
+    fields = planner.DEF_BOUNDING_FIELDS
+
+    if self._scope_logic and issubclass(
+        self._scope_logic.logic.getModel(), soc.models.program.Program):
+      fields = [i for i in fields if i != 'scope']
+
+    return fields
+
   def getKeyNameFromFields(self, fields):
     """Returns the KeyName constructed from fields dict for this type of entity.
 
@@ -310,7 +345,7 @@ class Logic(object):
     raise out_of_band.Error(msg, status=404)
 
   def getForFields(self, filter=None, unique=False,
-                   limit=1000, offset=0, order=None):
+                   limit=1000, offset=0, order=None, keys_only=False):
     """Returns all entities that have the specified properties.
 
     Args:
@@ -319,32 +354,332 @@ class Logic(object):
       limit: the amount of entities to fetch at most
       offset: the position to start at
       order: a list with the sort order
+      keys_only: if set, the keys of the entities are returned instead
     """
 
     if unique:
       limit = 1
 
-    query = self.getQueryForFields(filter=filter, order=order)
+    fields = self._getKeyFilterFields(filter)
+    split = self._getMergeFilterName(filter, order)
+
+    if fields:
+      # the filter determines the key name, so a get is enough
+      result = self._getForKeyFilterFields(fields)[offset:offset + limit]
+
+      if keys_only:
+        result = [i.key() for i in result]
+    elif split:
+      result = self._mergeForFields(filter, split, limit, offset, order)
+
+      if keys_only:
+        result = [i.key() for i in result]
+    else:
+      result = self._fetchForFields(filter, limit, offset, order, keys_only)
+
+    if unique:
+      return result[0] if result else None
+
+    return result
+
+  def getKeysForFields(self, filter=None, unique=False,
+                       limit=1000, offset=0, order=None):
+    """Returns the keys of all entities that have the specified properties.
+
+    Use this instead of getForFields when the entities themselves are not
+    needed, for example to check whether any entity matches the filter.
+    See getForFields for the arguments.
+    """
+
+    return self.getForFields(filter=filter, unique=unique, limit=limit,
+                             offset=offset, order=order, keys_only=True)
+
+  def _fetchForFields(self, filter, limit, offset, order, keys_only):
+    """Runs the query for getForFields and returns the fetched entities.
+    """
+
+    query = self.getQueryForFields(filter=filter, order=order,
+                                   keys_only=keys_only)
+
+    if not planner.isCovered(query):
+      fallback = planner.getFallbackFilter(self._model, filter, order,
+                                           self.getBoundingFields())
+
+      if fallback:
+        return self._fetchInMemory(filter, fallback, limit, offset, order,
+                                   keys_only)
+
+    start = time.time()
+    error = None
 
     try:
       result = query.fetch(limit, offset)
     except db.NeedIndexError, exception:
       result = []
+      error = exception
       logging.exception("%s, model: %s filter: %s, order: %s" % 
                         (exception, self._model, filter, order))
       # TODO: send email
 
-    if unique:
-      return result[0] if result else None
+    queries.record(query, limit, offset, len(result), time.time() - start,
+                   error=error)
+
+    if keys_only and not query.is_keys_only():
+      result = [i.key() for i in result]
 
     return result
 
-  def getQueryForFields(self, filter=None, order=None):
+  def _fetchInMemory(self, filter, fallback, limit, offset, order, keys_only):
+    """Fetches the entities matching fallback and applies filter in memory.
+
+    This is used for queries that need a composite index that is not
+    defined, see soc.logic.planner. If DEF_FALLBACK_LIMIT or more entities
+    match fallback the result could be incomplete, an error is logged and
+    nothing is returned instead, like for a query that needs an index.
+
+    Args:
+      filter, limit, offset, order, keys_only: see getForFields
+      fallback: the filter to query, as returned by getFallbackFilter
+    """
+
+    query = self.getQueryForFields(filter=fallback)
+    fetch_limit = planner.DEF_FALLBACK_LIMIT
+    start = time.time()
+
+    entities = query.fetch(fetch_limit)
+    error = None
+
+    if len(entities) >= fetch_limit:
+      error = "In memory query on %d or more entities, model: %s " \
+          "filter: %s, order: %s" % (fetch_limit, self._model, filter, order)
+      logging.error(error)
+      entities = []
+
+    queries.record(query, fetch_limit, 0, len(entities), time.time() - start,
+                   error=error)
+
+    result = planner.filterEntities(self._model, entities, filter, order)
+    result = result[offset:offset + limit]
+
+    if keys_only:
+      result = [i.key() for i in result]
+
+    return result
+
+  def _supportsKeysOnly(self, filter):
+    """Returns True iff the query for filter can be run as keys only.
+
+    IN and != filters are split into several queries by the datastore API,
+    which does not support keys only for those.
+    """
+
+    for name, value in filter.iteritems():
+      if isinstance(value, list) and len(value) != 1:
+        return False
+
+      if name.strip().endswith('!='):
+        return False
+
+    return True
+
+  def _getMergeFilterName(self, filter, order):
+    """Returns the name of the IN filter in filter if it can be merged.
+
+    The datastore API runs the subqueries of an IN filter one after the
+    other and walks through the results to skip the offset. Instead the
+    subqueries are run concurrently and their results merged, which is
+    done if filter has exactly one IN filter, no != filters and all of
+    order are single valued properties of the model.
+
+    Returns:
+      The name of the IN filter, or None.
+    """
+
+    if not filter:
+      return None
+
+    properties = self._model.properties()
+    split = None
+
+    for name, value in filter.iteritems():
+      if name.strip().endswith('!='):
+        return None
+
+      if not isinstance(value, list) or len(value) <= 1:
+        continue
+
+      if split:
+        return None
+
+      split = name
+
+    for name in order or []:
+      prop = properties.get(name.lstrip('-'))
+
+      if not prop or isinstance(prop, db.ListProperty):
+        return None
+
+    return split
+
+  def _mergeForFields(self, filter, split, limit, offset, order):
+    """Runs one query per value of the IN filter and merges the results.
+
+    All queries are run concurrently, the results are merged by order with
+    ties broken by key, like the datastore does, and entities that match
+    several of the queries are returned once.
+
+    Args:
+      filter, limit, offset, order: see getForFields
+      split: the name of the IN filter, see _getMergeFilterName
+    """
+
+    if limit <= 0:
+      return []
+
+    # each query has to return enough entities to fill the requested page
+    # on its own, the datastore does not return more than 1000 entities
+    fetch_limit = min(offset + limit, 1000)
+
+    calls = []
+    values = []
+
+    for value in filter[split]:
+      if value in values:
+        continue
+
+      values.append(value)
+      subfilter = filter.copy()
+      subfilter[split] = value
+      calls.append((self, {'filter': subfilter, 'limit': fetch_limit,
+                           'order': order}))
+
+    results = parallel.getForFields(calls)
+    properties = self._model.properties()
+
+    def sort_key(entity):
+      """Returns the key by which the datastore orders entity.
+      """
+
+      result = []
+
+      for name in order or []:
+        value = properties[name.lstrip('-')].get_value_for_datastore(entity)
+
+        if name.startswith('-'):
+          value = _Descending(value)
+
+        result.append(value)
+
+      result.append(entity.key())
+      return result
+
+    heap = [(sort_key(result[0]), i, 0) for i, result in enumerate(results)
+            if result]
+    heapq.heapify(heap)
+
+    merged = []
+    seen = set()
+
+    while heap and len(merged) < offset + limit:
+      _, i, position = heapq.heappop(heap)
+      entity = results[i][position]
+
+      if entity.key() not in seen:
+        seen.add(entity.key())
+        merged.append(entity)
+
+      position += 1
+
+      if position < len(results[i]):
+        entry = (sort_key(results[i][position]), i, position)
+        heapq.heappush(heap, entry)
+
+    return merged[offset:]
+
+  def _getKeyFilterFields(self, filter):
+    """Returns the fields of filter if they determine the key name.
+
+    That is the case if all filters are plain equality filters on
+    properties of the model, and the fields returned by getKeyFieldNames
+    are all among them. A 'scope' filter stands in for 'scope_path', as
+    the scope_path of an entity is the key name of its scope.
+
+    Returns:
+      A dict with the value for each filtered property, or None.
+    """
+
+    if self._id_based or not filter:
+      return None
+
+    properties = self._model.properties()
+    fields = {}
+
+    for name, value in filter.iteritems():
+      if isinstance(value, list):
+        if len(value) != 1:
+          return None
+        value = value[0]
+
+      if name not in properties:
+        return None
+
+      fields[name] = value
+
+    scope = fields.get('scope')
+
+    if 'scope_path' not in fields and isinstance(scope, (db.Model, db.Key)):
+      scope_key = scope.key() if isinstance(scope, db.Model) else scope
+      fields['scope_path'] = scope_key.name()
+
+    for name in self.getKeyFieldNames():
+      value = fields.get(name)
+
+      if not value or not isinstance(value, basestring):
+        return None
+
+    return fields
+
+  def _getForKeyFilterFields(self, fields):
+    """Returns the entity matching fields as a list, see getForFields.
+
+    The entity is retrieved by the key name that the key fields determine,
+    the other fields are checked in memory like the datastore would.
+
+    Args:
+      fields: a dict as returned by _getKeyFilterFields
+    """
+
+    key_name = self.getKeyNameFromFields(fields)
+    entity = self.getFromKeyName(key_name)
+
+    if not entity:
+      return []
+
+    properties = self._model.properties()
+
+    for name, value in fields.iteritems():
+      actual = properties[name].get_value_for_datastore(entity)
+
+      if isinstance(value, db.Model):
+        value = value.key()
+
+      if isinstance(actual, list):
+        if value not in actual:
+          return []
+      elif actual != value:
+        return []
+
+    return [entity]
+
+  def getQueryForFields(self, filter=None, order=None, keys_only=False):
     """Returns a query with the specified properties.
 
     Args:
       filter: a dict for the properties that the entities should have
       order: a list with the sort order
+      keys_only: if set, the query returns keys instead of entities, this
+                 is ignored for filters that the datastore API runs as
+                 several queries, as those do not support keys only
 
     Returns:
       - Query object instantiated with the given properties
@@ -360,7 +695,8 @@ class Logic(object):
     if len(orderset) != len(order):
       raise InvalidArgumentError
 
-    query = db.Query(self._model)
+    keys_only = keys_only and self._supportsKeysOnly(filter)
+    query = db.Query(self._model, keys_only=keys_only)
 
     for key, value in filter.iteritems():
       if isinstance(value, list) and len(value) == 1:
@@ -374,6 +710,8 @@ class Logic(object):
     for key in order:
       query.order(key)
 
+    query.query_shape = queries.getShape(self._model.kind(), filter, order)
+
     return query
 
   def updateEntityProperties(self, entity, entity_properties, silent=False):
@@ -490,6 +828,9 @@ class Logic(object):
       entity: an existing entity in datastore
     """
 
+    # the key of the entity is not available once it has been deleted
+    search.unindexEntity(entity)
+
     entity.delete()
     # entity has been deleted call _onDelete
     self._onDelete(entity)
@@ -504,7 +845,9 @@ class Logic(object):
     more = True
 
     while(more):
+      start = time.time()
       data = query.fetch(chunk+1, offset)
+      queries.record(query, chunk+1, offset, len(data), time.time() - start)
 
       more = len(data) > chunk
 
@@ -516,12 +859,14 @@ class Logic(object):
 
     return result
   # pylint: disable-msg=C0103
-  def entityIterator(self, queryGen, batch_size = 100):
+  def entityIterator(self, queryGen, batch_size = 100, keys_only=False):
     """Iterator that yields an entity in batches.
 
     Args:
-      queryGen: should return a Query object
+      queryGen: should return a Query object, it is called with
+                keys_only=True if keys_only is set
       batchSize: how many entities to retrieve in one datastore call
+      keys_only: if set, the keys of the entities are yielded instead
 
     Retrieved from http://tinyurl.com/d887ll (AppEngine cookbook).
     """
@@ -534,15 +879,24 @@ class Logic(object):
     key = None
 
     while not done:
-      query = queryGen()
+      if keys_only:
+        query = queryGen(keys_only=True)
+      else:
+        query = queryGen()
       if key:
         query.filter("__key__ > ", key)
+      start = time.time()
       results = query.fetch(batch_size)
+      queries.record(query, batch_size, 0, len(results), time.time() - start)
+      if keys_only and not query.is_keys_only():
+        results = [i.key() for i in results]
       for result in results:
         count += 1
         yield result
       if batch_size > len(results):
         done = True
+      elif keys_only:
+        key = results[-1]
       else:
         key = results[-1].key()
 
@@ -596,6 +950,7 @@ class Logic(object):
       raise NoEntityError
 
     sidebar.flush()
+    search.indexEntity(entity)
 
   def _onUpdate(self, entity):
     """Called when an entity has been updated.
@@ -606,6 +961,8 @@ class Logic(object):
     if not entity:
       raise NoEntityError
 
+    search.indexEntity(entity)
+
   def _onDelete(self, entity):
     """Called when an entity has been deleted.
 
@@ -70,15 +70,15 @@ class Logic(role.Logic):
 
     fields = {'mentor': entity}
 
-    student_project_entity = student_project_logic.getForFields(fields,
-                                                                unique=True)
-    if student_project_entity:
+    student_project_key = student_project_logic.getKeysForFields(fields,
+                                                                 unique=True)
+    if student_project_key:
       return DEF_ALREADY_MENTORING_RPOJECT_MSG
 
-    student_proposal_entity = student_proposal_logic.getForFields(fields,
-                                                                  unique=True)
+    student_proposal_key = student_proposal_logic.getKeysForFields(fields,
+                                                                   unique=True)
 
-    if student_proposal_entity:
+    if student_proposal_key:
       return DEF_ALREADY_MENTORING_PROPOSAL_MSG
 
     return super(Logic, self).canResign(entity)
@@ -39,10 +39,16 @@ class Logic(base.Logic):
     # pylint: disable-msg=C0103
     self.EMAIL = 'emails'
     self.CONVERT = 'convert'
+    self.SURVEY = 'survey'
+    self.DEADLINE = 'deadline'
+    self.SEARCH = 'search'
 
     self.groups = {
         self.EMAIL: 'Send out emails',
         self.CONVERT: 'Convert one entity to another type',
+        self.SURVEY: 'Process survey results',
+        self.DEADLINE: 'Process passed deadlines',
+        self.SEARCH: 'Build the search index',
         }
 
     super(Logic, self).__init__(model=model, base_model=base_model,
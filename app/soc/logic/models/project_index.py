@@ -0,0 +1,271 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""UserProjectIndex (Model) query functions.
+"""
+
+__authors__ = [
+  '"Lennard de Rijk" <ljvderijk@gmail.com>',
+  ]
+
+
+from google.appengine.ext import db
+
+from soc.logic.models import base
+from soc.logic.models.job import logic as job_logic
+from soc.logic.models.priority_group import logic as priority_logic
+from soc.models.mentor import Mentor
+from soc.models.project_index import UserProjectIndex
+from soc.models.role import Role
+from soc.models.student import Student
+from soc.models.student_project import StudentProject
+
+
+class Logic(base.Logic):
+  """Logic methods for the UserProjectIndex model.
+  """
+
+  def __init__(self, model=UserProjectIndex, base_model=None,
+               scope_logic=None):
+    """Defines the name, key_name and model for this entity.
+    """
+
+    # pylint: disable-msg=C0103
+    self.STUDENT = 'student'
+    self.MENTOR = 'mentor'
+
+    super(Logic, self).__init__(model=model, base_model=base_model,
+                                scope_logic=scope_logic)
+
+  def getKeyNameForUser(self, user_key, program_key):
+    """Returns the key name of the index for the user in the program.
+    """
+
+    return '%s/%s' % (program_key.name(), user_key.name())
+
+  def getForUser(self, user, program):
+    """Returns the index for user in program, building it if needed.
+
+    Args:
+      user: a User entity or key
+      program: a Program entity or key
+    """
+
+    user_key = self._getKey(user)
+    program_key = self._getKey(program)
+
+    key_name = self.getKeyNameForUser(user_key, program_key)
+    index = self._model.get_by_key_name(key_name)
+
+    if not index:
+      index = self.buildIndex(user_key, program_key)
+
+    return index
+
+  def getForProject(self, user, project):
+    """Returns the index for user in the program of project.
+
+    Args:
+      user: a User entity or key
+      project: a StudentProject entity
+    """
+
+    program_key = StudentProject.program.get_value_for_datastore(project)
+
+    return self.getForUser(user, program_key)
+
+  def buildIndex(self, user_key, program_key, replace=False):
+    """Builds and stores the index for a user in a program from scratch.
+
+    This is used for users of which no index exists yet, for example
+    because their projects were created before the index was introduced,
+    and to rebuild the indices of a program, see startRebuild.
+
+    Args:
+      user_key: the key of the User to build the index for
+      program_key: the key of the Program to build the index for
+      replace: whether to replace an index that already exists
+    """
+
+    key_name = self.getKeyNameForUser(user_key, program_key)
+    index = self._model(key_name=key_name, user=user_key, program=program_key)
+
+    students = Student.all(keys_only=True).filter('user =', user_key)
+    students = students.filter('scope =', program_key)
+
+    for student_key in students:
+      projects = StudentProject.all(keys_only=True)
+      projects = projects.filter('student =', student_key)
+      self._add(index, self.STUDENT, student_key, projects)
+
+    mentors = Mentor.all(keys_only=True).filter('user =', user_key)
+    mentors = mentors.filter('program =', program_key)
+
+    for mentor_key in mentors:
+      for field in ['mentor', 'additional_mentors']:
+        projects = StudentProject.all(keys_only=True)
+        projects = projects.filter('%s =' % field, mentor_key)
+        self._add(index, self.MENTOR, mentor_key, projects)
+
+    def build_txn():
+      """Transaction that stores the index unless it was built already.
+      """
+
+      existing = self._model.get_by_key_name(key_name)
+
+      if existing and not replace:
+        return existing
+
+      index.put()
+      return index
+
+    return db.run_in_transaction(build_txn)
+
+  def startRebuild(self, program_key):
+    """Starts a job that rebuilds the existing indices of a program.
+
+    Indices only follow the projects that are changed through the Student
+    Project logic, projects and roles that are stored directly, for example
+    in batches by seed_db, are picked up by a rebuild. Indices that do not
+    exist yet are built on first use.
+
+    No job is started if one is already waiting to be run for the program.
+
+    Args:
+      program_key: the key of the Program to rebuild the indices of
+
+    Returns:
+      The Job entity that will rebuild the indices.
+    """
+
+    priority_group = priority_logic.getGroup(priority_logic.CONVERT)
+    job_fields = {
+        'priority_group': priority_group,
+        'task_name': 'rebuildProjectIndices',
+        'key_data': program_key,
+        'status': 'waiting',
+        }
+
+    job = job_logic.getForFields(job_fields, unique=True)
+
+    if not job:
+      job_fields['key_data'] = [program_key]
+      job = job_logic.updateOrCreateFromFields(job_fields)
+
+    return job
+
+  def getRoleKeys(self, project):
+    """Returns the role keys that give access to project.
+
+    Args:
+      project: a StudentProject entity
+
+    Returns:
+      A list of (kind, role_key) tuples, with kind either STUDENT or MENTOR.
+    """
+
+    student_key = StudentProject.student.get_value_for_datastore(project)
+    mentor_key = StudentProject.mentor.get_value_for_datastore(project)
+
+    roles = [(self.STUDENT, student_key), (self.MENTOR, mentor_key)]
+    roles += [(self.MENTOR, i) for i in project.additional_mentors]
+
+    return [i for i in roles if i[1]]
+
+  def addProject(self, project, roles):
+    """Adds project to the indices of the users of the specified roles.
+
+    Args:
+      project: a StudentProject entity
+      roles: a list of (kind, role_key) tuples as returned by getRoleKeys
+    """
+
+    self._update(project, roles, self._add)
+
+  def removeProject(self, project, roles):
+    """Removes project from the indices of the users of the specified roles.
+
+    Args:
+      project: a StudentProject entity
+      roles: a list of (kind, role_key) tuples as returned by getRoleKeys
+    """
+
+    self._update(project, roles, self._remove)
+
+  def _update(self, project, roles, modify):
+    """Applies modify to the index of each of the roles' users.
+    """
+
+    if not roles:
+      return
+
+    program_key = StudentProject.program.get_value_for_datastore(project)
+    project_key = project.key()
+
+    role_entities = db.get([role_key for _, role_key in roles])
+
+    for (kind, role_key), role in zip(roles, role_entities):
+      if not role:
+        continue
+
+      user_key = Role.user.get_value_for_datastore(role)
+      index = self.getForUser(user_key, program_key)
+
+      def update_txn():
+        """Transaction that updates the index of a single user.
+        """
+
+        entity = self._model.get(index.key())
+        modify(entity, kind, role_key, [project_key])
+        entity.put()
+
+      db.run_in_transaction(update_txn)
+
+  def _add(self, index, kind, role_key, project_keys):
+    """Adds the projects for a role of the specified kind to index.
+    """
+
+    roles = getattr(index, '%s_roles' % kind)
+    projects = getattr(index, '%s_projects' % kind)
+
+    if role_key not in roles:
+      roles.append(role_key)
+
+    for project_key in project_keys:
+      if project_key not in projects:
+        projects.append(project_key)
+
+  def _remove(self, index, kind, role_key, project_keys):
+    """Removes the projects for a role of the specified kind from index.
+    """
+
+    projects = getattr(index, '%s_projects' % kind)
+
+    for project_key in project_keys:
+      if project_key in projects:
+        projects.remove(project_key)
+
+  def _getKey(self, value):
+    """Returns the key of value, which is either an entity or a key.
+    """
+
+    if isinstance(value, db.Model):
+      return value.key()
+
+    return value
+
+
+logic = Logic()
@@ -56,6 +56,8 @@ class Logic(base.Logic):
           datastore Gets is Theta(1/log(branching_factor)), and the amount of data
           returned by each Get is Theta(branching_factor). 
 
+    Returns:
+      The newly created RankerRoot entity.
     """
     ranker = Ranker.Create(scores, branching_factor)
 
@@ -65,7 +67,7 @@ class Logic(base.Logic):
         'root': ranker.rootkey}
 
     key_name = self.getKeyNameFromFields(fields)
-    self.updateOrCreateFromKeyName(fields, key_name)
+    return self.updateOrCreateFromKeyName(fields, key_name)
 
   def getRootFromEntity(self, entity):
     """Returns a Ranker object created from a RankerRoot entity.
@@ -106,7 +106,7 @@ class Logic(base.Logic):
       # check if this is the last active role for it's scope
       fields = {'scope': entity.scope,
           'status': 'active'}
-      roles = self.getForFields(fields, limit=2)
+      roles = self.getKeysForFields(fields, limit=2)
 
       # if this it the last one return error message
       if len(roles) <= 1:
@@ -24,6 +24,7 @@ __authors__ = [
 
 from soc.logic.models import base
 from soc.logic.models import organization as org_logic
+from soc.logic.models.project_index import logic as project_index_logic
 
 import soc.models.linkable
 import soc.models.student_project
@@ -42,5 +43,50 @@ class Logic(base.Logic):
     super(Logic, self).__init__(model=model, base_model=base_model,
                                 scope_logic=scope_logic)
 
+  def updateEntityProperties(self, entity, entity_properties, silent=False):
+    """Updates the project and then, when the student or one of the mentors
+    changed, moves it between the project indices of the users involved.
+
+    For args see base.Logic.updateEntityProperties().
+    """
+
+    old_roles = []
+
+    if entity:
+      old_roles = project_index_logic.getRoleKeys(entity)
+
+    entity = super(Logic, self).updateEntityProperties(
+        entity, entity_properties, silent=silent)
+
+    new_roles = project_index_logic.getRoleKeys(entity)
+
+    removed = [i for i in old_roles if i not in new_roles]
+    added = [i for i in new_roles if i not in old_roles]
+
+    project_index_logic.removeProject(entity, removed)
+    project_index_logic.addProject(entity, added)
+
+    return entity
+
+  def _onCreate(self, entity):
+    """Adds the new project to the project indices of its student and mentors.
+    """
+
+    project_index_logic.addProject(entity,
+                                   project_index_logic.getRoleKeys(entity))
+
+    super(Logic, self)._onCreate(entity)
+
+  def delete(self, entity):
+    """Deletes the project and then removes it from the project indices of
+    its student and mentors.
+    """
+
+    roles = project_index_logic.getRoleKeys(entity)
+
+    super(Logic, self).delete(entity)
+
+    project_index_logic.removeProject(entity, roles)
+
 
 logic = Logic()
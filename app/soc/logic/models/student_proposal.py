@@ -81,7 +81,7 @@ class Logic(base.Logic):
     fields = {'org': org_entity,
               'status': 'accepted'}
 
-    query = self.getQueryForFields(fields)
+    query = self.getQueryForFields(fields, keys_only=True)
 
     slots_left_to_assign = max(0, org_entity.slots - query.count())
 
@@ -30,6 +30,9 @@ from google.appengine.ext import db
 
 from soc.cache import sidebar
 from soc.logic.models import linkable as linkable_logic
+from soc.logic.models.job import logic as job_logic
+from soc.logic.models.priority_group import logic as priority_logic
+from soc.logic.models.project_index import logic as project_index_logic
 from soc.logic.models import survey_record as survey_record_logic
 from soc.logic.models.user import logic as user_logic
 from soc.logic.models import work
@@ -50,6 +53,13 @@ PROJECT_STATUSES = {
 'mid_term_passed': {True: 'passed', False: 'final_failed'}
 }
 
+# outcomes of grading a single project, see Logic.gradeProject
+GRADE_UPDATED = 'updated'
+GRADE_NO_RECORDS = 'no_records'
+GRADE_NO_MENTOR_RECORD = 'no_mentor_record'
+GRADE_UNKNOWN_STATUS = 'unknown_status'
+GRADE_ALREADY_GRADED = 'already_graded'
+
 class Logic(work.Logic):
   """Logic methods for the Survey model.
   """
@@ -87,7 +97,7 @@ class Logic(work.Logic):
     for name, value in survey_fields.items():
       setattr(survey_content, name, value)
 
-    survey_content.schema = str(schema)
+    survey_content.setSchema(schema)
 
     db.put(survey_content)
 
@@ -110,7 +120,7 @@ class Logic(work.Logic):
       create = True
       survey_record = SurveyRecord(user=user, survey=survey)
 
-    schema = eval(survey.survey_content.schema)
+    schema = survey.survey_content.getSchema()
 
     for name, value in fields.items():
       if name == 'project':
@@ -229,96 +239,149 @@ class Logic(work.Logic):
         return False
 
   def getStudentforProject(self, user, project):
-    """Get student projects for a given User.
+    """Get the Student roles of the given User for a Student Project.
 
     params:
       user = survey taking user
       project = survey taker's student project
+
+    returns:
+      A list with the keys of the user's Student roles for the project.
     """
-    from soc.logic.models.student import logic as student_logic
-    import soc.models.student
 
-    # TODO this should be done per Student or Program
-    # TODO filter for accepted, midterm_passed, etc?
-    user_students = student_logic.getForFields({'user': user}) 
-    if not user_students: return []
-    return set([project.student for project in sum(
-    (list(s.student_projects.run())
-    for s in user_students), []) if project.key() == project.key()])
+    index = project_index_logic.getForProject(user, project)
+
+    if project.key() not in index.student_projects:
+      return []
+
+    roles = project_index_logic.getRoleKeys(project)
+
+    return [key for kind, key in roles
+            if kind == project_index_logic.STUDENT and
+            key in index.student_roles]
 
   def getMentorforProject(self, user, project):
-    """Get Student Projects that are being mentored by the given User.
+    """Get the Mentor roles of the given User for a Student Project.
 
     params:
       user = survey taking user
       project = survey taker's student project
+
+    returns:
+      A list with the keys of the user's Mentor roles for the project.
     """
 
-    from soc.logic.models.mentor import logic as mentor_logic
-    import soc.models.mentor
+    index = project_index_logic.getForProject(user, project)
 
-    # TODO filter for accepted, midterm_passed, etc?
-    # TODO this should be done a program basis not user
+    if project.key() not in index.mentor_projects:
+      return []
 
-    user_mentors = mentor_logic.getForFields({'user': user}) 
+    roles = project_index_logic.getRoleKeys(project)
+    mentors = []
 
-    if not user_mentors:
-      return []
+    for kind, key in roles:
+      if kind == project_index_logic.MENTOR and key in index.mentor_roles \
+          and key not in mentors:
+        mentors.append(key)
+
+    return mentors
+
+  def getStudentProjects(self, user, program):
+    """Get the Student Projects of the given User in a Program.
+
+    params:
+      user = survey taking user
+      program = program scope of the survey
+    """
+
+    index = project_index_logic.getForUser(user, program)
 
-    return set([project.mentor for project in sum(
-            (list(mentor.student_projects.run())
-             for mentor in user_mentors), [])
-        if project.key() == project.key()])
+    return [i for i in db.get(index.student_projects) if i]
+
+  def getMentorProjects(self, user, program):
+    """Get the Student Projects that the given User mentors in a Program.
+
+    params:
+      user = survey taking user
+      program = program scope of the survey
+    """
+
+    index = project_index_logic.getForUser(user, program)
+
+    return [i for i in db.get(index.mentor_projects) if i]
 
   def activateGrades(self, survey):
     """Activates the grades on a Grading Survey.
 
-    TODO(James) Fix this Docstring
+    The grades are activated by a job (see soc.cron.grade_activator),
+    which walks all projects of the survey's program in batches.
 
     params:
       survey = survey entity
+
+    returns:
+      The job entity that activates the grades, or False if the survey
+      can not be graded.
     """
-    if survey.taking_access != "mentor evaluation":
-      logging.error("Cannot grade survey %s with taking access %s"
-      % (survey.key().name(), survey.taking_access))
+    if not isinstance(survey, GradingProjectSurvey):
+      logging.error("Cannot grade survey %s of kind %s"
+      % (survey.key().name(), survey.kind()))
       return False
 
-    program = survey.scope or Program.get_by_key_name(survey.scope_path)
+    priority_group = priority_logic.getGroup(priority_logic.SURVEY)
+    job_fields = {
+        'priority_group': priority_group,
+        'task_name': 'activateGrades',
+        'key_data': [survey.key()]}
+
+    return job_logic.updateOrCreateFromFields(job_fields)
+
+  def gradeProject(self, project, record_group):
+    """Applies the grade from record_group to project.
+
+    Both project and record_group are modified but not stored.
+
+    params:
+      project = the student project to grade
+      record_group = the SurveyRecordGroup for the project and its
+        current status, or None if there is none
+
+    returns:
+      One of the GRADE_* outcome constants, GRADE_UPDATED iff the
+      project and record_group have been modified.
+    """
 
-    for project in program.student_projects.fetch(1000):
-      this_record_group = SurveyRecordGroup.all().filter(
-      "project = ", project).filter(
-      "initial_status = ", project.status).get()
+    if not record_group:
+      logging.warning('neither mentor nor student has taken the survey '
+                      'for project %s' % project.key().name())
+      return GRADE_NO_RECORDS
 
-      if not this_record_group:
-         logging.warning('neither mentor nor student has \
-         taken the survey for project %s' % project.key().name() )
-         continue
+    if not record_group.mentor_record:
+      # student has taken survey, but not mentor
+      logging.warning('not continuing without mentor record...')
+      return GRADE_NO_MENTOR_RECORD
 
-      if not this_record_group.mentor_record:
-        # student has taken survey, but not mentor
-        logging.warning('not continuing without mentor record...')
-        continue
+    status_options = PROJECT_STATUSES.get(project.status)
 
-      status_options = PROJECT_STATUSES.get(project.status)
+    if not status_options:
+      logging.warning('unable to find status options for project '
+                      'status %s' % project.status)
+      return GRADE_UNKNOWN_STATUS
 
-      if not status_options:
-        logging.warning('unable to find status options for project \
-        status %s' % project.status)
-        continue
+    if getattr(record_group, 'final_status'):
+      logging.warning('project %s record group should not yet have a '
+                      'final status %s' % (
+                      project.key().name(), record_group.final_status))
+      return GRADE_ALREADY_GRADED
 
-      new_project_grade = this_record_group.mentor_record.grade
-      new_project_status = status_options.get(new_project_grade)
+    new_project_grade = record_group.mentor_record.grade
+    new_project_status = status_options.get(new_project_grade)
 
-      if getattr(this_record_group, 'final_status'):
-         logging.warning('project %s record group should not \
-         yet have a final status %s' % (
-         project.key().name(), this_record_group.final_status ) )
-         continue
+    # assign the new status to the project and surveyrecordgroup
+    project.status = new_project_status
+    record_group.final_status = new_project_status
 
-      # assign the new status to the project and surveyrecordgroup
-      project.status = new_project_status
-      this_record_group.final_status = new_project_status
+    return GRADE_UPDATED
 
   def getKeyNameFromPath(self, path):
     """Gets survey key name from a request path.
@@ -0,0 +1,437 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""SurveyAggregate (Model) query functions.
+"""
+
+__authors__ = [
+  '"Daniel Diniz" <ajaksu@gmail.com>',
+  ]
+
+
+import logging
+import random
+
+from google.appengine.ext import db
+
+from django.utils import simplejson
+
+from soc.logic.models import base
+from soc.logic.models.job import logic as job_logic
+from soc.logic.models.priority_group import logic as priority_logic
+from soc.models.survey_aggregate import SurveyAggregate
+
+
+#: The number of shards the statistics of a survey are spread over
+DEF_NUM_SHARDS = 10
+
+#: Question types for which the chosen options are counted
+CHOICE_TYPES = set(['selection', 'pick_multi', 'pick_quant', 'choice'])
+
+
+class Logic(base.Logic):
+  """Logic methods for the SurveyAggregate model.
+  """
+
+  def __init__(self, model=SurveyAggregate, base_model=None,
+               scope_logic=None, num_shards=DEF_NUM_SHARDS):
+    """Defines the name, key_name and model for this entity.
+
+    params:
+      num_shards: the number of shards to use per survey
+    """
+
+    self._num_shards = num_shards
+
+    super(Logic, self).__init__(model=model, base_model=base_model,
+                                scope_logic=scope_logic)
+
+  def getNumShards(self):
+    """Returns the number of shards the statistics of a survey use.
+    """
+
+    return self._num_shards
+
+  def getKeyNameForShard(self, survey, shard):
+    """Returns the key name of the specified shard for survey.
+
+    The kind is part of the key name, a Survey, a ProjectSurvey and a
+    GradingProjectSurvey can have the same key name.
+    """
+
+    return '%s/%s/%d' % (survey.kind(), survey.key().id_or_name(), shard)
+
+  def getValues(self, survey, record):
+    """Returns the answers in record to the questions of survey.
+
+    params:
+      survey: the survey the record belongs to
+      record: a SurveyRecord entity, or None
+
+    returns:
+      A dictionary mapping question names to the answers.
+    """
+
+    if not record:
+      return {}
+
+    schema = survey.survey_content.getSchema()
+
+    values = {}
+    for name in record.dynamic_properties():
+      if name in schema:
+        values[name] = getattr(record, name)
+
+    return values
+
+  def getDelta(self, survey, old_values, new_values):
+    """Computes the changes to the statistics of survey.
+
+    params:
+      survey: the survey the values are for
+      old_values: the previous answers as returned by getValues
+      new_values: the new answers as returned by getValues
+
+    returns:
+      A dictionary with the changes to the statistics per question.
+    """
+
+    schema = survey.survey_content.getSchema()
+    questions = {}
+
+    for values, sign in ((old_values, -1), (new_values, 1)):
+      for name, value in values.iteritems():
+        if name not in schema or value in (None, '', []):
+          continue
+
+        stats = questions.setdefault(name, {})
+        stats['answers'] = stats.get('answers', 0) + sign
+
+        if schema[name]['type'] in CHOICE_TYPES:
+          if isinstance(value, basestring):
+            value = value.split(',')
+          elif not isinstance(value, list):
+            value = [value]
+
+          choices = stats.setdefault('choices', {})
+          for option in value:
+            choices[option] = choices.get(option, 0) + sign
+          continue
+
+        try:
+          number = float(value)
+        except (TypeError, ValueError):
+          continue
+
+        stats['sum'] = stats.get('sum', 0) + sign * number
+        stats['numeric'] = stats.get('numeric', 0) + sign
+
+    return questions
+
+  def updateForRecord(self, survey, old_values, new_values, created,
+                      record_kind=None):
+    """Updates the statistics for survey with a changed record.
+
+    A random shard is updated in a transaction, so that concurrent
+    submissions rarely contend for the same entity. The record itself is
+    stored before this is called and not in the same transaction, so if
+    the update fails the statistics no longer match the records. In that
+    case a rebuild is started that recounts them, see startRebuild.
+
+    params:
+      survey: the survey the record was taken for
+      old_values: the answers before the change, an empty dict for a
+        newly created record
+      new_values: the answers after the change
+      created: whether the record was newly created
+      record_kind: the kind of the record, used to rebuild the statistics
+        when updating them fails
+    """
+
+    total = 1 if created else 0
+    questions = self.getDelta(survey, old_values, new_values)
+
+    if not total and not questions:
+      return
+
+    shard = random.randint(0, self._num_shards - 1)
+    key_name = self.getKeyNameForShard(survey, shard)
+
+    def update_txn():
+      """Transaction that applies the changes to the shard.
+      """
+
+      entity = self._model.get_by_key_name(key_name)
+
+      if not entity:
+        entity = self._model(key_name=key_name, survey=survey, shard=shard)
+
+      data = simplejson.loads(entity.data)
+      self._merge(data, questions)
+
+      entity.data = simplejson.dumps(data)
+      entity.total += total
+      entity.put()
+
+    try:
+      db.run_in_transaction(update_txn)
+    except db.TransactionFailedError, exception:
+      logging.error("Could not update the statistics of survey %s: %s" % (
+          survey.key().id_or_name(), exception))
+
+      if record_kind:
+        self.startRebuild(survey, record_kind)
+
+  def getStatisticsOrRebuild(self, survey, record_logic):
+    """Returns the statistics for survey, see getStatistics.
+
+    If nothing has been counted for survey while it does have records,
+    for example records from before the statistics were kept or records
+    that were stored without survey_record.Logic.updateSurveyRecord, a
+    rebuild of the statistics is started.
+
+    params:
+      survey: the survey to return the statistics for
+      record_logic: the logic for the records of survey
+
+    returns:
+      A (total, questions) tuple as returned by getStatistics, with total
+      None while the statistics are being rebuilt.
+    """
+
+    total, questions = self.getStatistics(survey)
+
+    if total:
+      return total, questions
+
+    if not record_logic.getKeysForFields({'survey': survey}, unique=True):
+      return total, questions
+
+    self.startRebuild(survey, record_logic.getModel().kind())
+
+    return None, questions
+
+  def startRebuild(self, survey, record_kind):
+    """Starts a job that recounts the statistics of survey from its records.
+
+    No job is started if one is already waiting to be run for survey.
+
+    params:
+      survey: the survey to recount the statistics of
+      record_kind: the kind of the records of survey
+
+    returns:
+      The Job entity that will rebuild the statistics.
+    """
+
+    priority_group = priority_logic.getGroup(priority_logic.SURVEY)
+    job_fields = {
+        'priority_group': priority_group,
+        'task_name': 'rebuildSurveyAggregate',
+        'key_data': survey.key(),
+        'status': 'waiting',
+        }
+
+    job = job_logic.getForFields(job_fields, unique=True)
+
+    if not job:
+      job_fields['key_data'] = [survey.key()]
+      job_fields['text_data'] = simplejson.dumps({'kind': record_kind})
+      job = job_logic.updateOrCreateFromFields(job_fields)
+
+    return job
+
+  def getSnapshot(self, survey):
+    """Returns the current contents of the shards of survey.
+
+    A rebuild takes a snapshot before it counts the records, the changes
+    made to the shards after that are kept when the rebuilt statistics
+    replace them, see replaceShard.
+
+    returns:
+      A dictionary mapping the number of each existing shard, as a string,
+      to a dictionary with its 'total' and 'data'.
+    """
+
+    key_names = [self.getKeyNameForShard(survey, i)
+                 for i in range(self._num_shards)]
+
+    snapshot = {}
+
+    for entity in self._model.get_by_key_name(key_names):
+      if entity:
+        snapshot[str(entity.shard)] = {
+            'total': entity.total,
+            'data': simplejson.loads(entity.data),
+            }
+
+    return snapshot
+
+  def replaceShard(self, survey, shard, total, questions, old):
+    """Replaces the contents of a shard as they were in a snapshot.
+
+    The shard is updated in a transaction, the changes made to it since
+    the snapshot are kept and the specified statistics are added to it.
+    A shard that holds nothing after that is removed.
+
+    params:
+      survey: the survey the statistics are for
+      shard: the number of the shard
+      total: the number of records to add to the shard
+      questions: the statistics per question to add to the shard
+      old: the contents of the shard in the snapshot as returned by
+        getSnapshot, or None if it did not exist
+    """
+
+    key_name = self.getKeyNameForShard(survey, shard)
+
+    def replace_txn():
+      """Transaction that replaces the snapshot contents of the shard.
+      """
+
+      entity = self._model.get_by_key_name(key_name)
+
+      if not entity:
+        entity = self._model(key_name=key_name, survey=survey, shard=shard)
+
+      data = simplejson.loads(entity.data)
+      entity_total = entity.total
+
+      if old:
+        self._subtract(data, old['data'])
+        entity_total -= old['total']
+
+      self._merge(data, questions)
+      self._prune(data)
+      entity_total += total
+
+      if not entity_total and not data:
+        if entity.is_saved():
+          entity.delete()
+        return
+
+      entity.data = simplejson.dumps(data)
+      entity.total = entity_total
+      entity.put()
+
+    db.run_in_transaction(replace_txn)
+
+  def getStatistics(self, survey):
+    """Returns the statistics for all results of survey.
+
+    All shards are retrieved with one batch get.
+
+    returns:
+      A (total, questions) tuple, with total the number of records and
+      questions a list of dictionaries with the statistics per question
+      in the order the questions appear in the survey. Each dictionary
+      contains the 'name', 'label' and 'answers' of the question. Choice
+      questions have 'choices', a list of (option, count) tuples. For
+      numeric answers the 'numeric' count, 'sum' and 'average' are set.
+    """
+
+    key_names = [self.getKeyNameForShard(survey, i)
+                 for i in range(self._num_shards)]
+
+    total = 0
+    merged = {}
+
+    for entity in self._model.get_by_key_name(key_names):
+      if not entity:
+        continue
+
+      total += entity.total
+      self._merge(merged, simplejson.loads(entity.data))
+
+    survey_content = survey.survey_content
+    schema = survey_content.getSchema()
+
+    questions = []
+    for name in survey_content.orderedProperties():
+      stats = merged.get(name, {})
+      question = {
+          'name': name,
+          'label': schema.get(name, {}).get('question') or name,
+          'answers': stats.get('answers', 0),
+          }
+
+      if 'choices' in stats:
+        options = getattr(survey_content, name, None) or []
+        choices = stats['choices']
+        # show the options in the order the survey creator set them
+        ordered = [i for i in options if i in choices]
+        ordered += sorted(i for i in choices if i not in options)
+        question['choices'] = [(i, choices[i]) for i in ordered]
+
+      if stats.get('numeric'):
+        question['numeric'] = stats['numeric']
+        question['sum'] = stats['sum']
+        question['average'] = stats['sum'] / stats['numeric']
+
+      questions.append(question)
+
+    return total, questions
+
+  def _subtract(self, target, questions):
+    """Subtracts the per question statistics in questions from target.
+    """
+
+    negated = {}
+
+    for name, stats in questions.iteritems():
+      negated_stats = negated[name] = {}
+
+      for stat, value in stats.iteritems():
+        if stat == 'choices':
+          negated_stats[stat] = dict((option, -count)
+                                     for option, count in value.iteritems())
+        else:
+          negated_stats[stat] = -value
+
+    self._merge(target, negated)
+
+  def _prune(self, target):
+    """Removes the options that were chosen zero times and the questions
+    without answers from target.
+    """
+
+    for name, stats in target.items():
+      choices = stats.get('choices', {})
+
+      for option, count in choices.items():
+        if not count:
+          del choices[option]
+
+      if not (choices or stats.get('answers') or stats.get('numeric')):
+        del target[name]
+
+  def _merge(self, target, questions):
+    """Adds the per question statistics in questions to target.
+    """
+
+    for name, stats in questions.iteritems():
+      target_stats = target.setdefault(name, {})
+
+      for stat, value in stats.iteritems():
+        if stat == 'choices':
+          choices = target_stats.setdefault('choices', {})
+          for option, count in value.iteritems():
+            choices[option] = choices.get(option, 0) + count
+        else:
+          target_stats[stat] = target_stats.get(stat, 0) + value
+
+
+logic = Logic()
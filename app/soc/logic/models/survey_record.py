@@ -25,6 +25,7 @@ __authors__ = [
 from google.appengine.ext import db
 
 from soc.logic.models import work
+from soc.logic.models.survey_aggregate import logic as aggregate_logic
 from soc.models.survey_record import SurveyRecord
 from soc.models.grading_project_survey_record import GradingProjectSurveyRecord
 from soc.models.project_survey_record import ProjectSurveyRecord
@@ -54,14 +55,16 @@ class Logic(work.Logic):
 
     if survey_record:
       create = False
+      old_values = aggregate_logic.getValues(survey, survey_record)
       for prop in survey_record.dynamic_properties():
         delattr(survey_record, prop)
     else:
       create = True
+      old_values = {}
       Record = self.getModel()
       survey_record = Record(user=user, survey=survey)
 
-    schema = eval(survey.survey_content.schema)
+    schema = survey.survey_content.getSchema()
 
     for name, value in fields.items():
       # TODO(ajaksu) logic below can be improved now we have different models
@@ -79,6 +82,11 @@ class Logic(work.Logic):
 
     # if creating evaluation record, set SurveyRecordGroup
     db.put(survey_record)
+
+    new_values = aggregate_logic.getValues(survey, survey_record)
+    aggregate_logic.updateForRecord(survey, old_values, new_values, create,
+                                    record_kind=survey_record.kind())
+
     return survey_record
 
 
@@ -0,0 +1,314 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runs independent getForFields calls as concurrent datastore RPCs.
+
+A fetch takes two RPCs, RunQuery and Next. All RunQuery RPCs are started
+before waiting for any of them, after which the same is done for the Next
+RPCs, so that fetching several lists takes about as long as the slowest
+of them instead of the sum. Queries that the datastore API splits up into
+several queries (IN and != filters) and lookups that getForFields serves
+with a get are done one by one with getForFields.
+
+The datastore API has no asynchronous calls, so the RPCs are built with
+internals of the SDK, see DEF_SDK_INTERNALS. If those are missing or
+behave differently, for example after an SDK upgrade, the calls are done
+one by one with getForFields as well.
+
+Usage:
+  proposals, mentor = parallel.getForFields([
+      (proposal_logic, {'filter': {'org': org}, 'order': ['-score']}),
+      (mentor_logic, {'filter': {'user': user}, 'unique': True}),
+      ])
+"""
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import logging
+import time
+
+from google.appengine.api import apiproxy_rpc
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import datastore
+from google.appengine.datastore import datastore_pb
+from google.appengine.ext import db
+from google.appengine.runtime import apiproxy_errors
+
+from soc.logic import planner
+from soc.profiling import queries
+
+
+DEF_SERVICE = 'datastore_v3'
+
+#: The (object, attribute name) pairs of the SDK internals that are used
+#: to build the RPCs, they are not part of the public API
+DEF_SDK_INTERNALS = [
+    (db.Query, '_get_query'),
+    (datastore.Query, '_ToPb'),
+    (datastore.Entity, '_FromPb'),
+    (datastore, '_CurrentTransactionKey'),
+    (datastore, '_ToDatastoreError'),
+    (datastore_pb, 'NextRequest'),
+    (apiproxy_stub_map, 'CreateRPC'),
+    ]
+
+
+def hasSDKInternals():
+  """Returns True iff all of DEF_SDK_INTERNALS are present.
+  """
+
+  for obj, name in DEF_SDK_INTERNALS:
+    if not hasattr(obj, name):
+      return False
+
+  return True
+
+
+class _Fetch(object):
+  """A single getForFields call that is being fetched.
+  """
+
+  def __init__(self, logic, filter=None, unique=False, limit=1000, offset=0,
+               order=None, keys_only=False):
+    """Builds the query, takes the same arguments as getForFields.
+    """
+
+    if unique:
+      limit = 1
+
+    self.logic = logic
+    self.filter = filter
+    self.unique = unique
+    self.limit = limit
+    self.offset = offset
+    self.order = order
+    self.keys_only = keys_only
+
+    self.query = None
+    self.datastore_query = None
+
+    # lookups that getForFields serves with a get do not need a query
+    self.by_key_name = bool(logic._getKeyFilterFields(filter))
+
+    if not self.by_key_name:
+      self.query = logic.getQueryForFields(filter=filter, order=order,
+                                           keys_only=keys_only)
+
+    self.result = None
+    self.error = None
+    self.rpc = None
+
+    # set when building or running the RPCs failed, see _runStep
+    self.unsupported = False
+
+  def isParallel(self):
+    """Returns True iff this call can be fetched with async RPCs.
+    """
+
+    if self.limit <= 0:
+      return False
+
+    if self.by_key_name:
+      return False
+
+    if not hasSDKInternals():
+      return False
+
+    if datastore._CurrentTransactionKey():
+      return False
+
+    # getForFields runs queries without a composite index in memory
+    if not planner.isCovered(self.query):
+      return False
+
+    self.datastore_query = self.query._get_query()
+
+    return not isinstance(self.datastore_query, datastore.MultiQuery)
+
+  def fetchNow(self):
+    """Fetches the entities with a regular getForFields call.
+    """
+
+    self.result = self.logic.getForFields(filter=self.filter, limit=self.limit,
+                                          offset=self.offset, order=self.order,
+                                          keys_only=self.keys_only)
+
+  def startQuery(self):
+    """Starts the RunQuery RPC.
+    """
+
+    request = self.datastore_query._ToPb(self.limit, self.offset)
+    self.rpc = _startCall('RunQuery', request, datastore_pb.QueryResult())
+
+  def startNext(self):
+    """Starts the Next RPC for the cursor returned by RunQuery.
+
+    Returns:
+      False iff RunQuery reported that there are no results.
+    """
+
+    query_result = _finishCall(self.rpc)
+    self.rpc = None
+
+    if not query_result.more_results():
+      self.result = []
+      return False
+
+    request = datastore_pb.NextRequest()
+    request.set_count(self.limit)
+    request.mutable_cursor().CopyFrom(query_result.cursor())
+
+    self.rpc = _startCall('Next', request, datastore_pb.QueryResult())
+    return True
+
+  def finishNext(self):
+    """Converts the results of the Next RPC to model instances.
+    """
+
+    query_result = _finishCall(self.rpc)
+    self.rpc = None
+
+    entities = [datastore.Entity._FromPb(i)
+                for i in query_result.result_list()]
+
+    if self.keys_only:
+      self.result = [i.key() for i in entities]
+    else:
+      self.result = [self.logic._model.from_entity(i) for i in entities]
+
+  def getResult(self):
+    """Returns the result like getForFields would.
+    """
+
+    if self.unique:
+      return self.result[0] if self.result else None
+
+    return self.result
+
+
+def _startCall(call, request, response):
+  """Starts an asynchronous datastore RPC and returns it.
+  """
+
+  # the hooks are not called for RPCs that are made directly, so call
+  # them here like urlfetch does, the RPC accounting relies on them
+  apiproxy_stub_map.apiproxy.GetPreCallHooks().Call(
+      DEF_SERVICE, call, request, response)
+
+  rpc = apiproxy_stub_map.CreateRPC(DEF_SERVICE)
+  rpc.MakeCall(DEF_SERVICE, call, request, response)
+
+  return rpc
+
+
+def _finishCall(rpc):
+  """Waits for rpc to finish and returns its response.
+
+  Raises:
+    datastore_errors.Error: when the datastore returned an error
+  """
+
+  if rpc.state is apiproxy_rpc.RPC.RUNNING:
+    rpc.Wait()
+
+  try:
+    rpc.CheckSuccess()
+  except apiproxy_errors.ApplicationError, error:
+    datastore._ToDatastoreError(error)
+
+  apiproxy_stub_map.apiproxy.GetPostCallHooks().Call(
+      DEF_SERVICE, rpc.call, rpc.request, rpc.response)
+
+  return rpc.response
+
+
+def _runStep(fetches, step):
+  """Calls step on each fetch, recording the errors the datastore raises.
+
+  Fetches for which the SDK internals do not behave as expected are
+  marked unsupported, they are fetched with getForFields instead.
+
+  Returns:
+    The fetches for which step returned a true value.
+  """
+
+  result = []
+
+  for fetch in fetches:
+    try:
+      if step(fetch):
+        result.append(fetch)
+    except db.NeedIndexError, exception:
+      fetch.error = exception
+      fetch.rpc = None
+      fetch.result = []
+    except (AttributeError, TypeError), exception:
+      logging.exception("Could not fetch %s in parallel: %s" % (
+          fetch.logic._model, exception))
+      fetch.unsupported = True
+      fetch.rpc = None
+
+  return result
+
+
+def getForFields(calls):
+  """Runs several getForFields calls concurrently.
+
+  Args:
+    calls: a list of (logic, kwargs) tuples, kwargs being the keyword
+           arguments for getForFields of that logic
+
+  Returns:
+    A list with the result of each call, in the same order.
+  """
+
+  fetches = [_Fetch(logic, **kwargs) for logic, kwargs in calls]
+  start = time.time()
+
+  parallel = []
+  sequential = []
+
+  for fetch in fetches:
+    if fetch.isParallel():
+      parallel.append(fetch)
+    else:
+      sequential.append(fetch)
+
+  started = _runStep(parallel, lambda i: i.startQuery() or True)
+  running = _runStep(started, lambda i: i.startNext())
+  _runStep(running, lambda i: i.finishNext() or True)
+
+  duration = time.time() - start
+
+  unsupported = [i for i in parallel if i.unsupported]
+  parallel = [i for i in parallel if not i.unsupported]
+
+  for fetch in sequential + unsupported:
+    fetch.fetchNow()
+
+  for fetch in parallel:
+    if fetch.error:
+      logging.error("%s, model: %s filter: %s, order: %s" % (
+          fetch.error, fetch.logic._model, fetch.filter, fetch.order))
+
+    # all queries ran concurrently, so each took the duration of the batch
+    queries.record(fetch.query, fetch.limit, fetch.offset, len(fetch.result),
+                   duration, error=fetch.error)
+
+  return [i.getResult() for i in fetches]
@@ -0,0 +1,362 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Checks queries against the composite indexes in index.yaml.
+
+A query that needs a composite index that is not defined fails with a
+NeedIndexError. If such a query has an equality filter on one of
+DEF_BOUNDING_FIELDS it only matches the entities of a single scope, so
+instead the equality filters are queried, which needs no composite index,
+and the other filters and the sort order are applied in memory. This is
+only done if fewer than DEF_FALLBACK_LIMIT entities match the equality
+filters, otherwise the result could be incomplete and the query fails.
+
+Query shapes that are not covered by index.yaml are logged once per
+instance, together with the index definition they need, and are listed
+by getUncovered.
+"""
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import logging
+import os
+
+from google.appengine.api import datastore
+from google.appengine.api import validation
+from google.appengine.api import yaml_errors
+from google.appengine.datastore import datastore_index
+from google.appengine.ext import db
+
+from django.conf import settings
+
+from soc.profiling import queries
+
+
+#: Equality filters on these fields bound the amount of matching entities,
+#: except for 'scope' on kinds whose scope is a program, see
+#: Logic.getBoundingFields
+DEF_BOUNDING_FIELDS = ['scope', 'org']
+
+#: The most entities that are fetched to filter and sort in memory
+DEF_FALLBACK_LIMIT = 1000
+
+#: The index file in the application root, see skip_files in app.yaml
+DEF_INDEX_FILE = 'index.yaml'
+
+# the index keys defined in index.yaml, None if they are not loaded yet
+_indexes = None
+
+# whether loading index.yaml failed, all queries are assumed covered then
+_unknown = False
+
+# shape -> whether index.yaml covers the shape
+_covered = {}
+
+# shape -> the index definition the shape needs, for uncovered shapes
+_uncovered = {}
+
+
+def loadIndexes(path=None):
+  """Loads the composite indexes from index.yaml.
+
+  Args:
+    path: the path of the index file, defaults to DEF_INDEX_FILE in the
+          application root
+
+  Returns:
+    A list of (kind, ancestor, properties) tuples, see IndexToKey in
+    google.appengine.datastore.datastore_index, or None if the file
+    could not be loaded.
+  """
+
+  if not path:
+    path = os.path.join(settings.ROOT_PATH, DEF_INDEX_FILE)
+
+  try:
+    index_file = open(path)
+
+    try:
+      definitions = datastore_index.ParseIndexDefinitions(index_file)
+    finally:
+      index_file.close()
+  except (IOError, validation.Error, yaml_errors.Error), exception:
+    logging.error("Could not load the composite indexes: %s" % exception)
+    return None
+
+  if not definitions or not definitions.indexes:
+    return []
+
+  return [datastore_index.IndexToKey(i) for i in definitions.indexes]
+
+
+def setIndexes(indexes):
+  """Replaces the known composite indexes and forgets the checked shapes.
+
+  Args:
+    indexes: a list as returned by loadIndexes, or None to load them again
+  """
+
+  global _indexes, _unknown
+
+  _indexes = indexes
+  _unknown = False
+  _covered.clear()
+  _uncovered.clear()
+
+
+def _isServedBy(required, num_eq, index):
+  """Returns True iff the composite index serves the required index.
+
+  Both required and index are (kind, ancestor, properties) tuples, the
+  first num_eq properties of required are equality filters and may be
+  in any order.
+  """
+
+  kind, ancestor, props = required
+
+  if required == index:
+    return True
+
+  if (kind, ancestor) != index[:2]:
+    return False
+
+  index_props = index[2]
+
+  return (set(props[:num_eq]) == set(index_props[:num_eq]) and
+          props[num_eq:] == index_props[num_eq:])
+
+
+def isCovered(query):
+  """Returns True iff the datastore can run query with the defined indexes.
+
+  Args:
+    query: a db.Query as returned by Logic.getQueryForFields
+  """
+
+  global _indexes, _unknown
+
+  shape = queries.getQueryShape(query)
+
+  if shape in _covered:
+    return _covered[shape]
+
+  if _indexes is None:
+    _indexes = loadIndexes()
+
+    if _indexes is None:
+      # only try, and log the failure, once per instance
+      _indexes = []
+      _unknown = True
+
+  if _unknown:
+    # without index.yaml nothing is known, so assume the datastore can run it
+    _covered[shape] = True
+    return True
+
+  try:
+    # pylint: disable-msg=W0212
+    datastore_query = query._get_query()
+
+    if isinstance(datastore_query, datastore.MultiQuery):
+      # the subqueries of a MultiQuery are not exposed
+      _covered[shape] = True
+      return True
+
+    # pylint: disable-msg=W0212
+    required, kind, ancestor, props, num_eq = \
+        datastore_index.CompositeIndexForQuery(datastore_query._ToPb())
+  except (AttributeError, TypeError), exception:
+    # these are internals of the SDK, they may change when it is upgraded
+    logging.error("Could not check query %s: %s" % (shape, exception))
+    _covered[shape] = True
+    return True
+
+  key = (kind, ancestor, props)
+  covered = not required or bool(
+      [i for i in _indexes if _isServedBy(key, num_eq, i)])
+
+  _covered[shape] = covered
+
+  if not covered:
+    definition = datastore_index.IndexYamlForQuery(kind, ancestor, props)
+    _uncovered[shape] = definition
+    logging.warning("Query %s is not covered by index.yaml, it needs:\n%s" % (
+        shape, definition))
+
+  return covered
+
+
+def getUncovered():
+  """Returns the query shapes not covered by index.yaml on this instance.
+
+  Returns:
+    A list of dictionaries with the shape and the index definition
+    it needs, sorted by shape.
+  """
+
+  return [{'shape': shape, 'definition': definition}
+          for shape, definition in sorted(_uncovered.iteritems())]
+
+
+def _splitFilter(filter):
+  """Splits filter into a list of (name, operator, value) tuples.
+  """
+
+  result = []
+
+  for key, value in (filter or {}).iteritems():
+    parts = key.split()
+    name = parts[0]
+    op = len(parts) > 1 and parts[1].upper() or '='
+
+    if isinstance(value, list):
+      if len(value) == 1:
+        value = value[0]
+      else:
+        op = 'IN'
+
+    result.append((name, op, value))
+
+  return result
+
+
+def getFallbackFilter(model, filter, order, bounding_fields=None):
+  """Returns the filter to query when query can not use an index.
+
+  Args:
+    model: the model that is queried
+    filter, order: as for Logic.getForFields
+    bounding_fields: the fields that bound the amount of matching entities
+                     of model, defaults to DEF_BOUNDING_FIELDS
+
+  Returns:
+    The plain equality filters of filter if one of them is on one of
+    bounding_fields and all filtered and ordered fields are properties
+    of model, None otherwise.
+  """
+
+  if bounding_fields is None:
+    bounding_fields = DEF_BOUNDING_FIELDS
+
+  properties = model.properties()
+  fallback = {}
+
+  for name, op, value in _splitFilter(filter):
+    if name not in properties:
+      return None
+
+    if op == '=':
+      fallback[name] = value
+
+  for name in order or []:
+    if name.lstrip('-') not in properties:
+      return None
+
+  for name in bounding_fields:
+    if name in fallback:
+      return fallback
+
+  return None
+
+
+def _matches(value, op, expected):
+  """Returns True iff a single property value matches a filter.
+  """
+
+  if op == '=':
+    return value == expected
+  if op == 'IN':
+    return value in expected
+  if op == '!=':
+    return value != expected
+  if op == '<':
+    return value < expected
+  if op == '<=':
+    return value <= expected
+  if op == '>':
+    return value > expected
+  if op == '>=':
+    return value >= expected
+
+  raise ValueError("Unknown operator '%s'" % op)
+
+
+def _toDatastore(value):
+  """Returns value the way the datastore stores it.
+  """
+
+  if isinstance(value, list):
+    return [_toDatastore(i) for i in value]
+
+  if isinstance(value, db.Model):
+    return value.key()
+
+  return value
+
+
+def filterEntities(model, entities, filter, order):
+  """Filters and sorts entities in memory like the datastore would.
+
+  An entity matches a filter on a list property if any of its values
+  matches. Entities are sorted on the smallest value of a list property
+  in ascending order and on the largest in descending order, ties are
+  broken by key.
+
+  Args:
+    model: the model of the entities
+    entities: a list of model instances
+    filter, order: as for Logic.getForFields
+
+  Returns:
+    A new list with the entities that match filter, sorted by order.
+  """
+
+  properties = model.properties()
+  filters = [(properties[name], op, _toDatastore(value))
+             for name, op, value in _splitFilter(filter)]
+
+  def values(entity, prop):
+    value = prop.get_value_for_datastore(entity)
+
+    if isinstance(value, list):
+      return value
+
+    return [value]
+
+  result = []
+
+  for entity in entities:
+    for prop, op, expected in filters:
+      if not [i for i in values(entity, prop) if _matches(i, op, expected)]:
+        break
+    else:
+      result.append(entity)
+
+  # sorting is stable, so sort on the last criterion first
+  result.sort(key=lambda i: i.key())
+
+  for name in reversed(order or []):
+    prop = properties[name.lstrip('-')]
+
+    if name.startswith('-'):
+      result.sort(key=lambda i: max(values(i, prop) or [None]), reverse=True)
+    else:
+      result.sort(key=lambda i: min(values(i, prop) or [None]))
+
+  return result
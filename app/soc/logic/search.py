@@ -0,0 +1,393 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Full-text search over selected kinds using an inverted index.
+
+For each term the keys of the entities containing it are stored in posting
+lists, which are spread over DEF_SHARDS entities per term by the hash of
+the entity key. Searching for multiple terms intersects their posting
+lists. The index is maintained by soc.logic.models.base.Logic when
+entities are created, updated or deleted: it only stores the new terms of
+the entity in its SearchDocument, the posting lists are updated in batches
+by the updateSearchIndex cron job in soc.cron.search_indexer.
+"""
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import re
+import zlib
+
+from google.appengine.ext import db
+
+from soc.models.search_index import SearchDocument
+from soc.models.search_index import SearchPostingList
+
+
+#: The kinds that are indexed, together with the properties they are
+#: indexed on. Entities of subclasses of these kinds are indexed as the
+#: kind they derive from.
+DEF_INDEXED_KINDS = {
+    'StudentProposal': ['title', 'abstract'],
+    'Organization': ['name', 'description'],
+    'Document': ['title', 'content'],
+    }
+
+#: Amount of posting lists the entities containing a term are spread over
+DEF_SHARDS = 8
+
+#: Maximum amount of distinct terms an entity is indexed with
+DEF_MAX_TERMS = 250
+
+#: Terms that are too common to be indexed
+DEF_STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in',
+    'is', 'it', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was',
+    'will', 'with',
+    ])
+
+_TAG_RE = re.compile(r'<[^>]*>')
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def getIndexedKindForModel(model):
+  """Returns the kind entities of model are indexed as, or None if they
+  are not indexed.
+  """
+
+  for cls in model.__mro__:
+    if cls.__name__ in DEF_INDEXED_KINDS:
+      return cls.__name__
+
+  return None
+
+
+def getIndexedKind(entity):
+  """Returns the kind entity is indexed as, or None if it is not indexed.
+  """
+
+  return getIndexedKindForModel(type(entity))
+
+
+def tokenize(text):
+  """Returns the distinct terms in text in order of first occurrence.
+
+  Markup is removed, terms are lowercased and stop words are left out.
+  """
+
+  if not text:
+    return []
+
+  text = _TAG_RE.sub(' ', unicode(text)).lower()
+
+  terms = []
+  seen = set()
+
+  for term in _WORD_RE.findall(text):
+    if len(term) < 2 or term in DEF_STOP_WORDS or term in seen:
+      continue
+
+    seen.add(term)
+    terms.append(term)
+
+  return terms
+
+
+def getTerms(entity, kind_name):
+  """Returns the terms entity should be indexed with.
+  """
+
+  terms = []
+
+  for name in DEF_INDEXED_KINDS[kind_name]:
+    for term in tokenize(getattr(entity, name, None)):
+      if term not in terms:
+        terms.append(term)
+
+  return terms[:DEF_MAX_TERMS]
+
+
+def _getShard(key):
+  """Returns the shard the posting of key is stored in.
+  """
+
+  return zlib.crc32(str(key)) % DEF_SHARDS
+
+
+def _getPostingKeyName(kind_name, shard, term):
+  """Returns the key name of a posting list.
+  """
+
+  return '%s/%d/%s' % (kind_name, shard, term)
+
+
+def _updatePosting(kind_name, term, key_name, adds, removes):
+  """Adds the keys in adds to and removes the keys in removes from a single
+  posting list in a transaction.
+  """
+
+  def update_txn():
+    """Transaction that updates a single posting list.
+    """
+
+    posting = SearchPostingList.get_by_key_name(key_name)
+
+    if not posting:
+      if not adds:
+        return
+
+      posting = SearchPostingList(key_name=key_name, kind_name=kind_name,
+                                  term=term)
+
+    entities = [i for i in posting.entities if i not in removes]
+    entities += [i for i in adds if i not in entities]
+
+    if entities == posting.entities:
+      return
+
+    posting.entities = entities
+
+    if entities:
+      posting.put()
+    else:
+      posting.delete()
+
+  db.run_in_transaction(update_txn)
+
+
+def _markDocuments(entities, kind_names, terms):
+  """Stores the terms each entity should be indexed with as pending.
+
+  Args:
+    entities: a list of indexed entities
+    kind_names: the kind each entity is indexed as
+    terms: the terms each entity should be indexed with, or None for
+           entities that are about to be deleted
+  """
+
+  key_names = [str(i.key()) for i in entities]
+  documents = SearchDocument.get_by_key_name(key_names)
+
+  changed = []
+
+  for key_name, kind_name, document, new_terms in zip(
+      key_names, kind_names, documents, terms):
+    if not document:
+      if not new_terms:
+        continue
+
+      document = SearchDocument(key_name=key_name, kind_name=kind_name)
+
+    new_terms = new_terms or []
+
+    if document.pending:
+      if document.pending_terms == new_terms:
+        continue
+    elif document.is_saved() and document.terms == new_terms:
+      continue
+
+    document.pending_terms = new_terms
+    document.pending = True
+    changed.append(document)
+
+  if changed:
+    db.put(changed)
+
+
+def indexEntities(entities):
+  """Marks the index of created or updated entities for updating.
+
+  The terms of all entities are stored in a single batch, the posting lists
+  are updated later on by updatePending. Entities of kinds that are not
+  indexed are ignored.
+  """
+
+  indexed = []
+  kind_names = []
+  terms = []
+
+  for entity in entities:
+    kind_name = getIndexedKind(entity)
+
+    if kind_name:
+      indexed.append(entity)
+      kind_names.append(kind_name)
+      terms.append(getTerms(entity, kind_name))
+
+  if indexed:
+    _markDocuments(indexed, kind_names, terms)
+
+
+def indexEntity(entity):
+  """Marks the index of a created or updated entity for updating.
+
+  This only stores the document of the entity, see indexEntities.
+  """
+
+  indexEntities([entity])
+
+
+def unindexEntity(entity):
+  """Marks an entity that is about to be deleted for removal from the index.
+  """
+
+  kind_name = getIndexedKind(entity)
+
+  if not kind_name:
+    return
+
+  _markDocuments([entity], [kind_name], [None])
+
+
+def getPendingDocuments(limit):
+  """Returns at most limit documents whose posting lists are not updated.
+  """
+
+  return SearchDocument.all().filter('pending =', True).fetch(limit)
+
+
+def updatePending(documents):
+  """Updates the posting lists for documents to their pending terms.
+
+  The changes of all documents are grouped per posting list, so that each
+  posting list is written once. Afterwards the documents are marked as
+  indexed, unless they were changed again in the meantime.
+
+  Args:
+    documents: a list of SearchDocument entities, as returned by
+               getPendingDocuments
+  """
+
+  # posting key name -> (kind_name, term, adds, removes)
+  changes = {}
+
+  def change(kind_name, term, key):
+    """Returns the changes to the posting list for term that holds key.
+    """
+
+    key_name = _getPostingKeyName(kind_name, _getShard(key), term)
+
+    if key_name not in changes:
+      changes[key_name] = (kind_name, term, [], [])
+
+    return changes[key_name]
+
+  for document in documents:
+    key = db.Key(document.key().name())
+    old_set = set(document.terms)
+    new_set = set(document.pending_terms)
+
+    for term in document.terms:
+      if term not in new_set:
+        change(document.kind_name, term, key)[3].append(key)
+
+    for term in document.pending_terms:
+      if term not in old_set:
+        change(document.kind_name, term, key)[2].append(key)
+
+  for key_name, (kind_name, term, adds, removes) in changes.iteritems():
+    _updatePosting(kind_name, term, key_name, adds, removes)
+
+  for document in documents:
+    _finishDocument(document.key(), document.pending_terms)
+
+
+def _finishDocument(document_key, indexed_terms):
+  """Marks a document as indexed with indexed_terms.
+
+  The document stays pending if its pending terms changed since they were
+  read, deleted entities have their document removed.
+  """
+
+  def finish_txn():
+    """Transaction that updates a single document.
+    """
+
+    document = db.get(document_key)
+
+    if not document:
+      return
+
+    document.terms = indexed_terms
+
+    if document.pending_terms == indexed_terms:
+      document.pending = False
+
+      if not indexed_terms:
+        document.delete()
+        return
+
+    document.put()
+
+  db.run_in_transaction(finish_txn)
+
+
+def searchKeys(kind_name, query):
+  """Returns the keys of the entities of a kind that contain all terms in
+  query, in key order.
+
+  Args:
+    kind_name: one of the kinds in DEF_INDEXED_KINDS
+    query: a string with the terms to search for
+  """
+
+  terms = tokenize(query)
+
+  if not terms:
+    return []
+
+  key_names = [_getPostingKeyName(kind_name, shard, term)
+               for term in terms for shard in range(DEF_SHARDS)]
+
+  # retrieve the posting lists of all terms at once
+  postings = SearchPostingList.get_by_key_name(key_names)
+
+  result = None
+
+  for index in range(len(terms)):
+    shards = postings[index * DEF_SHARDS:(index + 1) * DEF_SHARDS]
+
+    keys = set()
+    for posting in shards:
+      if posting:
+        keys.update(posting.entities)
+
+    if result is None:
+      result = keys
+    else:
+      result &= keys
+
+    if not result:
+      return []
+
+  return sorted(result)
+
+
+def search(kind_name, query, limit=20, offset=0):
+  """Returns the entities of a kind that contain all terms in query.
+
+  Args:
+    kind_name: one of the kinds in DEF_INDEXED_KINDS
+    query: a string with the terms to search for
+    limit: the maximum amount of entities to return
+    offset: the amount of matching entities to skip
+  """
+
+  keys = searchKeys(kind_name, query)[offset:offset + limit]
+
+  return [i for i in db.get(keys) if i]
@@ -27,6 +27,7 @@ __authors__ = [
 
 from google.appengine.ext import db
 
+from soc.cache import forms as forms_cache
 from soc.views.helper import forms as forms_helper
 
 
@@ -46,7 +47,6 @@ class ModelWithFieldAttributes(db.Model):
   be familiar to view creators.  
   """
 
-  _fields_cache = None
   DICT_TYPES = (db.StringProperty, db.IntegerProperty)
 
   def toDict(self, field_names=None):
@@ -97,16 +97,23 @@ class ModelWithFieldAttributes(db.Model):
       access Property attributes that are not accessible from the
       Property itself via the Model entity.
     """
-    if not cls._fields_cache or (cls != cls._fields_cache.__class__.Meta.model):
-      class FieldsProxy(forms_helper.BaseForm):
-        """Form used as a proxy to access User model properties attributes.
+
+    cache_key = forms_cache.key('fields', cls)
+    return forms_cache.getOrBuild(cache_key, cls._buildFieldsProxy)
+
+  @classmethod
+  def _buildFieldsProxy(cls):
+    """Builds the unbound Form object that is returned by fields().
+    """
+
+    class FieldsProxy(forms_helper.BaseForm):
+      """Form used as a proxy to access User model properties attributes.
+      """
+
+      class Meta:
+        """Inner Meta class that pairs the User Model with this "form".
         """
-      
-        class Meta:
-          """Inner Meta class that pairs the User Model with this "form".
-          """
-          #: db.Model subclass for which to access model properties attributes
-          model = cls
-      
-      cls._fields_cache = FieldsProxy()
-    return cls._fields_cache
+        #: db.Model subclass for which to access model properties attributes
+        model = cls
+
+    return FieldsProxy()
@@ -0,0 +1,59 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module contains the UserProjectIndex Model.
+"""
+
+__authors__ = [
+  '"Lennard de Rijk" <ljvderijk@gmail.com>',
+]
+
+
+from google.appengine.ext import db
+
+import soc.models.program
+import soc.models.user
+
+
+class UserProjectIndex(db.Model):
+  """Index of the Student Projects a User is involved in for a Program.
+
+  The key name is <program key name>/<user key name>, so that all projects
+  of a user in a program can be found with a single get. The index is
+  maintained by the Student Project logic.
+  """
+
+  #: The User this index is for
+  user = db.ReferenceProperty(reference_class=soc.models.user.User,
+                              required=True,
+                              collection_name='project_indices')
+
+  #: The Program this index is for
+  program = db.ReferenceProperty(reference_class=soc.models.program.Program,
+                                 required=True,
+                                 collection_name='project_indices')
+
+  #: The Student roles of the user in this program that have projects
+  student_roles = db.ListProperty(item_type=db.Key, default=[])
+
+  #: The projects of which the user is the student
+  student_projects = db.ListProperty(item_type=db.Key, default=[])
+
+  #: The Mentor roles of the user in this program that have projects
+  mentor_roles = db.ListProperty(item_type=db.Key, default=[])
+
+  #: The projects the user is the mentor or an additional mentor for
+  mentor_projects = db.ListProperty(item_type=db.Key, default=[])
@@ -0,0 +1,67 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module contains the models of the full-text search index.
+"""
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+]
+
+
+from google.appengine.ext import db
+
+
+class SearchPostingList(db.Model):
+  """The keys of the entities of one kind that contain a term.
+
+  The entities containing a term are spread over a number of posting
+  lists, the key name is <kind>/<shard>/<term>. See soc.logic.search.
+  """
+
+  #: The kind of the entities in this posting list
+  kind_name = db.StringProperty(required=True)
+
+  #: The term the entities contain
+  term = db.StringProperty(required=True)
+
+  #: The keys of the entities that contain the term, posting lists are
+  #: only retrieved by key name so this is not indexed
+  entities = db.ListProperty(item_type=db.Key, default=[], indexed=False)
+
+
+class SearchDocument(db.Model):
+  """The terms an indexed entity has been added to the posting lists for.
+
+  The key name is str() of the key of the indexed entity, it is used to
+  determine which posting lists have to change when the entity changes.
+  The posting lists are updated by a cron job, until then the new terms
+  are stored in pending_terms.
+  """
+
+  #: The kind the entity is indexed as
+  kind_name = db.StringProperty(required=True)
+
+  #: The terms the entity has been indexed with
+  terms = db.StringListProperty(default=[], indexed=False)
+
+  #: The terms the entity should be indexed with, an empty list for
+  #: entities that have been deleted
+  pending_terms = db.StringListProperty(default=[], indexed=False)
+
+  #: Whether the posting lists still have to be updated to pending_terms,
+  #: the only property documents are queried on
+  pending = db.BooleanProperty(default=False)
@@ -22,13 +22,15 @@ __authors__ = [
   ]
 
 
-import itertools
 import logging
 import random
+import urllib
 
+from google.appengine.api import datastore
 from google.appengine.api import users
 from google.appengine.api import memcache
 from google.appengine.ext import db
+from google.appengine.runtime import DeadlineExceededError
 
 from django import http
 
@@ -44,6 +46,7 @@ from soc.models.org_admin import OrgAdmin
 from soc.models.organization import Organization
 from soc.models.org_app import OrgApplication
 from soc.models.program import Program
+from soc.models.project_index import UserProjectIndex
 from soc.models.ranker_root import RankerRoot
 from soc.models.site import Site
 from soc.models.student import Student
@@ -53,6 +56,36 @@ from soc.models.timeline import Timeline
 from soc.models.user import User
 
 
+# amount of seeded entities to store with a single batch put
+DEF_PUT_BATCH_SIZE = 100
+
+# amount of keys to delete with a single batch delete
+DEF_DELETE_BATCH_SIZE = 500
+
+# the kinds that are removed by clear, children before their parents
+DEF_CLEAR_KINDS = [
+    Notification.kind(),
+    UserProjectIndex.kind(),
+    Mentor.kind(),
+    Student.kind(),
+    OrgAdmin.kind(),
+    'ranker_score',
+    'ranker_node',
+    'ranker',
+    RankerRoot.kind(),
+    StudentProposal.kind(),
+    Organization.kind(),
+    OrgApplication.kind(),
+    Timeline.kind(),
+    Program.kind(),
+    Host.kind(),
+    Sponsor.kind(),
+    User.kind(),
+    Site.kind(),
+    Document.kind(),
+    ]
+
+
 class Error(Exception):
   """Base class for all exceptions raised by this module.
   """
@@ -793,7 +826,7 @@ def new_seed_many(request, *args, **kwargs):
   for i in xrange(start_index, goal):
     if i % 20 == 0:
       logging.info("Inserting: %d of %d" % (i+1, goal))
-    if len(seeded_entities) % 100 == 0:
+    if len(seeded_entities) >= DEF_PUT_BATCH_SIZE:
       db.put(seeded_entities)
       total += len(seeded_entities)
       seeded_entities = []
@@ -843,6 +876,7 @@ def seed_many(request, *args, **kwargs):
     return http.HttpResponse('Unknown seed_type: "%s".' % seed_type)
 
   action, model = seed_types[seed_type]
+  entities = []
 
   for i in range(start, end):
     try:
@@ -851,8 +885,13 @@ def seed_many(request, *args, **kwargs):
       return http.HttpResponse(error.message)
 
     for properties in props if isinstance(props, list) else [props]:
-      entity = model(**properties)
-      entity.put()
+      entities.append(model(**properties))
+
+    if len(entities) >= DEF_PUT_BATCH_SIZE:
+      db.put(entities)
+      entities = []
+
+  db.put(entities)
 
   if end < goal:
     info = {
@@ -870,44 +909,383 @@ def seed_many(request, *args, **kwargs):
   return http.HttpResponse('Done.')
 
 
-def clear(*args, **kwargs):
-  """Removes all entities from the datastore.
+# the types seeded by seed_scenario together with the amount of entities
+# of each of them in a GSoC-scale program, in the order they are seeded in
+DEF_GSOC_SCALE = [
+    ('user', 50000),
+    ('org', 150),
+    ('mentor', 3000),
+    ('student', 15000),
+    ('student_proposal', 20000),
+    ]
+
+# amount of entities seed_scenario seeds per request
+DEF_SCENARIO_STEP = 1000
+
+# words the titles of the seeded proposals are made up from
+DEF_PROPOSAL_WORDS = [
+    'accessibility', 'api', 'backend', 'cache', 'compiler', 'debugger',
+    'documentation', 'editor', 'engine', 'gui', 'import', 'index', 'kernel',
+    'library', 'mobile', 'network', 'parser', 'plugin', 'port', 'profiler',
+    'scheduler', 'search', 'security', 'storage', 'testing', 'web',
+    ]
+
+
+class GSoCScaleScenario(object):
+  """Seeds the users, orgs, mentors, students and proposals of a GSoC-scale
+  program into the gsoc2009 program created by seed.
+
+  Everything that is chosen at random is derived from the seed value and
+  the position of the entity, so the same seed value always results in the
+  same dataset, no matter how the seeding is spread over requests.
   """
 
-  # there no explicit ranker model anywhere, so make one for
-  # our own convenience to delete all rankers
-  class ranker(db.Model):
-    """ranker model used with ranklist module.
+  def __init__(self, seed_value, sizes):
+    """Retrieves the program and validates the amount of each type.
+
+    Args:
+      seed_value: the int the random choices are derived from
+      sizes: a dictionary with the amount of entities for each type in
+             DEF_GSOC_SCALE
+    """
+
+    self.seed_value = seed_value
+    self.sizes = sizes
+
+    if sizes['user'] < sizes['mentor'] + sizes['student']:
+      raise Error('There have to be enough users for all mentors and '
+                  'students.')
+
+    if sizes['student_proposal'] and not (sizes['org'] and sizes['student']):
+      raise Error('Proposals need at least one org and one student.')
+
+    if sizes['mentor'] and not sizes['org']:
+      raise Error('Mentors need at least one org.')
+
+    self.program = Program.get_by_key_name('google/gsoc2009')
+
+    if not self.program:
+      raise Error('Run seed_db first')
+
+    _, self.current_user = ensureUser()
+
+  def seedRange(self, seed_type, start, end):
+    """Seeds the entities of seed_type from start up to end.
+    """
+
+    seed_func = getattr(self, seed_type)
+    entities = []
+
+    for i in xrange(start, end):
+      entities.append(seed_func(i))
+
+      if len(entities) >= DEF_PUT_BATCH_SIZE:
+        self._put(seed_type, entities)
+        entities = []
+
+    self._put(seed_type, entities)
+
+  def _put(self, seed_type, entities):
+    """Stores a batch of seeded entities.
     """
-    pass
-
-  # TODO(dbentley): If there are more than 1000 instances of any model,
-  # this method will not clear all instances.  Instead, it should continually
-  # call .all(), delete all those, and loop until .all() is empty.
-  entities = itertools.chain(*[
-      Notification.all(),
-      Mentor.all(),
-      Student.all(),
-      OrgAdmin.all(),
-      ranker.all(),
-      RankerRoot.all(),
-      StudentProposal.all(),
-      Organization.all(),
-      OrgApplication.all(),
-      Timeline.all(),
-      Program.all(),
-      Host.all(),
-      Sponsor.all(),
-      User.all(),
-      Site.all(),
-      Document.all(),
-      ])
+
+    db.put(entities)
+
+    if seed_type != 'org':
+      return
+
+    for org in entities:
+      # create a new ranker
+      ranker_root_logic.create(student_proposal.DEF_RANKER_NAME, org,
+          student_proposal.DEF_SCORE, 100)
+
+  def _random(self, seed_type, i):
+    """Returns the random generator for the ith entity of seed_type.
+    """
+
+    return random.Random('%d/%s/%d' % (self.seed_value, seed_type, i))
+
+  def _userKeyName(self, i):
+    """Returns the key name of the ith user.
+    """
+
+    return 'scale_user_%d' % i
+
+  def _orgKeyName(self, i):
+    """Returns the key name of the ith org.
+    """
+
+    return 'google/gsoc2009/scale_org_%d' % i
+
+  def _mentorKeyName(self, i):
+    """Returns the key name of the ith mentor.
+    """
+
+    org_key_name = self._orgKeyName(i % self.sizes['org'])
+    return '%s/scale_mentor_%d' % (org_key_name, i)
+
+  def _studentKeyName(self, i):
+    """Returns the key name of the ith student.
+    """
+
+    return 'google/gsoc2009/scale_student_%d' % i
+
+  def _roleProperties(self, key_name, scope_key, user_index):
+    """Returns the properties that are common to mentors and students.
+    """
+
+    user_key_name = self._userKeyName(user_index)
+
+    return {
+        'key_name': key_name,
+        'link_id': key_name.split('/')[-1],
+        'scope_path': scope_key.name(),
+        'scope': scope_key,
+        'user': db.Key.from_path(User.kind(), user_key_name),
+        'given_name': 'User',
+        'surname': '%d' % user_index,
+        'name_on_documents': 'User %d' % user_index,
+        'email': '%s@example.com' % user_key_name,
+        'res_street': 'Some Street',
+        'res_city': 'Some City',
+        'res_state': 'Some State',
+        'res_country': 'United States',
+        'res_postalcode': '12345',
+        'phone': '1-555-BANANA',
+        'birth_date': db.DateProperty.now(),
+        'agreed_to_tos': True,
+        }
+
+  def user(self, i):
+    """Returns the ith user.
+    """
+
+    key_name = self._userKeyName(i)
+
+    properties = {
+        'key_name': key_name,
+        'link_id': key_name,
+        'account': users.User(email='%s@example.com' % key_name),
+        'name': 'User %d' % i,
+        }
+
+    return User(**properties)
+
+  def org(self, i):
+    """Returns the ith org.
+    """
+
+    key_name = self._orgKeyName(i)
+
+    properties = {
+        'key_name': key_name,
+        'link_id': key_name.split('/')[-1],
+        'name': 'Organization %d' % i,
+        'short_name': 'Org %d' % i,
+        'founder': self.current_user,
+        'scope_path': 'google/gsoc2009',
+        'scope': self.program,
+        'status': 'active',
+        'email': 'scale_org_%d@example.com' % i,
+        'home_page': 'http://code.google.com/p/soc',
+        'description': 'Melange, share the love!',
+        'license_name': 'Apache License',
+        'contact_street': 'Some Street',
+        'contact_city': 'Some City',
+        'contact_country': 'United States',
+        'contact_postalcode': '12345',
+        'phone': '1-555-BANANA',
+        'ideas': 'http://code.google.com/p/soc/issues',
+        }
+
+    return Organization(**properties)
+
+  def mentor(self, i):
+    """Returns the ith mentor, the mentors are spread evenly over the orgs.
+    """
+
+    org_key = db.Key.from_path(Organization.kind(),
+                               self._orgKeyName(i % self.sizes['org']))
+
+    properties = self._roleProperties(self._mentorKeyName(i), org_key, i)
+    properties['program'] = self.program
+
+    return Mentor(**properties)
+
+  def student(self, i):
+    """Returns the ith student.
+    """
+
+    user_index = self.sizes['mentor'] + i
+
+    properties = self._roleProperties(self._studentKeyName(i),
+                                      self.program.key(), user_index)
+    properties.update({
+        'school_name': 'School %d' % (i % 500),
+        'school_country': 'United States',
+        'major': 'Computer Science',
+        'degree': 'Undergraduate',
+        'expected_graduation': 2012,
+        'program_knowledge': 'Knowledge %d' % i,
+        'can_we_contact_you': True,
+        })
+
+    return Student(**properties)
+
+  def student_proposal(self, i):
+    """Returns the ith proposal to a random org with a random mentor.
+
+    The proposals are spread evenly over the students.
+    """
+
+    rng = self._random('student_proposal', i)
+
+    orgs = self.sizes['org']
+    org_index = rng.randrange(orgs)
+    org_key = db.Key.from_path(Organization.kind(),
+                               self._orgKeyName(org_index))
+
+    # the mentors of an org are the ones with the same index modulo orgs
+    mentor_indices = range(org_index, self.sizes['mentor'], orgs)
+
+    if mentor_indices:
+      mentor_key = db.Key.from_path(Mentor.kind(),
+          self._mentorKeyName(rng.choice(mentor_indices)))
+    else:
+      mentor_key = None
+
+    student_key_name = self._studentKeyName(i % self.sizes['student'])
+    link_id = 'scale_proposal_%d' % i
+    title = ' '.join(rng.sample(DEF_PROPOSAL_WORDS, 3))
+
+    properties = {
+        'key_name': '%s/%s' % (student_key_name, link_id),
+        'link_id': link_id,
+        'scope_path': student_key_name,
+        'scope': db.Key.from_path(Student.kind(), student_key_name),
+        'title': 'Proposal %d: %s' % (i, title),
+        'abstract': 'This is an Awesome Proposal, look at its awesomeness!',
+        'content': 'Sorry, too Awesome for you to read!',
+        'additional_info': 'http://www.zipit.com',
+        'mentor': mentor_key,
+        'status': 'pending',
+        'org': org_key,
+        'program': self.program,
+        }
+
+    return StudentProposal(**properties)
+
+
+def seed_scenario(request, *args, **kwargs):
+  """Seeds a GSoC-scale program, see GSoCScaleScenario.
+
+  Understands the following GET args:
+    seed: the seed value the dataset is derived from, defaults to 0
+    stage: the index in DEF_GSOC_SCALE of the type to continue with
+    start: the first entity of that type to seed
+    step: how many entities to seed per request
+    user, org, mentor, student, student_proposal: the amount of entities
+      of that type, defaults to the amount in DEF_GSOC_SCALE
+
+  Redirects to itself until all entities have been seeded.
+  """
+
+  get_args = request.GET
+
+  seed_value = int(get_args.get('seed', '0'))
+  stage = int(get_args.get('stage', '0'))
+  start = int(get_args.get('start', '0'))
+  step = int(get_args.get('step', DEF_SCENARIO_STEP))
+
+  sizes = {}
+  for seed_type, size in DEF_GSOC_SCALE:
+    sizes[seed_type] = int(get_args.get(seed_type, size))
 
   try:
-    for entity in entities:
-      entity.delete()
-  except db.Timeout:
-    return http.HttpResponseRedirect('#')
+    scenario = GSoCScaleScenario(seed_value, sizes)
+  except Error, error:
+    return http.HttpResponse(error.message)
+
+  if stage < len(DEF_GSOC_SCALE):
+    seed_type = DEF_GSOC_SCALE[stage][0]
+    end = min(start + step, sizes[seed_type])
+
+    logging.info("Seeding %s: %d to %d" % (seed_type, start, end))
+    scenario.seedRange(seed_type, start, end)
+
+    if end < sizes[seed_type]:
+      start = end
+    else:
+      stage += 1
+      start = 0
+
+  if stage < len(DEF_GSOC_SCALE):
+    info = sizes.copy()
+    info.update({
+        'seed': seed_value,
+        'stage': stage,
+        'start': start,
+        'step': step,
+        })
+
+    url = '%s?%s' % (request.path, urllib.urlencode(info))
+    return http.HttpResponseRedirect(url)
+
+  # pylint: disable-msg=E1101
+  memcache.flush_all()
+
+  return http.HttpResponse('Done.')
+
+
+def clear(request, *args, **kwargs):
+  """Removes all entities of the seeded kinds from the datastore.
+
+  The keys of each kind are retrieved in key order with keys only queries
+  and deleted in batches. When the request runs out of time it redirects
+  to itself with the kind and the last deleted key, so that the next
+  request continues where this one stopped.
+
+  Understands the following GET args:
+    kind: the index in DEF_CLEAR_KINDS of the kind to continue with
+    start: the last key that was deleted of that kind
+  """
+
+  kind_index = int(request.GET.get('kind', '0'))
+  last_key = request.GET.get('start')
+
+  if last_key:
+    last_key = db.Key(last_key)
+
+  try:
+    for kind_index in range(kind_index, len(DEF_CLEAR_KINDS)):
+      kind = DEF_CLEAR_KINDS[kind_index]
+
+      while True:
+        filters = {}
+
+        if last_key:
+          filters['__key__ >'] = last_key
+
+        query = datastore.Query(kind, filters, keys_only=True)
+        query.Order('__key__')
+        keys = query.Get(DEF_DELETE_BATCH_SIZE)
+
+        if not keys:
+          break
+
+        db.delete(keys)
+        last_key = keys[-1]
+
+      last_key = None
+  except (db.Timeout, DeadlineExceededError):
+    args = {'kind': kind_index}
+
+    if last_key:
+      args['start'] = str(last_key)
+
+    url = '%s?%s' % (request.path, urllib.urlencode(args))
+    return http.HttpResponseRedirect(url)
+
   # pylint: disable-msg=E1101
   memcache.flush_all()
 
@@ -918,7 +1296,12 @@ def reseed(*args, **kwargs):
   """Clears and seeds the datastore.
   """
 
-  clear(*args, **kwargs)
+  response = clear(*args, **kwargs)
+
+  if isinstance(response, http.HttpResponseRedirect):
+    # clearing is not done yet, continue with it first
+    return response
+
   seed(*args, **kwargs)
 
   return http.HttpResponse('Done')
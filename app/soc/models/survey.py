@@ -29,18 +29,51 @@ __authors__ = [
 
 from google.appengine.ext import db
 
+from django.utils import simplejson
 from django.utils.translation import ugettext
 
+from soc.cache import survey as survey_cache
+
 import soc.models.work
 
 
+def parseSchema(schema):
+  """Parses a SurveyContent schema as stored in the datastore.
+
+  Schemas are stored as JSON, schemas that were stored before that as a
+  Python dictionary repr are still understood.
+
+  Args:
+    schema: the schema text
+
+  Returns:
+    The schema as a dictionary.
+  """
+
+  if not schema:
+    return {}
+
+  try:
+    return simplejson.loads(schema)
+  except ValueError:
+    # legacy schema, stored as repr of a dictionary
+    return eval(schema, {'__builtins__': None}, {})
+
+
+def dumpSchema(schema):
+  """Serializes a schema dictionary for storage in SurveyContent.schema.
+  """
+
+  return simplejson.dumps(schema, separators=(',', ':'))
+
+
 class SurveyContent(db.Expando):
   """Fields (questions) and schema representation of a Survey.
 
   Each survey content entity consists of properties where names and default
   values are set by the survey creator as survey fields.
 
-    schema: A dictionary (as text) storing, for each field:
+    schema: A dictionary (as JSON text) storing, for each field:
       - type
       - index
       - order (for choice questions)
@@ -55,11 +88,52 @@ class SurveyContent(db.Expando):
   created = db.DateTimeProperty(auto_now_add=True)
   modified = db.DateTimeProperty(auto_now=True)
 
+  def setSchema(self, schema):
+    """Stores the schema dictionary in this entity.
+    """
+
+    self.schema = dumpSchema(schema)
+
+  def getSchema(self):
+    """Returns the parsed schema of this survey.
+
+    The returned dictionary is shared between requests and should not be
+    modified, make a (deep)copy first if needed.
+    """
+
+    return self._getParsed()['schema']
+
   def getSurveyOrder(self):
     """Make survey questions always appear in the same (creation) order.
     """
+
+    return dict(self._getParsed()['order'])
+
+  def orderedProperties(self):
+    """Helper for View.get_fields(), keep field order.
+    """
+
+    return list(self._getParsed()['properties'])
+
+  def _getParsed(self):
+    """Returns the parsed schema together with the survey order.
+
+    The result is computed once per version of this entity, see
+    soc.cache.survey.
+    """
+
+    if not self.is_saved():
+      return self._parse()
+
+    return survey_cache.getOrParse(self, SurveyContent._parse)
+
+  def _parse(self):
+    """Parses the schema and precomputes the survey order from it.
+    """
+
+    schema = parseSchema(self.schema)
+
     survey_order = {}
-    schema = eval(self.schema)
     for property in self.dynamic_properties():
       # map out the order of the survey fields
       index = schema[property]["index"]
@@ -68,16 +142,16 @@ class SurveyContent(db.Expando):
       else:
         # Handle duplicated indexes
         survey_order[max(survey_order) + 1] = property
-    return survey_order
 
-  def orderedProperties(self):
-    """Helper for View.get_fields(), keep field order.
-    """
     properties = []
-    survey_order = self.getSurveyOrder().items()
-    for position,key in survey_order:
+    for position, key in survey_order.items():
       properties.insert(position, key)
-    return properties
+
+    return {
+        'schema': schema,
+        'order': survey_order,
+        'properties': properties,
+        }
 
 
 class Survey(soc.models.work.Work):
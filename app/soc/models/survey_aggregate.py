@@ -0,0 +1,57 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""SurveyAggregate holds the running statistics for a Survey's results.
+"""
+
+__authors__ = [
+  '"Daniel Diniz" <ajaksu@gmail.com>',
+]
+
+
+from google.appengine.ext import db
+
+from soc.models.survey import Survey
+
+
+class SurveyAggregate(db.Model):
+  """One shard of the aggregated results of a Survey.
+
+  The statistics of a Survey are spread over a number of shards so that
+  many people can take a survey at the same time without contending for
+  a single entity. The statistics of all shards added together make up
+  the statistics for the survey.
+  """
+
+  #: The survey for which this entity aggregates the results.
+  survey = db.ReferenceProperty(Survey, required=True,
+                                collection_name="survey_aggregates")
+
+  #: The number of this shard.
+  shard = db.IntegerProperty(required=True, default=0)
+
+  #: The number of survey records counted in this shard.
+  total = db.IntegerProperty(required=True, default=0)
+
+  #: JSON dictionary mapping each question to its statistics, being:
+  #:   - answers: the number of records with an answer to the question
+  #:   - choices: a dictionary with the number of times each option
+  #:     was chosen (for choice questions)
+  #:   - sum and numeric: the sum and the number of the numeric answers
+  data = db.TextProperty(default='{}')
+
+  #: Date when this shard was last modified.
+  modified = db.DateTimeProperty(auto_now=True)
@@ -108,6 +108,8 @@ class Core(object):
 
     self.sitemap = []
     self.sidebar = []
+    self.job_tasks = {}
+    self.cron_hooks = []
 
   ##
   ## internal
@@ -159,6 +161,20 @@ class Core(object):
 
     return sorted(sidebar, key=lambda x: x.get('group'))
 
+  def getJobTasks(self):
+    """Returns the job tasks registered by the modules, by name.
+    """
+
+    self.callService('registerWithCron', True)
+    return self.job_tasks
+
+  def getCronHooks(self):
+    """Returns the functions that should be called on every cron poke.
+    """
+
+    self.callService('registerWithCron', True)
+    return self.cron_hooks
+
   def callService(self, service, unique, *args, **kwargs):
     """Calls the specified service on all callbacks.
     """
@@ -249,3 +265,15 @@ class Core(object):
     """
 
     self.sidebar.append(entry)
+
+  def registerJobTask(self, name, task):
+    """Registers the specified task to run the jobs with task_name name.
+    """
+
+    self.job_tasks[name] = task
+
+  def registerCronHook(self, hook):
+    """Registers the specified function to be called on every cron poke.
+    """
+
+    self.cron_hooks.append(hook)
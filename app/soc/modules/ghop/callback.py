@@ -21,6 +21,13 @@ __authors__ = [
   ]
 
 
+from soc.modules.ghop.cron import facet_counter
+from soc.modules.ghop.cron import history_migrator
+from soc.modules.ghop.cron import task_sweeper
+from soc.modules.ghop.logic.models.task import logic as task_logic
+from soc.modules.ghop.views.models import cron
+
+
 class Callback(object):
   """Callback object that handles interaction between the core.
   """
@@ -39,9 +46,28 @@ class Callback(object):
 
     self.core.requireUniqueService('registerWithSitemap')
 
+    self.core.registerSitemapEntry(cron.view.getDjangoURLPatterns())
+
   def registerWithSidebar(self):
     """Called by the server when sidebar entries should be registered.
     """
 
     # require that we had the chance to register the urls we need with the sitemap
     self.core.requireUniqueService('registerWithSidebar')
+
+  def registerWithCron(self):
+    """Called by the server when job tasks and cron hooks should be
+    registered.
+    """
+
+    self.core.requireUniqueService('registerWithCron')
+
+    self.core.registerJobTask('migrateTaskHistories',
+                              history_migrator.migrateTaskHistories)
+    self.core.registerJobTask('recountTaskFacets',
+                              facet_counter.recountTaskFacets)
+    self.core.registerJobTask('sweepTaskDeadlines',
+                              task_sweeper.sweepTaskDeadlines)
+
+    # the deadline sweeps are jobs themselves
+    self.core.registerCronHook(task_logic.startDeadlineSweeps)
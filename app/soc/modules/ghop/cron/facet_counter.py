@@ -0,0 +1,145 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cron job handler for recounting the facets of the GHOP Tasks in a program.
+"""
+
+__authors__ = [
+    '"Lennard de Rijk" <ljvderijk@gmail.com>',
+  ]
+
+
+from google.appengine.ext import db
+
+from django.utils import simplejson
+
+from soc.logic.models.job import logic as job_logic
+
+from soc.modules.ghop.logic.models.program import logic as program_logic
+from soc.modules.ghop.logic.models.task import logic as task_logic
+from soc.modules.ghop.logic.models.task_facet_count import logic as \
+    task_facet_count_logic
+from soc.modules.ghop.models.task import GHOPTask
+
+
+# amount of tasks to count before updating the job
+DEF_TASK_STEP_SIZE = 25
+
+
+def _setFacets(task_key):
+  """Sets the facets of a task to the ones derived from its properties.
+
+  Returns:
+    The facets of the task, or None if it no longer exists.
+  """
+
+  def set_txn():
+    """Transaction that updates the facets of a single task.
+    """
+
+    task = db.get(task_key)
+
+    if not task:
+      return None
+
+    values = {
+        'scope': GHOPTask.scope.get_value_for_datastore(task),
+        'status': task.status,
+        'difficulty': task.difficulty,
+        'type': task.type,
+        }
+    facets = task_logic.getFacets(values)
+
+    if task.facets != facets:
+      task.facets = facets
+      task.put()
+
+    return facets
+
+  return db.run_in_transaction(set_txn)
+
+
+def recountTaskFacets(job_entity):
+  """Job that recounts the facets of all tasks in a program.
+
+  The tasks are walked in key order, tasks stored before the facets were
+  kept get their facets set. The counts so far are kept in the job, once
+  all tasks have been counted they replace the facet counts of the program.
+
+  Args:
+    job_entity: a Job entity with key_data set to [program, last_task] and
+                text_data set to a JSON dictionary with the counts so far
+  """
+
+  from soc.cron.job import FatalJobError
+
+
+  key_data = job_entity.key_data
+  program = program_logic.getFromKeyName(key_data[0].name())
+
+  if not program:
+    raise FatalJobError('The program with key %s could not be found' % (
+        key_data[0].name()))
+
+  if job_entity.text_data:
+    counts = simplejson.loads(job_entity.text_data)
+  else:
+    counts = {}
+
+  def getTaskKeys(last_task_key):
+    """Returns the keys of the next batch of tasks in the program.
+    """
+
+    query = GHOPTask.all(keys_only=True).filter('program =', program)
+
+    if last_task_key:
+      query.filter('__key__ >', last_task_key)
+
+    query.order('__key__')
+    return query.fetch(DEF_TASK_STEP_SIZE)
+
+  if len(key_data) >= 2:
+    # start where we left off
+    task_keys = getTaskKeys(key_data[1])
+  else:
+    task_keys = getTaskKeys(None)
+
+  while task_keys:
+    for task_key in task_keys:
+      for facet in _setFacets(task_key) or []:
+        counts[facet] = counts.get(facet, 0) + 1
+
+    # update our own job
+    last_task_key = task_keys[-1]
+
+    if len(key_data) >= 2:
+      key_data[1] = last_task_key
+    else:
+      key_data.append(last_task_key)
+
+    updated_job_fields = {
+        'key_data': key_data,
+        'text_data': simplejson.dumps(counts),
+        }
+    job_logic.updateEntityProperties(job_entity, updated_job_fields)
+
+    # rinse and repeat
+    task_keys = getTaskKeys(last_task_key)
+
+  task_facet_count_logic.replaceCounts(program.key(), counts)
+
+  # we are finished
+  return
@@ -0,0 +1,141 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cron job handler for moving the history of GHOP Tasks to GHOPTaskHistory
+entities.
+"""
+
+__authors__ = [
+    '"Lennard de Rijk" <ljvderijk@gmail.com>',
+  ]
+
+
+from google.appengine.ext import db
+
+from django.utils import simplejson
+
+from soc.logic.models.job import logic as job_logic
+from soc.logic.models.priority_group import logic as priority_logic
+
+from soc.modules.ghop.models.task import GHOPTask
+from soc.modules.ghop.models.task_history import GHOPTaskHistory
+
+
+# amount of tasks to migrate before updating the job
+DEF_TASK_STEP_SIZE = 25
+
+
+def startHistoryMigration():
+  """Starts a job that migrates the history of all tasks, unless such a job
+  is already waiting to be run.
+
+  Returns:
+    The Job entity that will migrate the histories.
+  """
+
+  priority_group = priority_logic.getGroup(priority_logic.CONVERT)
+  job_fields = {
+      'priority_group': priority_group,
+      'task_name': 'migrateTaskHistories',
+      'status': 'waiting',
+      }
+
+  job = job_logic.getForFields(job_fields, unique=True)
+
+  if job:
+    return job
+
+  return job_logic.updateOrCreateFromFields(job_fields)
+
+
+def _migrateHistory(task_key):
+  """Moves the history property of a task to GHOPTaskHistory entities.
+
+  Returns:
+    The amount of entries that were migrated.
+  """
+
+  def migrate_txn():
+    """Transaction that stores the entries and clears the history property.
+    """
+
+    task = db.get(task_key)
+
+    if not task or not task.history:
+      return 0
+
+    entries = [GHOPTaskHistory(parent=task, created_on=timestamp,
+                               changes=simplejson.dumps(changes))
+               for timestamp, changes in task.getLegacyHistory()]
+
+    task.history = ''
+    db.put(entries + [task])
+
+    return len(entries)
+
+  return db.run_in_transaction(migrate_txn)
+
+
+def migrateTaskHistories(job_entity):
+  """Job that moves the history property of all tasks to GHOPTaskHistory
+  entities.
+
+  The tasks are walked in key order, tasks that have been migrated already
+  have an empty history property and are skipped, so the job can safely
+  be restarted.
+
+  Args:
+    job_entity: a Job entity with key_data set to [last_task] once a batch
+                of tasks has been migrated
+  """
+
+  key_data = job_entity.key_data
+
+  def getTaskKeys(last_task_key):
+    """Returns the keys of the next batch of tasks.
+    """
+
+    query = GHOPTask.all(keys_only=True)
+
+    if last_task_key:
+      query.filter('__key__ >', last_task_key)
+
+    query.order('__key__')
+    return query.fetch(DEF_TASK_STEP_SIZE)
+
+  if key_data:
+    # start where we left off
+    task_keys = getTaskKeys(key_data[0])
+  else:
+    task_keys = getTaskKeys(None)
+
+  while task_keys:
+    for task_key in task_keys:
+      _migrateHistory(task_key)
+
+    # update our own job
+    last_task_key = task_keys[-1]
+
+    updated_job_fields = {
+        'key_data': [last_task_key],
+        }
+    job_logic.updateEntityProperties(job_entity, updated_job_fields)
+
+    # rinse and repeat
+    task_keys = getTaskKeys(last_task_key)
+
+  # we are finished
+  return
@@ -0,0 +1,110 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cron job handler for moving GHOP Tasks of which the deadline has passed.
+"""
+
+__authors__ = [
+    '"Lennard de Rijk" <ljvderijk@gmail.com>',
+  ]
+
+
+import datetime
+
+from django.utils import simplejson
+
+from soc.logic.models.job import logic as job_logic
+
+from soc.modules.ghop.logic.models.program import logic as program_logic
+from soc.modules.ghop.logic.models.task import logic as task_logic
+from soc.modules.ghop.models.task import GHOPTask
+
+
+# statuses of which the deadline has consequences for the task
+DEF_DEADLINE_STATUSES = ['claimed', 'action_needed']
+
+# amount of expired tasks to retrieve with a single query
+DEF_TASK_STEP_SIZE = 25
+
+# amount of batches to process before the job enqueues a successor
+DEF_MAX_BATCHES = 10
+
+
+def sweepTaskDeadlines(job_entity):
+  """Job that updates the tasks in a program of which the deadline passed.
+
+  Only tasks with a deadline in the past are retrieved, so the cost of a
+  run depends on the amount of expired tasks and not on the total amount
+  of tasks. Each task is updated in its own transaction, after which it
+  no longer matches the query, so no position has to be stored. If work
+  remains after DEF_MAX_BATCHES batches a new job is enqueued to continue.
+
+  Args:
+    job_entity: a Job entity with key_data set to [program] and text_data
+                set to a JSON dictionary with the amount of tasks moved to
+                each status so far
+  """
+
+  from soc.cron.job import FatalJobError
+
+
+  program_key = job_entity.key_data[0]
+  program = program_logic.getFromKeyName(program_key.name())
+
+  if not program:
+    raise FatalJobError('The program with key %s could not be found' % (
+        program_key.name()))
+
+  if job_entity.text_data:
+    counts = simplejson.loads(job_entity.text_data)
+  else:
+    counts = {}
+
+  now = datetime.datetime.now()
+
+  for status in DEF_DEADLINE_STATUSES:
+    batches = 0
+
+    while True:
+      query = GHOPTask.all(keys_only=True)
+      query.filter('program =', program)
+      query.filter('status =', status)
+      query.filter('deadline <=', now)
+      query.order('deadline')
+
+      task_keys = query.fetch(DEF_TASK_STEP_SIZE)
+
+      if not task_keys:
+        break
+
+      if batches >= DEF_MAX_BATCHES:
+        # leave the remaining tasks to a new job
+        task_logic.startDeadlineSweep(program)
+        return
+
+      for task_key in task_keys:
+        new_status = task_logic.updateExpiredTask(task_key, now)
+
+        if new_status:
+          counts[new_status] = counts.get(new_status, 0) + 1
+
+      batches += 1
+
+      updated_job_fields = {'text_data': simplejson.dumps(counts)}
+      job_logic.updateEntityProperties(job_entity, updated_job_fields)
+
+  # we are finished
+  return
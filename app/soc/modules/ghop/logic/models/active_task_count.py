@@ -0,0 +1,174 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""GHOPActiveTaskCount (Model) query functions.
+"""
+
+__authors__ = [
+    '"Lennard de Rijk" <ljvderijk@gmail.com>',
+  ]
+
+
+import random
+import time
+
+from google.appengine.api import memcache
+from google.appengine.ext import db
+
+from soc.logic.models import base
+
+from soc.modules.ghop.models.active_task_count import GHOPActiveTaskCount
+
+
+# amount of times a transaction is attempted before giving up
+DEF_ATTEMPTS = 5
+
+# seconds to wait after the first failed attempt, doubled for each attempt
+DEF_BACKOFF = 0.05
+
+# seconds the amount of active tasks is cached
+DEF_CACHE_TIME = 10 * 60
+
+
+class Logic(base.Logic):
+  """Logic methods for the GHOPActiveTaskCount model.
+  """
+
+  def __init__(self, model=GHOPActiveTaskCount,
+               base_model=None, scope_logic=None):
+    """Defines the name, key_name and model for this entity.
+    """
+
+    super(Logic, self).__init__(model, base_model=base_model,
+                                scope_logic=scope_logic)
+
+  def getKeyNameForUser(self, program_key, user_key):
+    """Returns the key name of the count for a user in a program.
+    """
+
+    return '%s/%s' % (program_key.name(), user_key.name())
+
+  def getCachedCount(self, program_key, user_key):
+    """Returns the cached amount of active tasks or None if not cached.
+    """
+
+    key_name = self.getKeyNameForUser(program_key, user_key)
+    return memcache.get(self._getCacheKey(key_name))
+
+  def reserve(self, program_key, user_key, task_key, limit):
+    """Adds a task to the active tasks of a user if the limit allows it.
+
+    The cached amount of active tasks is checked first, so that users that
+    already reached the limit are rejected without a transaction.
+
+    Args:
+      program_key: the key of the GHOPProgram of the task
+      user_key: the key of the User that claims the task
+      task_key: the key of the GHOPTask to reserve
+      limit: the maximum amount of active tasks for the user
+
+    Returns:
+      True iff the task has been added to the active tasks of the user.
+    """
+
+    cached = self.getCachedCount(program_key, user_key)
+
+    if cached is not None and cached >= limit:
+      return False
+
+    key_name = self.getKeyNameForUser(program_key, user_key)
+
+    def reserve_txn():
+      """Transaction that adds the task if the user is below the limit.
+      """
+
+      entity = self._model.get_by_key_name(key_name)
+
+      if not entity:
+        entity = self._model(key_name=key_name, program=program_key,
+                             user=user_key)
+
+      if task_key in entity.active_tasks:
+        return True, len(entity.active_tasks)
+
+      if len(entity.active_tasks) >= limit:
+        return False, len(entity.active_tasks)
+
+      entity.active_tasks.append(task_key)
+      entity.put()
+
+      return True, len(entity.active_tasks)
+
+    reserved, count = self.runWithBackoff(reserve_txn)
+    memcache.set(self._getCacheKey(key_name), count, DEF_CACHE_TIME)
+
+    return reserved
+
+  def release(self, program_key, user_key, task_key):
+    """Removes a task from the active tasks of a user.
+
+    Args:
+      program_key: the key of the GHOPProgram of the task
+      user_key: the key of the User that was working on the task
+      task_key: the key of the GHOPTask to release
+    """
+
+    key_name = self.getKeyNameForUser(program_key, user_key)
+
+    def release_txn():
+      """Transaction that removes the task from the active tasks.
+      """
+
+      entity = self._model.get_by_key_name(key_name)
+
+      if not entity:
+        return 0
+
+      if task_key in entity.active_tasks:
+        entity.active_tasks.remove(task_key)
+        entity.put()
+
+      return len(entity.active_tasks)
+
+    count = self.runWithBackoff(release_txn)
+    memcache.set(self._getCacheKey(key_name), count, DEF_CACHE_TIME)
+
+  def runWithBackoff(self, function, *args, **kwargs):
+    """Runs function in a transaction, retrying with exponential backoff.
+
+    Raises:
+      TransactionFailedError if none of the attempts succeeded
+    """
+
+    for attempt in range(DEF_ATTEMPTS):
+      try:
+        return db.run_in_transaction_custom_retries(0, function,
+                                                     *args, **kwargs)
+      except db.TransactionFailedError:
+        if attempt == DEF_ATTEMPTS - 1:
+          raise
+
+        delay = DEF_BACKOFF * (2 ** attempt)
+        time.sleep(delay + random.uniform(0, delay))
+
+  def _getCacheKey(self, key_name):
+    """Returns the memcache key for the count with the specified key name.
+    """
+
+    return 'ghop_active_tasks_for_%s' % key_name
+
+
+logic = Logic()
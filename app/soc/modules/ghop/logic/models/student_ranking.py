@@ -0,0 +1,201 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""GHOPStudentRanking (Model) query functions.
+"""
+
+__authors__ = [
+    '"Lennard de Rijk" <ljvderijk@gmail.com>',
+  ]
+
+
+import calendar
+import datetime
+
+from google.appengine.ext import db
+
+from soc.logic.models import base
+from soc.logic.models.ranker_root import logic as ranker_root_logic
+
+from soc.modules.ghop.models import student_ranking
+from soc.modules.ghop.models.task import GHOPTask
+
+
+# branching factor of the ranker trees
+DEF_BRANCHING_FACTOR = 100
+
+
+class Logic(base.Logic):
+  """Logic methods for the GHOPStudentRanking model.
+  """
+
+  def __init__(
+      self, model=student_ranking.GHOPStudentRanking,
+      base_model=None, scope_logic=None):
+    """Defines the name, key_name and model for this entity.
+    """
+
+    super(Logic, self).__init__(model, base_model=base_model,
+                                scope_logic=scope_logic)
+
+  def getKeyNameForStudent(self, scope_key, student_key):
+    """Returns the key name of the ranking of a student in scope.
+    """
+
+    return '%s/%s' % (scope_key.name(), student_key.name())
+
+  def getRankerFor(self, scope):
+    """Returns the ranker for the Student rankings in scope.
+
+    The ranker is created if it does not exist yet.
+
+    Args:
+      scope: a GHOPProgram or GHOPOrganization entity
+    """
+
+    fields = {
+        'link_id': student_ranking.DEF_RANKER_NAME,
+        'scope_path': scope.key().id_or_name(),
+        }
+
+    key_name = ranker_root_logic.getKeyNameFromFields(fields)
+    ranker_root = ranker_root_logic.getFromKeyName(key_name)
+
+    if not ranker_root:
+      ranker_root = ranker_root_logic.create(student_ranking.DEF_RANKER_NAME,
+          scope, student_ranking.DEF_SCORE, DEF_BRANCHING_FACTOR)
+
+    return ranker_root_logic.getRootFromEntity(ranker_root)
+
+  def getScore(self, ranking):
+    """Returns the score of ranking as it is stored in the ranker.
+    """
+
+    if not ranking.last_completed:
+      return [ranking.tasks, -1]
+
+    seconds = calendar.timegm(ranking.last_completed.utctimetuple())
+    return [ranking.tasks, -seconds]
+
+  def updateForClosedTask(self, task):
+    """Adds a closed task to the rankings of its Student.
+
+    The student's ranking is updated in both the program and organization
+    of the task.
+
+    Args:
+      task: a GHOPTask entity which has just been closed
+    """
+
+    student_key = GHOPTask.student.get_value_for_datastore(task)
+
+    if not student_key:
+      return
+
+    program_key = GHOPTask.program.get_value_for_datastore(task)
+    org_key = GHOPTask.scope.get_value_for_datastore(task)
+    now = datetime.datetime.now()
+
+    for scope_key in [program_key, org_key]:
+      key_name = self.getKeyNameForStudent(scope_key, student_key)
+
+      def increment_txn():
+        """Transaction that adds the task to the ranking.
+        """
+
+        ranking = self._model.get_by_key_name(key_name)
+
+        if not ranking:
+          ranking = self._model(key_name=key_name, scope=scope_key,
+                                student=student_key)
+
+        ranking.tasks += 1
+        ranking.last_completed = now
+        ranking.put()
+
+        return ranking
+
+      ranking = db.run_in_transaction(increment_txn)
+
+      ranker = self.getRankerFor(db.get(scope_key))
+      ranker.SetScore(student_key.name(), self.getScore(ranking))
+
+  def getLeaderboard(self, scope, limit=10, offset=0):
+    """Returns the best Students in scope together with their rank.
+
+    Args:
+      scope: a GHOPProgram or GHOPOrganization entity
+      limit: the maximum amount of rankings to return
+      offset: the amount of rankings to skip
+
+    Returns:
+      A list of (rank, GHOPStudentRanking) tuples, the rank is one-based.
+    """
+
+    fields = {'scope': scope}
+    order = ['-tasks', 'last_completed']
+
+    rankings = self.getForFields(fields, order=order, limit=limit,
+                                 offset=offset)
+
+    if not rankings:
+      return []
+
+    ranker = self.getRankerFor(scope)
+    ranks = ranker.FindRanks([self.getScore(i) for i in rankings])
+
+    return [(rank+1, ranking) for rank, ranking in zip(ranks, rankings)]
+
+  def getRank(self, scope, student):
+    """Returns the one-based rank of student in scope or None if unranked.
+    """
+
+    key_name = self.getKeyNameForStudent(scope.key(), student.key())
+    ranking = self._model.get_by_key_name(key_name)
+
+    if not ranking:
+      return None
+
+    ranker = self.getRankerFor(scope)
+
+    return ranker.FindRank(self.getScore(ranking)) + 1
+
+  def getPrizeWinners(self, program, org):
+    """Returns the Students that qualify for the prizes of an organization.
+
+    Args:
+      program: the GHOPProgram specifying the amount of prizes
+      org: the GHOPOrganization to retrieve the winners for
+
+    Returns:
+      A (winners, runner_ups) tuple with ordered lists of Student keys, as
+      used in GHOPOrgPrizeAssignment.
+    """
+
+    limit = program.nr_winners + program.nr_runnerups
+
+    if not limit:
+      return [], []
+
+    leaderboard = self.getLeaderboard(org, limit=limit)
+
+    students = [self._model.student.get_value_for_datastore(ranking)
+                for _, ranking in leaderboard]
+
+    return students[:program.nr_winners], students[program.nr_winners:]
+
+
+logic = Logic()
@@ -22,15 +22,49 @@ __authors__ = [
   ]
 
 
-from soc.logic.models import linkable
+import datetime
+
+from google.appengine.api import users
+from google.appengine.ext import db
+
+from django.utils import simplejson
+
+from soc.logic.models import base
+from soc.logic.models.job import logic as job_logic
+from soc.logic.models.priority_group import logic as priority_logic
 
 import soc.models.linkable
 
 import soc.modules.ghop.logic.models.organization
 import soc.modules.ghop.models.task
 
+from soc.modules.ghop.logic.models.active_task_count import logic as \
+    active_task_count_logic
+from soc.modules.ghop.logic.models.program import logic as program_logic
+from soc.modules.ghop.logic.models.student_ranking import logic as \
+    student_ranking_logic
+from soc.modules.ghop.logic.models.task_facet_count import logic as \
+    task_facet_count_logic
+from soc.modules.ghop.models.task_history import GHOPTaskHistory
+
+
+# hours a student gets to submit work once the task needs action
+DEF_ACTION_NEEDED_HOURS = 24
+
+# statuses in which a task can be claimed
+DEF_CLAIMABLE_STATUSES = ['open', 'reopened']
+
+# statuses in which a task counts towards the active tasks of its user
+DEF_ACTIVE_STATUSES = ['claim_requested', 'claimed', 'action_needed',
+                       'needs_work', 'needs_review']
+
+DEF_MAX_TASKS_REACHED_MSG = "You can only work on %d task(s) at the "\
+    "same time."
+
+DEF_NOT_CLAIMABLE_MSG = "This task can not be claimed anymore."
 
-class Logic(linkable.Logic):
+
+class Logic(base.Logic):
   """Logic methods for the GHOPTask model.
   """
 
@@ -43,5 +77,389 @@ class Logic(linkable.Logic):
     super(Logic, self).__init__(model, base_model=base_model,
                                 scope_logic=scope_logic)
 
+  def updateEntityProperties(self, entity, entity_properties, silent=False):
+    """Updates the task and appends the changes to its history.
+
+    The task and its new history entry are stored in a single transaction,
+    the existing history is never read. See _afterUpdate for the entities
+    that are updated after the task has been stored.
+
+    For args see base.Logic.updateEntityProperties().
+    """
+
+    old_values = db.run_in_transaction(self._updateWithHistory, entity,
+                                       entity_properties)
+
+    self._afterUpdate(entity, old_values)
+
+    if not silent:
+      self._onUpdate(entity)
+
+    return entity
+
+  def updateExpiredTask(self, task_key, now):
+    """Moves a task to its next state if its deadline has passed.
+
+    A claimed task goes to action_needed and gets DEF_ACTION_NEEDED_HOURS
+    more to submit its work, a task that needed action is reopened.
+
+    Args:
+      task_key: the key of a GHOPTask
+      now: the datetime to compare the deadline with
+
+    Returns:
+      The new status of the task, or None if it was left untouched.
+    """
+
+    def expire_txn():
+      """Transaction that checks the deadline and updates the task.
+      """
+
+      # the task might have changed since it was found to be expired
+      entity = self._model.get(task_key)
+
+      if not entity or not entity.deadline or entity.deadline > now:
+        return None
+
+      if entity.status == 'claimed':
+        properties = {
+            'status': 'action_needed',
+            'deadline': now + datetime.timedelta(
+                hours=DEF_ACTION_NEEDED_HOURS),
+            }
+      elif entity.status == 'action_needed':
+        properties = {
+            'status': 'reopened',
+            'was_reopened': True,
+            'user': None,
+            'student': None,
+            'deadline': None,
+            }
+      else:
+        return None
+
+      old_values = self._updateWithHistory(entity, properties)
+
+      return entity, old_values
+
+    result = db.run_in_transaction(expire_txn)
+
+    if not result:
+      return None
+
+    entity, old_values = result
+    self._afterUpdate(entity, old_values)
+
+    return entity.status
+
+  def claimTask(self, entity, user):
+    """Requests to claim a task on behalf of a user.
+
+    The task is first reserved in the active tasks of the user, which
+    enforces the nr_simultaneous_tasks limit of the program, after which
+    the task itself is updated. The reservation is undone if the task can
+    no longer be claimed.
+
+    Args:
+      entity: an open or reopened GHOPTask entity
+      user: the User entity that claims the task
+
+    Returns:
+      None if the claim has been requested, otherwise a message explaining
+      why the task could not be claimed.
+    """
+
+    program = entity.program
+    program_key = program.key()
+    task_key = entity.key()
+
+    reserved = active_task_count_logic.reserve(
+        program_key, user.key(), task_key, program.nr_simultaneous_tasks)
+
+    if not reserved:
+      return DEF_MAX_TASKS_REACHED_MSG % program.nr_simultaneous_tasks
+
+    def claim_txn():
+      """Transaction that requests the claim if the task is still open.
+      """
+
+      task = self._model.get(task_key)
+
+      if task.status not in DEF_CLAIMABLE_STATUSES:
+        return None
+
+      properties = {
+          'status': 'claim_requested',
+          'user': user,
+          }
+
+      old_values = self._updateWithHistory(task, properties)
+
+      return task, old_values
+
+    try:
+      result = active_task_count_logic.runWithBackoff(claim_txn)
+    except db.TransactionFailedError:
+      active_task_count_logic.release(program_key, user.key(), task_key)
+      raise
+
+    if not result:
+      active_task_count_logic.release(program_key, user.key(), task_key)
+      return DEF_NOT_CLAIMABLE_MSG
+
+    task, old_values = result
+    self._afterUpdate(task, old_values)
+
+    return None
+
+  def startDeadlineSweep(self, program):
+    """Starts a job that updates the tasks in program with passed deadlines.
+
+    No job is started if one is already waiting to be run.
+
+    Args:
+      program: a GHOPProgram entity
+
+    Returns:
+      The Job entity that will sweep the deadlines.
+    """
+
+    priority_group = priority_logic.getGroup(priority_logic.DEADLINE)
+    job_fields = {
+        'priority_group': priority_group,
+        'task_name': 'sweepTaskDeadlines',
+        'key_data': program.key(),
+        'status': 'waiting',
+        }
+
+    job = job_logic.getForFields(job_fields, unique=True)
+
+    if not job:
+      job_fields['key_data'] = [program.key()]
+      job = job_logic.updateOrCreateFromFields(job_fields)
+
+    return job
+
+  def startDeadlineSweeps(self):
+    """Starts a deadline sweep for each visible GHOP program.
+
+    This is called every time the cron system is poked, see
+    soc.views.models.cron, so that passed deadlines are handled within
+    one poke after the previous sweep of a program finished.
+    """
+
+    for program in program_logic.getForFields({'status': 'visible'}):
+      self.startDeadlineSweep(program)
+
+  def getForFacets(self, program, facets, limit=1000, offset=0):
+    """Returns the tasks in program that have all the specified facets.
+
+    Args:
+      program: a GHOPProgram entity
+      facets: a list of facets as returned by getFacets
+      limit: the maximum amount of tasks to return
+      offset: the amount of tasks to skip
+    """
+
+    query = self.getQueryForFields({'program': program})
+
+    # each facet is an equality filter on the same list property, so no
+    # composite index is needed for any combination of facets
+    for facet in facets:
+      query.filter('facets =', facet)
+
+    return query.fetch(limit, offset)
+
+  def getFacets(self, values):
+    """Returns the facets for a task with the specified property values.
+
+    Args:
+      values: a dictionary with the property values of a task, references
+              can be given as either a key or an entity
+    """
+
+    facets = []
+
+    scope = values.get('scope')
+    if scope:
+      if isinstance(scope, db.Model):
+        scope = scope.key()
+      facets.append('org:%s' % scope.name())
+
+    if values.get('status'):
+      facets.append('status:%s' % values['status'])
+
+    if values.get('difficulty'):
+      facets.append('diff:%s' % values['difficulty'])
+
+    for task_type in values.get('type') or []:
+      facets.append('type:%s' % task_type)
+
+    return facets
+
+  def updateOrCreateFromFields(self, properties, silent=False):
+    """Creates a new task with its facets set.
+
+    For args see base.Logic.updateOrCreateFromFields().
+    """
+
+    properties = properties.copy()
+
+    # the default status is not in properties when it is not specified
+    values = {'status': self._model.status.default}
+    values.update(properties)
+    properties['facets'] = self.getFacets(values)
+
+    return super(Logic, self).updateOrCreateFromFields(properties,
+                                                       silent=silent)
+
+  def delete(self, entity):
+    """Removes the facets of the task from the counts before deleting it.
+    """
+
+    program_key = self._model.program.get_value_for_datastore(entity)
+    task_facet_count_logic.updateCounts(program_key, entity.facets, [])
+
+    super(Logic, self).delete(entity)
+
+  def _afterUpdate(self, entity, old_values):
+    """Updates the entities that depend on a task after it has changed.
+
+    These are the facet counts, the active tasks of the user that worked on
+    the task and the rankings of the student when the task is closed.
+
+    Args:
+      entity: the updated GHOPTask entity
+      old_values: the values before the update as returned by
+                  _updateWithHistory
+    """
+
+    self._updateFacetCounts(entity, old_values['facets'])
+
+    old_user_key = old_values['user']
+    user_key = self._model.user.get_value_for_datastore(entity)
+
+    if old_user_key and old_values['status'] in DEF_ACTIVE_STATUSES and (
+        entity.status not in DEF_ACTIVE_STATUSES or user_key != old_user_key):
+      program_key = self._model.program.get_value_for_datastore(entity)
+      active_task_count_logic.release(program_key, old_user_key,
+                                      entity.key())
+
+    if entity.status == 'closed' and old_values['status'] != 'closed':
+      student_ranking_logic.updateForClosedTask(entity)
+
+  def _updateFacetCounts(self, entity, old_facets):
+    """Updates the facet counts after the facets of entity have changed.
+    """
+
+    if old_facets == entity.facets:
+      return
+
+    program_key = self._model.program.get_value_for_datastore(entity)
+    task_facet_count_logic.updateCounts(program_key, old_facets,
+                                        entity.facets)
+
+  def _updateWithHistory(self, entity, entity_properties):
+    """Updates the task and stores the changes in a new history entry.
+
+    The facets of the task are updated as well. Should be called from
+    within a transaction.
+
+    Returns:
+      A dictionary with the facets, status and user key of the task
+      before the update.
+    """
+
+    old_values = {
+        'facets': list(entity.facets),
+        'status': entity.status,
+        'user': self._model.user.get_value_for_datastore(entity),
+        }
+    changes = {}
+    values = {}
+
+    for name, prop in self._model.properties().iteritems():
+      if name in self._skip_properties or (name not in entity_properties):
+        values[name] = prop.get_value_for_datastore(entity)
+        continue
+
+      values[name] = entity_properties[name]
+
+      old_value = self._toHistoryValue(prop.get_value_for_datastore(entity))
+      new_value = self._toHistoryValue(entity_properties[name])
+
+      if old_value != new_value:
+        changes[name] = new_value
+
+    # the facets are derived from the other properties, so they are not
+    # recorded in the history
+    changes.pop('facets', None)
+
+    entity_properties = entity_properties.copy()
+    entity_properties['facets'] = self.getFacets(values)
+
+    super(Logic, self).updateEntityProperties(entity, entity_properties,
+                                              silent=True)
+
+    if changes:
+      self.appendHistory(entity, changes)
+
+    return old_values
+
+  def appendHistory(self, entity, changes):
+    """Stores a new history entry for the specified task.
+
+    Args:
+      entity: a GHOPTask entity
+      changes: a dictionary with the changed properties and their values
+    """
+
+    history = GHOPTaskHistory(parent=entity,
+                              changes=simplejson.dumps(changes))
+    history.put()
+
+    return history
+
+  def _toHistoryValue(self, value):
+    """Returns value in a form that can be stored in the history as JSON.
+    """
+
+    if isinstance(value, db.Model):
+      return str(value.key())
+
+    if isinstance(value, db.Key):
+      return str(value)
+
+    if isinstance(value, (list, tuple)):
+      return [self._toHistoryValue(i) for i in value]
+
+    if isinstance(value, (datetime.datetime, datetime.date)):
+      return value.isoformat()
+
+    if isinstance(value, users.User):
+      return value.email()
+
+    return value
+
+  def _onCreate(self, entity):
+    """Stores the values of all properties as the first history entry and
+    counts the facets of the new task.
+    """
+
+    self._updateFacetCounts(entity, [])
+
+    changes = {}
+
+    for name, prop in self._model.properties().iteritems():
+      if name in ['facets', 'history']:
+        continue
+
+      value = prop.get_value_for_datastore(entity)
+      changes[name] = self._toHistoryValue(value)
+
+    self.appendHistory(entity, changes)
+
+    super(Logic, self)._onCreate(entity)
+
 
 logic = Logic()
@@ -0,0 +1,210 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""GHOPTaskFacetCount (Model) query functions.
+"""
+
+__authors__ = [
+    '"Lennard de Rijk" <ljvderijk@gmail.com>',
+  ]
+
+
+import logging
+import random
+
+from google.appengine.ext import db
+
+from django.utils import simplejson
+
+from soc.logic.models import base
+from soc.logic.models.job import logic as job_logic
+from soc.logic.models.priority_group import logic as priority_logic
+
+from soc.modules.ghop.models.task import GHOPTask
+from soc.modules.ghop.models.task_facet_count import GHOPTaskFacetCount
+
+
+#: The number of shards the facet counts of a program are spread over
+DEF_NUM_SHARDS = 10
+
+
+class Logic(base.Logic):
+  """Logic methods for the GHOPTaskFacetCount model.
+  """
+
+  def __init__(self, model=GHOPTaskFacetCount,
+               base_model=None, scope_logic=None, num_shards=DEF_NUM_SHARDS):
+    """Defines the name, key_name and model for this entity.
+
+    Args:
+      num_shards: the number of shards to use per program
+    """
+
+    self._num_shards = num_shards
+
+    super(Logic, self).__init__(model, base_model=base_model,
+                                scope_logic=scope_logic)
+
+  def getKeyNameForShard(self, program_key, shard):
+    """Returns the key name of the specified shard of a program.
+    """
+
+    return '%s/%d' % (program_key.name(), shard)
+
+  def updateCounts(self, program_key, old_facets, new_facets):
+    """Updates the counts for a task of which the facets have changed.
+
+    All changes are applied to a random shard in a single transaction. The
+    task itself is stored before this is called, so a failing update is
+    logged and a recount of the program is started instead of failing the
+    request, see startRecount.
+
+    Args:
+      program_key: the key of the program the task belongs to
+      old_facets: the facets of the task before the change
+      new_facets: the facets of the task after the change
+    """
+
+    deltas = {}
+
+    for facet in old_facets:
+      if facet not in new_facets:
+        deltas[facet] = -1
+
+    for facet in new_facets:
+      if facet not in old_facets:
+        deltas[facet] = 1
+
+    if not deltas:
+      return
+
+    shard = random.randint(0, self._num_shards - 1)
+    key_name = self.getKeyNameForShard(program_key, shard)
+
+    def update_txn():
+      """Transaction that applies the changes to the shard.
+      """
+
+      entity = self._model.get_by_key_name(key_name)
+
+      if not entity:
+        entity = self._model(key_name=key_name, program=program_key,
+                             shard=shard)
+
+      counts = simplejson.loads(entity.data)
+
+      for facet, delta in deltas.iteritems():
+        counts[facet] = counts.get(facet, 0) + delta
+
+      entity.data = simplejson.dumps(counts)
+      entity.put()
+
+    try:
+      db.run_in_transaction(update_txn)
+    except db.TransactionFailedError, exception:
+      logging.error("Could not update the facet counts of program %s: %s" % (
+          program_key.name(), exception))
+      self.startRecount(program_key)
+
+  def startRecount(self, program_key):
+    """Starts a job that recounts the facets of all tasks in a program.
+
+    No job is started if one is already waiting to be run for the program.
+
+    Args:
+      program_key: the key of the program to recount
+
+    Returns:
+      The Job entity that will recount the facets.
+    """
+
+    priority_group = priority_logic.getGroup(priority_logic.CONVERT)
+    job_fields = {
+        'priority_group': priority_group,
+        'task_name': 'recountTaskFacets',
+        'key_data': program_key,
+        'status': 'waiting',
+        }
+
+    job = job_logic.getForFields(job_fields, unique=True)
+
+    if not job:
+      job_fields['key_data'] = [program_key]
+      job = job_logic.updateOrCreateFromFields(job_fields)
+
+    return job
+
+  def replaceCounts(self, program_key, counts):
+    """Replaces the facet counts of a program with the specified ones.
+
+    The counts are stored in the first shard and the other shards are
+    removed. This is not done in a transaction, so tasks that change while
+    the counts are replaced may be miscounted until the next recount.
+
+    Args:
+      program_key: the key of the program the counts are for
+      counts: a dictionary with the amount of tasks per facet
+    """
+
+    key_names = [self.getKeyNameForShard(program_key, i)
+                 for i in range(1, self._num_shards)]
+    stale = [i for i in self._model.get_by_key_name(key_names) if i]
+
+    entity = self._model(key_name=self.getKeyNameForShard(program_key, 0),
+                         program=program_key, shard=0,
+                         data=simplejson.dumps(counts))
+    entity.put()
+
+    if stale:
+      db.delete(stale)
+
+  def getCounts(self, program):
+    """Returns the amount of tasks per facet for a program.
+
+    All shards are retrieved with one batch get. If nothing has been
+    counted for a program that does have tasks, for example tasks created
+    before the facets were kept, a recount is started.
+
+    Args:
+      program: a GHOPProgram entity
+
+    Returns:
+      A dictionary with the facets as keys and the counts as values,
+      facets without tasks are left out.
+    """
+
+    key_names = [self.getKeyNameForShard(program.key(), i)
+                 for i in range(self._num_shards)]
+    shards = [i for i in self._model.get_by_key_name(key_names) if i]
+
+    if not shards:
+      query = GHOPTask.all(keys_only=True).filter('program =', program)
+
+      if query.get():
+        self.startRecount(program.key())
+
+      return {}
+
+    counts = {}
+
+    for shard in shards:
+      for facet, count in simplejson.loads(shard.data).iteritems():
+        counts[facet] = counts.get(facet, 0) + count
+
+    return dict([(k, v) for k, v in counts.iteritems() if v])
+
+
+logic = Logic()
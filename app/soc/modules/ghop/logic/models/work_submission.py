@@ -21,7 +21,7 @@ __authors__ = [
     '"Madhusudan.C.S" <madhusudancs@gmail.com>'
   ]
 
-from soc.logic.models import linkable
+from soc.logic.models import base
 
 import soc.models.linkable
 
@@ -29,7 +29,7 @@ import soc.modules.ghop.logic.models.organization
 import soc.modules.ghop.models.work_submission
 
 
-class Logic(linkable.Logic):
+class Logic(base.Logic):
   """Logic methods for the GHOPWorkSubmission model.
   """
 
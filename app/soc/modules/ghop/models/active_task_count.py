@@ -0,0 +1,51 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module contains the GHOP Active Task Count Model.
+"""
+
+__authors__ = [
+  '"Lennard de Rijk" <ljvderijk@gmail.com>',
+]
+
+
+from google.appengine.ext import db
+
+import soc.models.user
+
+import soc.modules.ghop.models.program
+
+
+class GHOPActiveTaskCount(db.Model):
+  """The tasks a User is currently working on in a GHOP Program.
+
+  The key name is <program key name>/<user key name>. Each entity is in
+  its own entity group, so that claims by different users never contend.
+  """
+
+  #: Program the tasks belong to
+  program = db.ReferenceProperty(
+      reference_class=soc.modules.ghop.models.program.GHOPProgram,
+      required=True, collection_name='active_task_counts')
+
+  #: User working on the tasks
+  user = db.ReferenceProperty(reference_class=soc.models.user.User,
+                              required=True,
+                              collection_name='ghop_active_task_counts')
+
+  #: The tasks the User is currently working on, the amount of tasks is
+  #: limited by the nr_simultaneous_tasks property of the Program
+  active_tasks = db.ListProperty(item_type=db.Key, default=[])
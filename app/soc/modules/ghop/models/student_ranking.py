@@ -0,0 +1,61 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module contains the GHOP Student Ranking Model.
+"""
+
+__authors__ = [
+  '"Lennard de Rijk" <ljvderijk@gmail.com>',
+]
+
+
+from google.appengine.ext import db
+
+import soc.models.linkable
+import soc.models.student
+
+
+#: The range of the scores in the ranker, the first score is the amount of
+#: closed tasks, the second score is minus the time of the last completion
+#: in seconds since the epoch, so that earlier completions rank higher
+DEF_SCORE = [0, 1000, -2**31, 0]
+
+#: The name of the ranker for the Student rankings in a Program or Org
+DEF_RANKER_NAME = 'ghop_student_ranker'
+
+
+class GHOPStudentRanking(db.Model):
+  """The amount of tasks a Student completed in a GHOP Program or Org.
+
+  The key name is <scope key name>/<student key name>. The same scores are
+  kept in a Ranker which is used to determine the rank of a Student.
+  """
+
+  #: The Program or Organization this ranking is for
+  scope = db.ReferenceProperty(reference_class=soc.models.linkable.Linkable,
+                               required=True,
+                               collection_name='ghop_student_rankings')
+
+  #: The Student this ranking is for
+  student = db.ReferenceProperty(reference_class=soc.models.student.Student,
+                                 required=True,
+                                 collection_name='ghop_rankings')
+
+  #: The amount of tasks the Student has completed
+  tasks = db.IntegerProperty(required=True, default=0)
+
+  #: The date on which the Student last completed a task
+  last_completed = db.DateTimeProperty(required=False)
@@ -25,6 +25,7 @@ __authors__ = [
 
 from google.appengine.ext import db
 
+from django.utils import simplejson
 from django.utils.translation import ugettext
 
 import soc.models.linkable
@@ -34,6 +35,8 @@ import soc.models.user
 
 import soc.modules.ghop.models.program
 
+from soc.modules.ghop.models import task_history
+
 
 class GHOPTask(soc.models.linkable.Linkable):
   """Model for a task used in GHOP workflow.
@@ -158,24 +161,60 @@ class GHOPTask(soc.models.linkable.Linkable):
   modified_on = db.DateTimeProperty(required=True, auto_now_add=True,
                                     verbose_name=ugettext('Modified on'))
 
-  #: A field which holds the entire history of this task in JSON. The
-  #: structure of this JSON string is as follows:
-  #: {
-  #:    timestamp1: {
-  #:                   "user": User reference
-  #:                   "student": Student reference
-  #:                   ...
-  #:                   "state": "Unapproved"
-  #:                   ...
-  #:                   "edited_by": Role reference
-  #:                   
-  #:               }
-  #:    timestamp2: {
-  #:                   "state": "Unpublished"
-  #:               }
-  #: }
-  #: First dictionary item holds the values for all the properties in this
-  #: model. The subsequent items hold the properties that changed at the
-  #: timestamp given by the key.
-  #: Reference properties will be stored by calling str() on their Key.
-  history = db.TextProperty(required=True, default='')
+  #: The facets of this task which are used to search for tasks. This
+  #: property is maintained by the task logic and contains one token per
+  #: value of the facets, for example "status:open", "org:<org key name>",
+  #: "diff:easy" and "type:code". Any combination of facets can therefore
+  #: be searched for with equality filters on this property only.
+  facets = db.StringListProperty(default=[])
+
+  #: The history this task had before it was stored in GHOPTaskHistory
+  #: entities, in JSON. It maps timestamps to the properties that changed
+  #: at that time, the first entry holds the values for all properties.
+  #: The migrateTaskHistories job moves it to GHOPTaskHistory entities
+  #: and clears it, it is kept here so that it is not lost when a task
+  #: is stored before it has been migrated.
+  history = db.TextProperty(default='')
+
+  def getHistory(self):
+    """Returns the history of this task.
+
+    The history is stored in GHOPTaskHistory entities that are children of
+    this task, it is only retrieved when this method is called.
+
+    Returns:
+      A list of (timestamp, changes) tuples in chronological order. The
+      changes of the first entry hold the values for all the properties
+      of this task, subsequent entries hold the properties that changed.
+    """
+
+    entries = task_history.GHOPTaskHistory.all().ancestor(self)
+    history = [(i.created_on, i.getChanges()) for i in entries]
+
+    # entries that have not been migrated yet
+    history.extend(self.getLegacyHistory())
+    history.sort(key=lambda entry: entry[0])
+
+    return history
+
+  def getLegacyHistory(self):
+    """Returns the entries of the history property of this task.
+
+    Returns:
+      A list of (timestamp, changes) tuples in chronological order.
+      Timestamps that can not be parsed are replaced by the date on which
+      this task was created.
+    """
+
+    if not self.history:
+      return []
+
+    entries = []
+
+    for timestamp, changes in simplejson.loads(self.history).iteritems():
+      entries.append((task_history.parseTimestamp(timestamp) or
+                      self.created_on, changes))
+
+    entries.sort(key=lambda entry: entry[0])
+
+    return entries
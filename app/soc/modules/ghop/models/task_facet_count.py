@@ -0,0 +1,49 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module contains the GHOP Task Facet Count Model.
+"""
+
+__authors__ = [
+  '"Lennard de Rijk" <ljvderijk@gmail.com>',
+]
+
+
+from google.appengine.ext import db
+
+import soc.modules.ghop.models.program
+
+
+class GHOPTaskFacetCount(db.Model):
+  """One shard of the amount of tasks in a GHOP Program per facet.
+
+  The counts of a program are spread over a number of shards so that
+  concurrent task updates rarely contend for the same entity, the key
+  name is <program key name>/<shard>. See GHOPTask.facets for the format
+  of the facets.
+  """
+
+  #: Program the tasks belong to
+  program = db.ReferenceProperty(
+      reference_class=soc.modules.ghop.models.program.GHOPProgram,
+      required=True, collection_name='task_facet_counts')
+
+  #: The number of this shard
+  shard = db.IntegerProperty(required=True, default=0)
+
+  #: JSON dictionary with the changes to the amount of tasks per facet
+  #: counted in this shard, the sum over all shards is the actual amount
+  data = db.TextProperty(required=True, default='{}')
@@ -0,0 +1,84 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module contains the GHOP Task History Model.
+"""
+
+__authors__ = [
+  '"Madhusudan.C.S" <madhusudancs@gmail.com>',
+  '"Lennard de Rijk" <ljvderijk@gmail.com>',
+]
+
+
+import datetime
+
+from google.appengine.ext import db
+
+from django.utils import simplejson
+
+
+#: The formats of the timestamps in the history property of GHOPTask
+DEF_TIMESTAMP_FORMATS = [
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+    ]
+
+
+def parseTimestamp(timestamp):
+  """Returns the datetime for a timestamp of the GHOPTask history property.
+
+  Returns:
+    A datetime.datetime, or None if the timestamp could not be parsed.
+  """
+
+  # microseconds can not be parsed by strptime in Python 2.5
+  timestamp, _, microseconds = timestamp.partition('.')
+
+  for format in DEF_TIMESTAMP_FORMATS:
+    try:
+      result = datetime.datetime.strptime(timestamp, format)
+    except ValueError:
+      continue
+
+    if microseconds.isdigit():
+      result = result.replace(microsecond=int(microseconds[:6].ljust(6, '0')))
+
+    return result
+
+  return None
+
+
+class GHOPTaskHistory(db.Model):
+  """A single entry in the history of a GHOPTask.
+
+  Entries are stored as children of the task they belong to, so that they
+  are in the same entity group and can be written in the same transaction
+  as the task. Entries are never modified once they have been stored.
+  """
+
+  #: The properties of the task that changed, in JSON. The first entry for
+  #: a task holds the values for all the properties of the task.
+  #: Reference properties are stored by calling str() on their Key.
+  changes = db.TextProperty(required=True, default='{}')
+
+  #: Date on which the changes were made
+  created_on = db.DateTimeProperty(required=True, auto_now_add=True)
+
+  def getChanges(self):
+    """Returns the changes stored in this entry as a dictionary.
+    """
+
+    return simplejson.loads(self.changes)
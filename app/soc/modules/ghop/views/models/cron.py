@@ -0,0 +1,109 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Views for starting the GHOP jobs by hand.
+"""
+
+__authors__ = [
+    '"Lennard de Rijk" <ljvderijk@gmail.com>',
+  ]
+
+
+from django import http
+
+from soc.logic import dicts
+from soc.views.helper import access
+from soc.views.helper import decorators
+
+from soc.modules.ghop.cron import history_migrator
+
+
+class View(object):
+  """View methods for starting the GHOP jobs.
+
+  Like the profiling view this has no model, only the pages in
+  django_patterns_defaults are registered.
+  """
+
+  def __init__(self, params=None):
+    """Defines the params required to provide developers with the pages
+    that start the jobs.
+
+    Params:
+      params: a dict with params for this View
+    """
+
+    rights = access.Checker(params)
+    rights['task_histories'] = ['checkIsDeveloper']
+
+    new_params = {}
+    new_params['rights'] = rights
+
+    new_params['name'] = "GHOP Cron"
+    new_params['url_name'] = 'ghop/cron'
+    new_params['module_name'] = 'cron'
+    new_params['module_package'] = 'soc.modules.ghop.views.models'
+
+    new_params['django_patterns_defaults'] = [
+        (r'^%(url_name)s/(?P<access_type>task_histories)$',
+          '%(module_package)s.%(module_name)s.task_histories',
+          'Migrate the GHOP task histories'),
+        ]
+
+    self._params = dicts.merge(params, new_params)
+
+  def getParams(self):
+    """Returns this view's params attribute.
+    """
+
+    return self._params
+
+  def getDjangoURLPatterns(self):
+    """Returns the url patterns of the pages in django_patterns_defaults,
+    in the format of soc.views.sitemap.sitemap.getDjangoURLPatterns.
+    """
+
+    patterns = []
+
+    for url, module, name in self._params['django_patterns_defaults']:
+      url = url % self._params
+      module = module % self._params
+      patterns.append((url, module, {'page_name': name}, name))
+
+    return patterns
+
+  @decorators.merge_params
+  @decorators.check_access
+  def taskHistories(self, request, access_type, page_name=None,
+                    params=None):
+    """Starts the job that moves the history of all GHOP tasks to
+    GHOPTaskHistory entities.
+
+    Args:
+      request: the standard Django HTTP request object
+      access_type : the name of the access type which should be checked
+      page_name: the page name displayed in templates as page and header title
+      params: a dict with params for this View
+    """
+
+    history_migrator.startHistoryMigration()
+
+    return http.HttpResponse('Started migrating the GHOP task histories.')
+
+
+view = View()
+
+task_histories = decorators.view(view.taskHistories)
@@ -36,6 +36,7 @@ from soc.views.models import organization
 from soc.views.models import org_admin
 from soc.views.models import org_app
 from soc.views.models import priority_group
+from soc.views.models import profiling
 from soc.views.models import program
 from soc.views.models import project_survey
 from soc.views.models import request
@@ -88,6 +89,7 @@ class Callback(object):
     self.core.registerSitemapEntry(org_admin.view.getDjangoURLPatterns())
     self.core.registerSitemapEntry(org_app.view.getDjangoURLPatterns())
     self.core.registerSitemapEntry(priority_group.view.getDjangoURLPatterns())
+    self.core.registerSitemapEntry(profiling.view.getDjangoURLPatterns())
     self.core.registerSitemapEntry(program.view.getDjangoURLPatterns())
     self.core.registerSitemapEntry(project_survey.view.getDjangoURLPatterns())
     self.core.registerSitemapEntry(request.view.getDjangoURLPatterns())
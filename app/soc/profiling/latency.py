@@ -0,0 +1,297 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-view latency histograms and profiles stored in memcache.
+
+A view is identified by the url_name and access_type it was requested
+with, for example 'user/list'. For each view the amount of requests that
+fell in each of DEF_BUCKETS is counted, together with the total time spent.
+The counts are collected in the instance and added to the counters in
+memcache at most once every DEF_FLUSH_INTERVAL seconds, so recording a
+request usually makes no RPCs at all. Counts that are not flushed yet are
+lost when the instance goes away.
+"""
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import datetime
+import time
+
+from google.appengine.api import memcache
+
+
+#: The upper bounds in milliseconds of the histogram buckets, the last
+#: bucket contains all slower requests
+DEF_BUCKETS = [50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+#: The minimum amount of seconds between two flushes of the counts
+DEF_FLUSH_INTERVAL = 10
+
+#: The memcache key of the amount of views that have been registered
+DEF_VIEWS_KEY = 'latency_views'
+
+# the memcache key formats of the view specific values
+_BUCKET_KEY_FMT = 'latency/%s/%d'
+_TOTAL_KEY_FMT = 'latency/%s/total'
+_PROFILE_KEY_FMT = 'latency/%s/profile'
+_REGISTERED_KEY_FMT = 'latency/%s/registered'
+
+# the memcache key format of the view registered with a given number
+_VIEW_KEY_FMT = 'latency_views/%d'
+
+# memcache key -> the amount that is not added to the counter yet
+_pending = {}
+
+# the views recorded since the last flush
+_recorded = set()
+
+# the time of the last flush
+_last_flush = 0
+
+
+def getViewKey(path, view_func, view_kwargs):
+  """Returns the url_name/access_type key of a view.
+
+  Args:
+    path: the path of the request
+    view_func: the view function that handles the request
+    view_kwargs: the keyword arguments the view is called with
+  """
+
+  url_name = path.strip('/').split('/')[0]
+  access_type = view_kwargs.get('access_type') or view_func.__name__
+
+  return '%s/%s' % (url_name, access_type)
+
+
+def getBucket(milliseconds):
+  """Returns the index of the bucket a request of milliseconds falls in.
+  """
+
+  for index, bound in enumerate(DEF_BUCKETS):
+    if milliseconds < bound:
+      return index
+
+  return len(DEF_BUCKETS)
+
+
+def _increment(key, delta):
+  """Increments a memcache counter, creating it if needed.
+
+  Returns:
+    The new value of the counter.
+  """
+
+  # pylint: disable-msg=E1101
+  value = memcache.incr(key, delta=delta)
+
+  if value is not None:
+    return value
+
+  if memcache.add(key, delta):
+    return delta
+
+  # someone else created it in the mean time
+  return memcache.incr(key, delta=delta)
+
+
+def _register(view_key):
+  """Adds view_key to the views listed by getViewStats.
+
+  Each view is added once, by the instance that adds its registered key
+  first, so views that are already registered cost a single memcache
+  call. That instance stores the view under a number taken from the
+  atomic DEF_VIEWS_KEY counter, so concurrent registrations can not
+  overwrite each other.
+  """
+
+  # pylint: disable-msg=E1101
+  if not memcache.add(_REGISTERED_KEY_FMT % view_key, 1):
+    return
+
+  number = _increment(DEF_VIEWS_KEY, 1)
+
+  if number:
+    memcache.set(_VIEW_KEY_FMT % (number - 1), view_key)
+
+
+def _getViews():
+  """Returns the keys of all registered views.
+  """
+
+  # pylint: disable-msg=E1101
+  count = int(memcache.get(DEF_VIEWS_KEY) or 0)
+  keys = [_VIEW_KEY_FMT % i for i in range(count)]
+  values = memcache.get_multi(keys)
+
+  views = []
+
+  for key in keys:
+    view_key = values.get(key)
+
+    if view_key and view_key not in views:
+      views.append(view_key)
+
+  return views
+
+
+def flush():
+  """Adds the counts collected in this instance to the counters in memcache.
+  """
+
+  global _last_flush
+
+  _last_flush = time.time()
+
+  pending = _pending.items()
+  _pending.clear()
+
+  for key, delta in pending:
+    _increment(key, delta)
+
+  recorded = list(_recorded)
+  _recorded.clear()
+
+  for view_key in recorded:
+    _register(view_key)
+
+
+def record(view_key, milliseconds):
+  """Records a request to the view with the specified latency.
+
+  The counts are flushed when DEF_FLUSH_INTERVAL seconds have passed since
+  the last flush.
+  """
+
+  milliseconds = int(milliseconds)
+
+  bucket_key = _BUCKET_KEY_FMT % (view_key, getBucket(milliseconds))
+  total_key = _TOTAL_KEY_FMT % view_key
+
+  _pending[bucket_key] = _pending.get(bucket_key, 0) + 1
+  _pending[total_key] = _pending.get(total_key, 0) + milliseconds
+
+  _recorded.add(view_key)
+
+  if time.time() - _last_flush >= DEF_FLUSH_INTERVAL:
+    flush()
+
+
+def storeProfile(view_key, path, milliseconds, profile):
+  """Stores profile as the latest profile of a view.
+
+  Args:
+    view_key: the key of the view, see getViewKey
+    path: the path of the request that was profiled
+    milliseconds: the latency of the profiled request
+    profile: the profile data as text
+  """
+
+  data = {
+      'path': path,
+      'milliseconds': int(milliseconds),
+      'profile': profile,
+      'recorded_on': datetime.datetime.now(),
+      }
+
+  # pylint: disable-msg=E1101
+  memcache.set(_PROFILE_KEY_FMT % view_key, data)
+
+
+def getProfile(view_key):
+  """Returns the latest profile of a view as stored by storeProfile or None.
+  """
+
+  # pylint: disable-msg=E1101
+  return memcache.get(_PROFILE_KEY_FMT % view_key)
+
+
+def getPercentile(histogram, percentile):
+  """Returns the upper bound of the bucket a percentile of requests is in.
+
+  Returns None if the percentile falls in the last bucket, which has no
+  upper bound.
+  """
+
+  count = sum(histogram)
+  needed = count * percentile / 100.0
+  seen = 0
+
+  for index, bucket_count in enumerate(histogram):
+    seen += bucket_count
+
+    if bucket_count and seen >= needed:
+      break
+
+  if index < len(DEF_BUCKETS):
+    return DEF_BUCKETS[index]
+
+  return None
+
+
+def getViewStats():
+  """Returns the statistics of all recorded views, slowest first.
+
+  The counts collected in this instance are flushed first.
+
+  Returns:
+    A list of dictionaries with the view key, the request count, the mean
+    and 90th percentile latency in milliseconds, the histogram as a list of
+    counts per bucket, and whether a profile is available.
+  """
+
+  flush()
+
+  views = _getViews()
+
+  keys = []
+  for view_key in views:
+    keys.extend([_BUCKET_KEY_FMT % (view_key, i)
+                 for i in range(len(DEF_BUCKETS) + 1)])
+    keys.append(_TOTAL_KEY_FMT % view_key)
+    keys.append(_PROFILE_KEY_FMT % view_key)
+
+  # pylint: disable-msg=E1101
+  values = memcache.get_multi(keys)
+  result = []
+
+  for view_key in views:
+    histogram = [int(values.get(_BUCKET_KEY_FMT % (view_key, i), 0))
+                 for i in range(len(DEF_BUCKETS) + 1)]
+    count = sum(histogram)
+
+    if not count:
+      continue
+
+    total = int(values.get(_TOTAL_KEY_FMT % view_key, 0))
+
+    result.append({
+        'view': view_key,
+        'count': count,
+        'mean': total / count,
+        'p90': getPercentile(histogram, 90),
+        'histogram': histogram,
+        'has_profile': _PROFILE_KEY_FMT % view_key in values,
+        })
+
+  # unbounded percentiles are the slowest
+  result.sort(key=lambda i: (i['p90'] is None, i['p90'], i['mean']),
+              reverse=True)
+
+  return result
@@ -0,0 +1,186 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Django middleware that instruments the handling of each request.
+"""
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import cProfile
+import logging
+import pstats
+import random
+import StringIO
+import time
+
+from django.conf import settings
+from django.utils.html import escape
+
+from soc.logic import accounts
+from soc.logic.models.user import logic as user_logic
+from soc.profiling import latency
+from soc.profiling import rpc
+
+
+#: The GET arg that adds the RPC summary to html pages for developers
+DEF_FOOTER_ARG = 'rpc_stats'
+
+#: The GET arg or cookie with which developers request a profile
+DEF_PROFILE_ARG = 'profile'
+
+#: The amount of functions included in a stored profile
+DEF_PROFILE_LINES = 60
+
+
+class RpcStatsMiddleware(object):
+  """Accounts the RPCs of some of the requests and logs a summary of them.
+
+  The RPCs of a RPC_STATS_SAMPLE_RATE fraction of all requests are
+  accounted. Developers can append the rpc_stats GET arg to any url to
+  have the RPCs of that request accounted and the summary added to the
+  bottom of the page as well.
+  """
+
+  def __init__(self):
+    """Registers the accounting hooks.
+    """
+
+    rpc.install()
+
+  def process_request(self, request):
+    """Starts accounting the RPCs of request if it is sampled or requested.
+    """
+
+    if self._shouldAccount(request):
+      rpc.start(request.path)
+
+  def process_view(self, request, view_func, view_args, view_kwargs):
+    """Records the view that handles the request.
+    """
+
+    stats = rpc.getCurrent()
+
+    if stats:
+      stats.view = latency.getViewKey(request.path, view_func, view_kwargs)
+
+  def process_response(self, request, response):
+    """Logs the summary and adds it to the page if requested.
+    """
+
+    stats = rpc.stop()
+
+    if not stats:
+      return response
+
+    summary = stats.getSummary()
+    logging.info(summary)
+
+    if DEF_FOOTER_ARG not in request.GET:
+      return response
+
+    if not response.get('Content-Type', '').startswith('text/html'):
+      return response
+
+    if not accounts.isDeveloper():
+      return response
+
+    footer = '<pre class="rpc_stats">%s</pre>' % escape(summary)
+    content = response.content
+
+    if '</body>' in content:
+      content = content.replace('</body>', footer + '</body>', 1)
+    else:
+      content += footer
+
+    response.content = content
+
+    return response
+
+  def _shouldAccount(self, request):
+    """Returns True iff the RPCs of request should be accounted.
+    """
+
+    if DEF_FOOTER_ARG in request.GET and accounts.isDeveloper():
+      return True
+
+    rate = getattr(settings, 'RPC_STATS_SAMPLE_RATE', 0)
+
+    return random.random() < rate
+
+
+class ProfilingMiddleware(object):
+  """Records the latency of each view and profiles some of the requests.
+
+  A request is profiled when a developer adds the profile GET arg or sets
+  the profile cookie, and at random for a PROFILE_SAMPLE_RATE fraction of
+  all requests. The latest profile of each view is kept in memcache, see
+  soc.profiling.latency.
+  """
+
+  def process_view(self, request, view_func, view_args, view_kwargs):
+    """Starts timing the view, and runs it under the profiler if needed.
+    """
+
+    view_key = latency.getViewKey(request.path, view_func, view_kwargs)
+
+    request.latency_view = view_key
+    request.latency_start = time.time()
+
+    if not self._shouldProfile(request):
+      return None
+
+    profile = cProfile.Profile()
+    response = profile.runcall(view_func, request, *view_args, **view_kwargs)
+    milliseconds = (time.time() - request.latency_start) * 1000
+
+    stream = StringIO.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.sort_stats('cumulative')
+    stats.print_stats(DEF_PROFILE_LINES)
+
+    latency.storeProfile(view_key, request.path, milliseconds,
+                         stream.getvalue())
+
+    return response
+
+  def process_response(self, request, response):
+    """Records the latency of the view that handled request.
+    """
+
+    start = getattr(request, 'latency_start', None)
+
+    if start is not None:
+      milliseconds = (time.time() - start) * 1000
+      latency.record(request.latency_view, milliseconds)
+
+    return response
+
+  def _shouldProfile(self, request):
+    """Returns True iff request should be profiled.
+    """
+
+    requested = (DEF_PROFILE_ARG in request.GET or
+                 DEF_PROFILE_ARG in request.COOKIES)
+
+    if requested and user_logic.isDeveloper():
+      return True
+
+    rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+
+    return random.random() < rate
@@ -0,0 +1,148 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Statistics about the queries done through soc.logic.models.base.Logic.
+
+Queries are grouped by their shape: the kind, the filtered properties with
+their operators and the sort order, but not the filtered values. The size
+of IN filters is part of the shape, as each value is a separate query. The
+statistics are kept per instance, queries slower than DEF_SLOW_QUERY_MS are
+logged as well.
+"""
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import logging
+
+
+#: Queries that take at least this many milliseconds are logged
+DEF_SLOW_QUERY_MS = 200
+
+# shape -> statistics of the queries done on this instance
+_stats = {}
+
+
+def getShape(kind, filter, order):
+  """Returns the shape of a query.
+
+  Args:
+    kind: the kind that is queried
+    filter: a filter dict as accepted by Logic.getQueryForFields
+    order: a list with the sort order
+  """
+
+  parts = []
+
+  for key, value in sorted((filter or {}).iteritems()):
+    if isinstance(value, list) and len(value) == 1:
+      value = value[0]
+
+    key = key.strip()
+
+    if isinstance(value, list):
+      key = '%s IN(%d)' % (key.split(' ')[0], len(value))
+    elif ' ' not in key:
+      key = '%s =' % key
+
+    parts.append(key)
+
+  shape = '%s(%s)' % (kind, ', '.join(parts))
+
+  if order:
+    shape += ' order(%s)' % ', '.join(order)
+
+  return shape
+
+
+def getQueryShape(query):
+  """Returns the shape of query, as stored by Logic.getQueryForFields.
+  """
+
+  shape = getattr(query, 'query_shape', None)
+
+  if shape:
+    return shape
+
+  # the query was not created by getQueryForFields
+  # pylint: disable-msg=W0212
+  return '%s(?)' % query._model_class.kind()
+
+
+def record(query, limit, offset, count, seconds, error=None):
+  """Records a fetch of query.
+
+  Args:
+    query: the query that was fetched
+    limit: the limit the query was fetched with
+    offset: the offset the query was fetched with
+    count: the amount of entities that were returned
+    seconds: how long the fetch took
+    error: the exception the fetch failed with, if any
+  """
+
+  shape = getQueryShape(query)
+  milliseconds = int(seconds * 1000)
+
+  stats = _stats.get(shape)
+
+  if not stats:
+    stats = _stats[shape] = {
+        'shape': shape,
+        'count': 0,
+        'total_ms': 0,
+        'max_ms': 0,
+        'results': 0,
+        'max_limit': 0,
+        'max_offset': 0,
+        'errors': 0,
+        }
+
+  stats['count'] += 1
+  stats['total_ms'] += milliseconds
+  stats['max_ms'] = max(stats['max_ms'], milliseconds)
+  stats['results'] += count
+  stats['max_limit'] = max(stats['max_limit'], limit)
+  stats['max_offset'] = max(stats['max_offset'], offset)
+
+  if error:
+    stats['errors'] += 1
+
+  if milliseconds >= DEF_SLOW_QUERY_MS:
+    logging.warning("Slow query (%dms): %s, limit: %d, offset: %d, "
+                    "results: %d" % (milliseconds, shape, limit, offset, count))
+
+
+def getStats():
+  """Returns the statistics per shape of this instance, slowest first.
+
+  Returns:
+    A list of dictionaries with the shape, the amount of fetches, their
+    total and maximum duration in milliseconds, the total amount of
+    results, the largest limit and offset, and the amount of failures.
+  """
+
+  return sorted(_stats.itervalues(), key=lambda i: i['total_ms'],
+                reverse=True)
+
+
+def clearStats():
+  """Removes all recorded statistics of this instance.
+  """
+
+  _stats.clear()
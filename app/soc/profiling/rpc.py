@@ -0,0 +1,261 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Accounting of the RPCs that are made while handling a request.
+
+Hooks are registered with the apiproxy that count and time the RPCs of
+the services in DEF_ACCOUNTED_CALLS. Each RPC is attributed to the
+innermost logic method on the stack that caused it. Accounting only
+happens between start() and stop(), see soc.profiling.middleware.
+"""
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import sys
+import time
+
+from google.appengine.api import apiproxy_stub_map
+
+
+#: The calls that are accounted for per service, None means all calls
+DEF_ACCOUNTED_CALLS = {
+    'datastore_v3': ['Get', 'Put', 'Delete', 'RunQuery', 'Next', 'Count'],
+    'memcache': None,
+    'mail': None,
+    }
+
+#: The caller RPCs are attributed to when no logic method is on the stack
+DEF_UNKNOWN_CALLER = '(no logic)'
+
+#: Maximum amount of callers included in a summary
+DEF_MAX_SUMMARY_CALLERS = 20
+
+# the statistics of the request that is being handled
+_current = None
+
+# the statistics of the last request that was handled
+_last = None
+
+
+class RequestStats(object):
+  """The RPCs made while handling a single request.
+  """
+
+  def __init__(self, path):
+    """Starts accounting for a request to path.
+    """
+
+    self.path = path
+    self.view = None
+    self.start = time.time()
+    self.end = None
+
+    #: (service, call) -> [count, seconds]
+    self.calls = {}
+
+    #: (caller, service, call) -> [count, seconds]
+    self.callers = {}
+
+    self._pending = []
+
+  def record(self, service, call, duration, caller):
+    """Records a finished RPC.
+    """
+
+    for stats, key in [(self.calls, (service, call)),
+                       (self.callers, (caller, service, call))]:
+      entry = stats.setdefault(key, [0, 0.0])
+      entry[0] += 1
+      entry[1] += duration
+
+  def getCount(self):
+    """Returns the total amount of RPCs made.
+    """
+
+    return sum([count for count, _ in self.calls.itervalues()])
+
+  def getTime(self):
+    """Returns the total time spent in RPCs in seconds.
+    """
+
+    return sum([duration for _, duration in self.calls.itervalues()])
+
+  def getSummary(self):
+    """Returns a human readable summary of the RPCs made.
+    """
+
+    end = self.end or time.time()
+
+    lines = ['RPC stats for %s (%s): %d RPCs in %dms, request took %dms' % (
+        self.path, self.view or 'unknown view', self.getCount(),
+        self.getTime() * 1000, (end - self.start) * 1000)]
+
+    calls = sorted(self.calls.iteritems(), key=lambda i: -i[1][1])
+
+    for (service, call), (count, duration) in calls:
+      lines.append('  %s.%s: %d calls, %dms' % (
+          service, call, count, duration * 1000))
+
+    callers = sorted(self.callers.iteritems(), key=lambda i: -i[1][1])
+
+    if callers:
+      lines.append('By caller:')
+
+    for (caller, service, call), (count, duration) in \
+        callers[:DEF_MAX_SUMMARY_CALLERS]:
+      lines.append('  %s: %s.%s %d calls, %dms' % (
+          caller, service, call, count, duration * 1000))
+
+    return '\n'.join(lines)
+
+
+def _isAccounted(service, call):
+  """Returns True iff RPCs of call to service are accounted for.
+  """
+
+  if service not in DEF_ACCOUNTED_CALLS:
+    return False
+
+  calls = DEF_ACCOUNTED_CALLS[service]
+
+  return calls is None or call in calls
+
+
+def _isLogicModule(name):
+  """Returns True iff the module with the specified name contains logic.
+  """
+
+  return name.startswith('soc.') and 'logic' in name.split('.')
+
+
+def getCaller(frame):
+  """Returns the name of the innermost logic method in the stack of frame.
+
+  The name is the module of the class of the logic instance, if any, and
+  the name of the method, for example soc.logic.models.user.getForFields.
+  """
+
+  while frame:
+    module_name = frame.f_globals.get('__name__', '')
+
+    if _isLogicModule(module_name):
+      instance = frame.f_locals.get('self')
+
+      if instance is not None:
+        module_name = type(instance).__module__
+
+      return '%s.%s' % (module_name, frame.f_code.co_name)
+
+    frame = frame.f_back
+
+  return DEF_UNKNOWN_CALLER
+
+
+def _preCall(service, call, request, response):
+  """Hook that is called before each RPC.
+  """
+
+  stats = _current
+
+  if stats is None or not _isAccounted(service, call):
+    return
+
+  stats._pending.append((request, time.time()))
+
+
+def _postCall(service, call, request, response):
+  """Hook that is called after each successful RPC.
+  """
+
+  stats = _current
+
+  if stats is None or not _isAccounted(service, call):
+    return
+
+  # concurrent RPCs can finish in any order, so look up the RPC by its
+  # request, RPCs that raised an exception never reach this hook and are
+  # left behind
+  for index in range(len(stats._pending) - 1, -1, -1):
+    if stats._pending[index][0] is request:
+      _, start = stats._pending.pop(index)
+      break
+  else:
+    return
+
+  duration = time.time() - start
+  stats.record(service, call, duration, getCaller(sys._getframe(1)))
+
+
+def install(apiproxy=None):
+  """Registers the accounting hooks with apiproxy.
+
+  Registering the hooks more than once has no effect.
+
+  Args:
+    apiproxy: an APIProxyStubMap, defaults to the one used by the SDK
+  """
+
+  if not apiproxy:
+    apiproxy = apiproxy_stub_map.apiproxy
+
+  apiproxy.GetPreCallHooks().Append('rpc_stats', _preCall)
+  apiproxy.GetPostCallHooks().Append('rpc_stats', _postCall)
+
+
+def start(path):
+  """Starts accounting the RPCs of a request to path.
+
+  Returns:
+    The RequestStats object the RPCs are recorded in.
+  """
+
+  global _current
+
+  _current = RequestStats(path)
+  return _current
+
+
+def stop():
+  """Stops accounting, returns the RequestStats of the request or None.
+  """
+
+  global _current, _last
+
+  stats = _current
+  _current = None
+
+  if stats:
+    stats.end = time.time()
+    _last = stats
+
+  return stats
+
+
+def getCurrent():
+  """Returns the RequestStats of the current request, or None.
+  """
+
+  return _current
+
+
+def getLast():
+  """Returns the RequestStats of the last request that was handled, or None.
+  """
+
+  return _last
@@ -1288,21 +1288,21 @@ class Checker(object):
       # check if the current user is a host for this proposal's program
       filter['scope'] =  proposal_entity.program
 
-      if host_logic.getForFields(filter, unique=True):
+      if host_logic.getKeysForFields(filter, unique=True):
         return
 
     if 'org_admin' in allowed_roles:
       # check if the current user is an admin for this proposal's org
       filter['scope'] = proposal_entity.org
 
-      if org_admin_logic.getForFields(filter, unique=True):
+      if org_admin_logic.getKeysForFields(filter, unique=True):
         return
 
     if 'mentor' in allowed_roles:
       # check if the current user is a mentor for this proposal's org
       filter['scope'] = proposal_entity.org
 
-      if mentor_logic.getForFields(filter, unique=True):
+      if mentor_logic.getKeysForFields(filter, unique=True):
         return
 
     # no roles found, access denied
@@ -1343,7 +1343,8 @@ class Checker(object):
     if check_limit:
       # count all studentproposals by the student
       fields = {'scope': student_entity}
-      proposal_query = student_proposal_logic.getQueryForFields(fields)
+      proposal_query = student_proposal_logic.getQueryForFields(fields,
+                                                                keys_only=True)
 
       if proposal_query.count() >= program_entity.apps_tasks_limit:
         # too many proposals access denied
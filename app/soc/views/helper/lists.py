@@ -135,8 +135,32 @@ def generateLinkForRequest(request, base_params, updated_params):
   return generateLinkFromGetArgs(request, params)
 
 
+def getListFetch(request, params, filter=None, order=None, idx=0):
+  """Returns how getListContent fetches the data for a list.
+
+  This allows the data of several lists to be fetched at once with
+  soc.logic.parallel.getForFields, see getListContent for the arguments.
+
+  Returns:
+    A (logic, kwargs) tuple, kwargs being the arguments for getForFields.
+  """
+
+  list_params = getListParameters(request, idx)
+  limit, offset = list_params['limit'], list_params['offset']
+
+  # Fetch one more to see if there should be a 'next' link
+  kwargs = {
+      'filter': filter,
+      'limit': limit + 1,
+      'offset': offset,
+      'order': order,
+      }
+
+  return params['logic'], kwargs
+
+
 def getListContent(request, params, filter=None, order=None,
-                   idx=0, need_content=False):
+                   idx=0, need_content=False, data=None):
   """Returns a dict with fields used for rendering lists.
 
   TODO(dbentley): we need better terminology. List, in this context, can have
@@ -151,6 +175,8 @@ def getListContent(request, params, filter=None, order=None,
     order: the order which should be used for the list (in getForFields format)
     idx: the index of this list
     need_content: iff True will return None if there is no data
+    data: the entities as fetched with the arguments from getListFetch,
+          if not specified they are fetched here
 
   Returns:
     A dictionary with the following values set:
@@ -180,9 +206,9 @@ def getListContent(request, params, filter=None, order=None,
   pagination_form = makePaginationForm(request, list_params['limit'],
                                        limit_key)
 
-  # Fetch one more to see if there should be a 'next' link
-  data = logic.getForFields(filter=filter, limit=limit+1, offset=offset,
-                            order=order)
+  if data is None:
+    _, kwargs = getListFetch(request, params, filter, order, idx)
+    data = logic.getForFields(**kwargs)
 
   if need_content and not data:
     return None
@@ -27,6 +27,7 @@ import copy
 from django import forms
 from django.utils.translation import ugettext
 
+from soc.cache import forms as forms_cache
 from soc.logic import cleaning
 from soc.logic import dicts
 from soc.models import linkable
@@ -236,6 +237,8 @@ def constructParams(params):
   new_params['context'] = None
 
   new_params['cache_pick'] = False
+  new_params['pick_prefix_fields'] = ['link_id']
+  new_params['pick_prefix_limit'] = 10
 
   new_params['export_content_type'] = None
   new_params['export_extension'] = '.txt'
@@ -362,6 +365,9 @@ def getDynaFields(fields):
 def getCreateForm(params, model):
   """Constructs a new CreateForm using params.
 
+  The form class is only built once per process for each combination of
+  model, dynabase and field overrides, see soc.cache.forms.
+
   Params usage:
     dynabase: The dynabase value is used as the base argument to
       dynaform.newDynaForm.
@@ -371,6 +377,17 @@ def getCreateForm(params, model):
     create_dynaproperties: same as dynabase, but as dynaproperties argument
   """
 
+  cache_key = forms_cache.key('create', model, params['dynabase'],
+      params['create_dynainclude'], params['create_dynaexclude'],
+      params['create_dynaproperties'], params.get('extra_key_order'))
+
+  return forms_cache.getOrBuild(cache_key, _buildCreateForm, params, model)
+
+
+def _buildCreateForm(params, model):
+  """Builds the CreateForm for getCreateForm.
+  """
+
   create_form = dynaform.newDynaForm(
     dynabase = params['dynabase'],
     dynamodel = model,
@@ -399,6 +416,16 @@ def getEditForm(params, base_form):
     edit_dynaproperties: same as create_form, but as dynaproperties argument
   """
 
+  cache_key = forms_cache.key('edit', base_form, params['edit_dynainclude'],
+      params['edit_dynaexclude'], params['edit_dynaproperties'])
+
+  return forms_cache.getOrBuild(cache_key, _buildEditForm, params, base_form)
+
+
+def _buildEditForm(params, base_form):
+  """Builds the EditForm for getEditForm.
+  """
+
   edit_form = dynaform.extendDynaForm(
     dynaform = base_form,
     dynainclude = params['edit_dynainclude'],
@@ -413,6 +440,15 @@ def getAdminForm(base_form):
   """Constructs a new AdminForm from base_form.
   """
 
+  cache_key = forms_cache.key('admin', base_form)
+
+  return forms_cache.getOrBuild(cache_key, _buildAdminForm, base_form)
+
+
+def _buildAdminForm(base_form):
+  """Builds the AdminForm for getAdminForm.
+  """
+
   # extend _and_ deepcopy the base_fields to do a proper copy
   admin_form = dynaform.extendDynaForm(dynaform = base_form)
   admin_form.base_fields = copy.deepcopy(admin_form.base_fields)
@@ -25,6 +25,7 @@ __authors__ = [
 
 
 import StringIO
+import copy
 import csv
 from itertools import chain
 import datetime
@@ -40,11 +41,17 @@ from django.utils.encoding import force_unicode
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 
+from soc.cache import forms as forms_cache
 from soc.logic import dicts
 from soc.logic.lists import Lists
+from soc.logic.models.survey_aggregate import logic as aggregate_logic
 from soc.models.survey import SurveyContent
 
 
+#: The number of individual survey records shown per page
+DEF_RESULTS_LIMIT = 50
+
+
 class SurveyForm(djangoforms.ModelForm):
   """Main SurveyContent form.
 
@@ -89,15 +96,16 @@ class SurveyForm(djangoforms.ModelForm):
     """Build the SurveyContent (questions) form fields.
 
     Populates self.survey_fields, which will be ordered in self.insert_fields.
+
+    The record independent fields are only built once per version of the
+    SurveyContent (see soc.cache.forms), after which a copy of them is
+    filled in with the values from self.survey_record.
     """
 
     if not self.survey_content:
       return
 
-    self.survey_fields = {}
-    schema = SurveyContentSchema(self.survey_content.schema)
     has_record = (not self.editing) and self.survey_record
-    extra_attrs = {}
 
     # figure out whether we want a read-only view
     if not self.editing:
@@ -109,22 +117,51 @@ class SurveyForm(djangoforms.ModelForm):
         survey_entity = self.survey_logic.getSurveyForContent(survey_content)
         deadline = survey_entity.survey_end
         read_only =  deadline and (datetime.datetime.now() > deadline)
-      else:
-        extra_attrs['disabled'] = 'disabled'
+
+    disabled = bool(not self.editing and self.read_only)
+    survey_content = self.survey_content
+
+    if survey_content.is_saved():
+      cache_key = forms_cache.key('survey', survey_content.key(),
+                                  survey_content.modified,
+                                  bool(self.editing), disabled)
+    else:
+      cache_key = None
+
+    survey_fields, survey_order = forms_cache.getOrBuild(
+        cache_key, self.buildFields, disabled)
+
+    self.survey_fields = copy.deepcopy(survey_fields)
+    self.survey_order = survey_order
+
+    if has_record:
+      self.fillFields()
+
+    return self.insertFields()
+
+  def buildFields(self, disabled):
+    """Builds the record independent fields for self.survey_content.
+
+    params:
+      disabled: whether the fields should be rendered as disabled
+
+    returns:
+      A (survey_fields, survey_order) tuple, with the fields using the
+      prompts set by the survey creator as initial values.
+    """
+
+    self.survey_fields = {}
+    schema = SurveyContentSchema(self.survey_content.getSchema())
+    extra_attrs = {}
+
+    if disabled:
+      extra_attrs['disabled'] = 'disabled'
 
     # add unordered fields to self.survey_fields
     for field in self.survey_content.dynamic_properties():
 
-      # a comment made by the user
-      comment = ''
-      if has_record and hasattr(self.survey_record, field):
-        # previously entered value
-        value = getattr(self.survey_record, field)
-        if hasattr(self.survey_record, 'comment_for_' + field):
-          comment = getattr(self.survey_record, 'comment_for_' + field)
-      else:
-        # use prompts set by survey creator
-        value = getattr(self.survey_content, field)
+      # use prompts set by survey creator
+      value = getattr(self.survey_content, field)
 
       label = schema.getLabel(field)
       if label is None:
@@ -132,18 +169,50 @@ class SurveyForm(djangoforms.ModelForm):
 
       # dispatch to field-specific methods
       addField = self.fields_map[schema.getType(field)]
-      addField(field, value, extra_attrs, schema, label=label, comment=comment)
+      addField(field, value, extra_attrs, schema, label=label, comment='')
 
-    return self.insertFields()
+    return self.survey_fields, self.survey_content.getSurveyOrder()
+
+  def fillFields(self):
+    """Sets the values from self.survey_record on self.survey_fields.
+    """
+
+    for field, question in self.survey_fields.iteritems():
+      if field.startswith('comment_for_'):
+        continue
+
+      if not hasattr(self.survey_record, field):
+        # pick_quant questions fall back to the prompt as initial value
+        if isinstance(question, PickQuantField):
+          question.initial = getattr(self.survey_content, field)
+        continue
+
+      # previously entered value
+      value = getattr(self.survey_record, field)
+
+      comment_field = 'comment_for_' + field
+      if hasattr(self.survey_record, comment_field):
+        comment = getattr(self.survey_record, comment_field)
+        self.survey_fields[comment_field].initial = comment
+
+      if isinstance(question, PickOneField):
+        # show the chosen option first
+        choices = [(value, value)]
+        choices += [i for i in question.choices if i[0] != value]
+        question.choices = tuple(choices)
+      elif isinstance(question, PickManyField):
+        if isinstance(value, basestring):
+          # pass value as 'initial' so MultipleChoiceField renders checked boxes
+          question.initial = value.split(',')
+      else:
+        question.initial = value
 
   def insertFields(self):
     """Add ordered fields to self.fields.
     """
 
-    survey_order = self.survey_content.getSurveyOrder()
-
     # first, insert dynamic survey fields
-    for position, property in survey_order.items():
+    for position, property in self.survey_order.items():
       position = position * 2
       self.fields.insert(position, property, self.survey_fields[property])
       if not self.editing:
@@ -223,13 +292,8 @@ class SurveyForm(djangoforms.ModelForm):
     widget = schema.getWidget(field, self.editing, attrs)
 
     these_choices = []
-    # add all properties, but select chosen one
+    # add all properties, the chosen one is selected in fillFields
     options = getattr(self.survey_content, field)
-    has_record = not self.editing and self.survey_record
-    if has_record and hasattr(self.survey_record, field):
-      these_choices.append((value, value))
-      if value in options:
-        options.remove(value)
 
     for option in options:
       these_choices.append((option, option))
@@ -261,11 +325,8 @@ class SurveyForm(djangoforms.ModelForm):
     widget = schema.getWidget(field, self.editing, attrs)
 
     # TODO(ajaksu) need to allow checking checkboxes by default
-    if self.survey_record and isinstance(value, basestring):
-      # pass value as 'initial' so MultipleChoiceField renders checked boxes
-      value = value.split(',')
-    else:
-      value = None
+    # record values are set in fillFields
+    value = None
 
     these_choices = [(v,v) for v in getattr(self.survey_content, field)]
     if not tip:
@@ -296,10 +357,8 @@ class SurveyForm(djangoforms.ModelForm):
 
     widget = schema.getWidget(field, self.editing, attrs)
 
-    if self.survey_record:
-      value = value
-    else:
-      value = None
+    # record values are set in fillFields
+    value = None
 
     these_choices = [(v,v) for v in getattr(self.survey_content, field)]
     if not tip:
@@ -328,7 +387,10 @@ class SurveyContentSchema(object):
   """
 
   def __init__(self, schema):
-    self.schema = eval(schema)
+    """Store the parsed schema, see SurveyContent.getSchema().
+    """
+
+    self.schema = schema
 
   def getType(self, field):
     return self.schema[field]["type"]
@@ -536,9 +598,9 @@ class SurveyResults(widgets.Widget):
   """Render List of Survey Results For Given Survey.
   """
 
-  def render(self, survey, params, filter=filter, limit=1000, offset=0,
-             order=[], idx=0, context={}):
-    """ renders list of survey results
+  def render(self, survey, params, filter=filter, limit=DEF_RESULTS_LIMIT,
+             offset=0, order=[], idx=0, context={}, records=False):
+    """ renders the statistics and list of survey results
 
     params:
       survey: current survey
@@ -549,13 +611,33 @@ class SurveyResults(widgets.Widget):
       order: order for list results
       idx: index for list results
       context: context dict for template
+      records: whether to list the individual records, otherwise only
+        the aggregated statistics are shown
     """
 
     survey_logic = params['logic']
     record_logic = survey_logic.getRecordLogic()
     filter = {'survey': survey}
-    data = record_logic.getForFields(filter=filter, limit=limit, offset=offset,
-                              order=order)
+
+    total, statistics = aggregate_logic.getStatisticsOrRebuild(survey,
+                                                               record_logic)
+
+    if total is None:
+      # the statistics are being recounted, list the records meanwhile
+      records = True
+      context['statistics_rebuilding'] = True
+    elif not total:
+      return "<p>No Survey Results Have Been Submitted</p>"
+
+    context['statistics_total'] = total
+    context['statistics'] = statistics
+    context['records_shown'] = records
+
+    if records:
+      data = record_logic.getForFields(filter=filter, limit=limit,
+                                       offset=offset, order=order)
+    else:
+      data = []
 
     params['name'] = "Survey Results"
     content = {
@@ -576,9 +658,6 @@ class SurveyResults(widgets.Widget):
 
     # TODO(ajaksu) is this the best way to build the results list?
     for list_ in context['list']._contents:
-      if len(list_['data']) < 1:
-        return "<p>No Survey Results Have Been Submitted</p>"
-
       list_['row'] = 'soc/survey/list/results_row.html'
       list_['heading'] = 'soc/survey/list/results_heading.html'
       list_['description'] = 'Survey Results:'
@@ -615,7 +694,7 @@ def getRoleSpecificFields(survey, user, this_project, survey_form,
       or None
   """
 
-  field_count = len(eval(survey.survey_content.schema).items())
+  field_count = len(survey.survey_content.getSchema())
   these_projects = survey_logic.getProjects(survey, user)
   if not these_projects:
     return False # no projects found
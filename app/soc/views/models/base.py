@@ -68,6 +68,9 @@ class View(object):
   DEF_CREATE_INSTRUCTION_MSG_FMT = ugettext(
       'Please select a %s for the new %s.')
 
+  DEF_INVALID_PREFIX_FIELD_MSG_FMT = ugettext(
+      'Picking by a prefix of %s is not supported.')
+
   def __init__(self, params=None):
     """
 
@@ -686,6 +689,21 @@ class View(object):
     entities = logic.getForFields(filter=filter, order=order, limit=1000)
     return entities
 
+  def _getPrefixData(self, model, filter, order, logic, limit, field_names):
+    """Retrieves the projected pick data for a prefix query.
+
+    Args:
+      model: the model that is being queried
+      filter: the filters that apply, including the prefix range
+      order: the sort order, starting with the prefix field
+      logic: the logic that will be used for the query
+      limit: the maximum amount of entities to return
+      field_names: the fields to include for each entity
+    """
+
+    entities = logic.getForFields(filter=filter, order=order, limit=limit)
+    return [i.toDict(field_names) for i in entities]
+
   @decorators.merge_params
   @decorators.check_access
   def pick(self, request, acces_type, page_name=None, params=None):
@@ -713,6 +731,9 @@ class View(object):
       # need to use getlist as we want to support multiple values
       filter[key] = request.GET.getlist(key)
 
+    if 'prefix' in filter:
+      return self._pickPrefix(request, filter, params)
+
     if params['cache_pick']:
       fun =  soc.cache.logic.cache(self._getData)
     else:
@@ -726,6 +747,49 @@ class View(object):
 
     return self.json(request, data)
 
+  def _pickPrefix(self, request, filter, params):
+    """Returns the entities of which a field starts with a prefix as json.
+
+    The field is taken from the 'field' GET arg and has to be one of
+    params['pick_prefix_fields'], it defaults to the first of them. Only a
+    single range query that is answered from the index on the field is
+    done, and its result is cached per prefix.
+
+    Args:
+      request: the standard Django HTTP request object
+      filter: the GET args of the request, including 'prefix'
+      params: a dict with params for this View
+    """
+
+    logic = params['logic']
+    prefix_fields = params['pick_prefix_fields']
+
+    prefix = filter.pop('prefix')[0]
+    field = filter.pop('field', prefix_fields[:1])[0]
+
+    if field not in prefix_fields:
+      error = out_of_band.Error(self.DEF_INVALID_PREFIX_FIELD_MSG_FMT % field,
+                                status=400)
+      return helper.responses.errorResponse(error, request)
+
+    # link ids are always lower case
+    if field == 'link_id':
+      prefix = prefix.lower()
+
+    if prefix:
+      filter['%s >=' % field] = prefix
+      filter['%s <' % field] = prefix + u'\ufffd'
+
+    order = [field]
+    limit = params['pick_prefix_limit']
+
+    field_names = params.get('cache_pick_order') or ['link_id', 'name']
+
+    fun = soc.cache.logic.cache(self._getPrefixData)
+    data = fun(logic.getModel(), filter, order, logic, limit, field_names)
+
+    return self.json(request, data)
+
   def json(self, request, data):
     """Returns data as a json object.
     """
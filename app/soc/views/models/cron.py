@@ -29,10 +29,15 @@ from django import http
 from soc.logic import dicts
 from soc.logic.models.priority_group import logic as priority_group_logic
 from soc.logic.models.job import logic as job_logic
+from soc.logic.models.program import logic as program_logic
+from soc.logic.models.project_index import logic as project_index_logic
+from soc.modules import callback
 from soc.views.helper import access
+from soc.views.helper import decorators
 from soc.views.models import base
 
 import soc.cron.job
+import soc.cron.search_indexer
 
 
 class View(base.View):
@@ -48,6 +53,8 @@ class View(base.View):
     """
 
     rights = access.Checker(params)
+    rights['index'] = ['checkIsDeveloper']
+    rights['project_indices'] = ['checkIsDeveloper']
 
     new_params = {}
     new_params['rights'] = rights
@@ -58,6 +65,12 @@ class View(base.View):
     new_params['django_patterns_defaults'] = [
         (r'^%(url_name)s/(?P<access_type>poke)$',
           'soc.views.models.%(module_name)s.poke', 'Poke %(name_short)s'),
+        (r'^%(url_name)s/(?P<access_type>index)$',
+          'soc.views.models.%(module_name)s.index',
+          'Build the search index'),
+        (r'^%(url_name)s/(?P<access_type>project_indices)$',
+          'soc.views.models.%(module_name)s.project_indices',
+          'Rebuild the project indices'),
         ]
 
     params = dicts.merge(params, new_params)
@@ -73,6 +86,14 @@ class View(base.View):
       page_name: the page name displayed in templates as page and header title
     """
 
+    # the modules start their jobs here, before the waiting jobs are
+    # collected so that they run during this poke
+    for hook in callback.getCore().getCronHooks():
+      hook()
+
+    # the posting lists of entities changed since the last poke
+    soc.cron.search_indexer.startSearchIndexUpdate()
+
     order = ['-priority']
     query = priority_group_logic.getQueryForFields(order=order)
     groups = priority_group_logic.getAll(query)
@@ -89,8 +110,9 @@ class View(base.View):
           'status': 'waiting',
           }
 
-      queryGen = lambda: job_logic.getQueryForFields(filter=filter)
-      jobs = job_logic.entityIterator(queryGen, batch_size=10)
+      queryGen = lambda keys_only: job_logic.getQueryForFields(
+          filter=filter, keys_only=keys_only)
+      jobs = job_logic.entityIterator(queryGen, batch_size=10, keys_only=True)
 
       retry_jobs = []
 
@@ -99,7 +121,7 @@ class View(base.View):
           retry_jobs.append(job)
           continue
 
-        job_key = job.key().id()
+        job_key = job.id()
         status = handler.handle(job_key)
 
         if status is handler.OUT_OF_TIME:
@@ -115,7 +137,51 @@ class View(base.View):
 
     return http.HttpResponse(response)
 
+  @decorators.merge_params
+  @decorators.check_access
+  def index(self, request, access_type, page_name=None, params=None):
+    """Starts the jobs that build the search index for all indexed kinds.
+
+    Args:
+      request: the standard Django HTTP request object
+      access_type : the name of the access type which should be checked
+      page_name: the page name displayed in templates as page and header title
+      params: a dict with params for this View
+    """
+
+    jobs = soc.cron.search_indexer.startSearchIndexBuilds()
+
+    response = 'Started building the search index for: %s.' % (
+        ', '.join([i.text_data for i in jobs]))
+
+    return http.HttpResponse(response)
+
+  @decorators.merge_params
+  @decorators.check_access
+  def projectIndices(self, request, access_type, page_name=None,
+                     params=None):
+    """Starts the jobs that rebuild the project indices of all programs.
+
+    Args:
+      request: the standard Django HTTP request object
+      access_type : the name of the access type which should be checked
+      page_name: the page name displayed in templates as page and header title
+      params: a dict with params for this View
+    """
+
+    program_keys = program_logic.getKeysForFields({})
+
+    for program_key in program_keys:
+      project_index_logic.startRebuild(program_key)
+
+    response = 'Started rebuilding the project indices of %d programs.' % (
+        len(program_keys))
+
+    return http.HttpResponse(response)
+
 
 view = View()
 
+index = decorators.view(view.index)
 poke = view.poke
+project_indices = decorators.view(view.projectIndices)
@@ -176,14 +176,14 @@ class View(base.View):
 
     super(View, self)._editGet(request, entity, form)
 
-  def getMenusForScope(self, entity, params):
-    """Returns the featured menu items for one specifc entity.
+  def getMenuFetch(self, entity, params):
+    """Returns how getMenusForScope fetches the featured documents of entity.
 
-    A link to the home page of the specified entity is also included.
+    This allows the menus of several entities to be fetched at once with
+    soc.logic.parallel.getForFields.
 
-    Args:
-      entity: the entity for which the entry should be constructed
-      params: a dict with params for this View.
+    Returns:
+      A (logic, kwargs) tuple, kwargs being the arguments for getForFields.
     """
 
     filter = {
@@ -192,7 +192,23 @@ class View(base.View):
         'is_featured': True,
         }
 
-    entities = self._logic.getForFields(filter)
+    return self._logic, {'filter': filter}
+
+  def getMenusForScope(self, entity, params, entities=None):
+    """Returns the featured menu items for one specifc entity.
+
+    A link to the home page of the specified entity is also included.
+
+    Args:
+      entity: the entity for which the entry should be constructed
+      params: a dict with params for this View.
+      entities: the featured documents of entity, as fetched with the
+                arguments from getMenuFetch
+    """
+
+    if entities is None:
+      logic, kwargs = self.getMenuFetch(entity, params)
+      entities = logic.getForFields(**kwargs)
 
     submenus = []
 
@@ -22,6 +22,8 @@ __authors__ = [
   ]
 
 
+from django import http
+
 from soc.logic import dicts
 from soc.logic.models.survey import GRADES
 from soc.logic.models.survey import grading_logic as grading_survey_logic
@@ -76,11 +78,11 @@ class View(project_survey.View):
 
 
   def activateGrades(self, request, **kwargs):
-    """Updates SurveyRecord's grades for a given Survey.
+    """Starts the job that updates the projects' grades for a given Survey.
     """
-    survey_key_name = survey_logic.getKeyNameFromPath(request.path)
-    survey = Survey.get_by_key_name(survey_key_name)
-    survey_logic.activateGrades(survey)
+    survey_key_name = grading_survey_logic.getKeyNameFromPath(request.path)
+    survey = grading_survey_logic.getFromKeyNameOr404(survey_key_name)
+    grading_survey_logic.activateGrades(survey)
     return
 
 
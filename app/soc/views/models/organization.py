@@ -33,6 +33,7 @@ from django.utils.translation import ugettext
 
 from soc.logic import cleaning
 from soc.logic import dicts
+from soc.logic import parallel
 from soc.logic import accounts
 from soc.logic.helper import timeline as timeline_helper
 from soc.logic.models import mentor as mentor_logic
@@ -241,16 +242,76 @@ class View(group.View):
         ranked_params['name_plural'], org_entity.name)
     ranked_params['list_action'] = (redirects.getReviewRedirect, ranked_params)
 
+    new_params = list_params.copy() # new proposals
+    new_params['list_description'] = 'List of new %s sent to %s ' % (
+        new_params['name_plural'], org_entity.name)
+    new_params['list_action'] = (redirects.getReviewRedirect, new_params)
+
+    ap_params = list_params.copy() # accepted proposals
+
+    description = ugettext('List of accepted %s sent to %s ') % (
+        ap_params['name_plural'], org_entity.name)
+
+    ap_params['list_description'] = description
+    ap_params['list_action'] = (redirects.getReviewRedirect, ap_params)
+
+    rp_params = list_params.copy() # rejected proposals
+
+    description = ugettext('List of rejected %s sent to %s ') % (
+        rp_params['name_plural'], org_entity.name)
+
+    rp_params['list_description'] = description
+    rp_params['list_action'] = (redirects.getReviewRedirect, rp_params)
+
+    ip_params = list_params.copy() # ineligible proposals
+
+    description = ugettext('List of ineligible %s sent to %s ') % (
+        ip_params['name_plural'], org_entity.name)
+
+    ip_params['list_description'] = description
+    ip_params['list_action'] = (redirects.getReviewRedirect, ip_params)
+
     # TODO(ljvderijk) once sorting with IN operator is fixed, 
     # make this list show more
-    filter = {'org': org_entity,
-              'status': 'pending'}
+    ranked_filter = {'org': org_entity,
+                     'status': 'pending'}
 
     # order by descending score
-    order = ['-score']
+    ranked_order = ['-score']
+
+    # the lists by status: (params, status, idx)
+    status_lists = [(new_params, 'new', 2), (ap_params, 'accepted', 3),
+                    (rp_params, 'rejected', 4), (ip_params, 'invalid', 5)]
+
+    # check if the current user is a mentor
+    user_entity = user_logic.logic.getForCurrentAccount()
+
+    ranker_fields = {'link_id': student_proposal.DEF_RANKER_NAME,
+                     'scope': org_entity}
+
+    mentor_fields = {'user': user_entity,
+                     'scope': org_entity}
+
+    # none of these depend on each other, so fetch them all at once
+    calls = [
+        lists.getListFetch(request, ranked_params, ranked_filter,
+                           order=ranked_order, idx=0),
+        (ranker_root_logic, {'filter': ranker_fields, 'unique': True}),
+        (mentor_logic.logic, {'filter': mentor_fields, 'unique': True}),
+        ]
+
+    for status_params, status, idx in status_lists:
+      filter = {'org': org_entity,
+                'status': status}
+      calls.append(lists.getListFetch(request, status_params, filter,
+                                      idx=idx))
+
+    results = parallel.getForFields(calls)
+    ranked_data, ranker_root, mentor_entity = results[:3]
 
     prop_list = lists.getListContent(
-        request, ranked_params, filter, order=order, idx=0)
+        request, ranked_params, ranked_filter, order=ranked_order, idx=0,
+        data=ranked_data)
 
     proposals = prop_list['data']
 
@@ -258,10 +319,6 @@ class View(group.View):
     scores = [[proposal.score] for proposal in proposals]
 
     # retrieve the ranker
-    fields = {'link_id': student_proposal.DEF_RANKER_NAME,
-              'scope': org_entity}
-
-    ranker_root = ranker_root_logic.getForFields(fields, unique=True)
     ranker = ranker_root_logic.getRootFromEntity(ranker_root)
 
     # retrieve the ranks for these scores
@@ -287,13 +344,6 @@ class View(group.View):
     prop_list['info'] = (list_info_helper.getStudentProposalInfo(ranking_keys,
         proposal_keys), None)
 
-    # check if the current user is a mentor
-    user_entity = user_logic.logic.getForCurrentAccount()
-
-    fields = {'user': user_entity,
-        'scope': org_entity,}
-    mentor_entity = mentor_logic.logic.getForFields(fields, unique=True)
-
     if mentor_entity:
       mp_params = list_params.copy() # proposals mentored by current user
 
@@ -309,59 +359,12 @@ class View(group.View):
       mp_list = lists.getListContent(
           request, mp_params, filter, idx=1, need_content=True)
 
-    new_params = list_params.copy() # new proposals
-    new_params['list_description'] = 'List of new %s sent to %s ' % (
-        new_params['name_plural'], org_entity.name)
-    new_params['list_action'] = (redirects.getReviewRedirect, new_params)
-
-    filter = {'org': org_entity,
-              'status': 'new'}
-
     contents = []
-    new_list = lists.getListContent(
-        request, new_params, filter, idx=2, need_content=True)
-
-    ap_params = list_params.copy() # accepted proposals
-
-    description = ugettext('List of accepted %s sent to %s ') % (
-        ap_params['name_plural'], org_entity.name)
-
-    ap_params['list_description'] = description
-    ap_params['list_action'] = (redirects.getReviewRedirect, ap_params)
-
-    filter = {'org': org_entity,
-              'status': 'accepted'}
-
-    ap_list = lists.getListContent(
-        request, ap_params, filter, idx=3, need_content=True)
-
-    rp_params = list_params.copy() # rejected proposals
-
-    description = ugettext('List of rejected %s sent to %s ') % (
-        rp_params['name_plural'], org_entity.name)
-
-    rp_params['list_description'] = description
-    rp_params['list_action'] = (redirects.getReviewRedirect, rp_params)
-
-    filter = {'org': org_entity,
-              'status': 'rejected'}
-
-    rp_list = lists.getListContent(
-        request, rp_params, filter, idx=4, need_content=True)
-
-    ip_params = list_params.copy() # ineligible proposals
-
-    description = ugettext('List of ineligible %s sent to %s ') % (
-        ip_params['name_plural'], org_entity.name)
-
-    ip_params['list_description'] = description
-    ip_params['list_action'] = (redirects.getReviewRedirect, ip_params)
-
-    filter = {'org': org_entity,
-              'status': 'invalid'}
 
-    ip_list = lists.getListContent(
-        request, ip_params, filter, idx=5, need_content=True)
+    new_list, ap_list, rp_list, ip_list = [
+        lists.getListContent(request, status_params, idx=idx,
+                             need_content=True, data=data)
+        for (status_params, _, idx), data in zip(status_lists, results[3:])]
 
     # fill contents with all the needed lists
     if new_list != None:
@@ -0,0 +1,132 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Views for the request profiling data.
+"""
+
+__authors__ = [
+    '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+from soc.logic import dicts
+from soc.logic import planner
+from soc.profiling import latency
+from soc.profiling import queries
+from soc.views import helper
+from soc.views.helper import access
+from soc.views.helper import decorators
+from soc.views.helper import params as params_helper
+
+
+class View(object):
+  """View methods for the profiling data.
+
+  There is no model behind the profiling data, so unlike the other views
+  this does not derive from base.View and has no logic, only the pages
+  in django_patterns_defaults are registered.
+  """
+
+  def __init__(self, params=None):
+    """Defines the params required to provide the user with the slowest
+    views page.
+
+    Params:
+      params: a dict with params for this View
+    """
+
+    rights = access.Checker(params)
+    rights['slowest'] = ['checkIsDeveloper']
+
+    new_params = {}
+    new_params['rights'] = rights
+
+    new_params['name'] = "Profiling"
+    new_params['url_name'] = 'profiling'
+    new_params['module_name'] = 'profiling'
+    new_params['module_package'] = 'soc.views.models'
+    new_params['js_uses_all'] = params_helper.DEF_JS_USES_LIST
+
+    new_params['django_patterns_defaults'] = [
+        (r'^%(url_name)s/(?P<access_type>slowest)$',
+          '%(module_package)s.%(module_name)s.slowest', 'Slowest Views'),
+        ]
+
+    new_params['slowest_template'] = 'soc/profiling/slowest.html'
+
+    self._params = dicts.merge(params, new_params)
+
+  def getParams(self):
+    """Returns this view's params attribute.
+    """
+
+    return self._params
+
+  def getDjangoURLPatterns(self):
+    """Returns the url patterns of the pages in django_patterns_defaults,
+    in the format of soc.views.sitemap.sitemap.getDjangoURLPatterns.
+    """
+
+    patterns = []
+
+    for url, module, name in self._params['django_patterns_defaults']:
+      url = url % self._params
+      module = module % self._params
+      patterns.append((url, module, {'page_name': name}, name))
+
+    return patterns
+
+  @decorators.merge_params
+  @decorators.check_access
+  def slowest(self, request, access_type, page_name=None, params=None):
+    """Lists the recorded views, slowest first, with their latency
+    histograms. The latest profile of the view specified by the 'view' GET
+    arg is shown as well, followed by the query shapes of this instance
+    and the ones that are not covered by index.yaml.
+
+    Args:
+      request: the standard Django HTTP request object
+      access_type : the name of the access type which should be checked
+      page_name: the page name displayed in templates as page and header title
+      params: a dict with params for this View
+    """
+
+    context = helper.responses.getUniversalContext(request)
+    helper.responses.useJavaScript(context, params['js_uses_all'])
+    context['page_name'] = page_name
+
+    bounds = latency.DEF_BUCKETS
+    labels = ['< %dms' % i for i in bounds] + ['>= %dms' % bounds[-1]]
+
+    context['bucket_labels'] = labels
+    context['view_stats'] = latency.getViewStats()
+    context['query_stats'] = queries.getStats()
+    context['uncovered_queries'] = planner.getUncovered()
+
+    view_key = request.GET.get('view')
+
+    if view_key:
+      context['profile_view'] = view_key
+      context['profile'] = latency.getProfile(view_key)
+
+    template = params['slowest_template']
+
+    return helper.responses.respond(request, template, context=context)
+
+
+view = View()
+
+slowest = decorators.view(view.slowest)
@@ -33,6 +33,7 @@ from django.utils.translation import ugettext
 from soc.logic import allocations
 from soc.logic import cleaning
 from soc.logic import dicts
+from soc.logic import parallel
 from soc.logic.helper import timeline as timeline_helper
 from soc.logic.models import host as host_logic
 from soc.logic.models import mentor as mentor_logic
@@ -469,7 +470,7 @@ class View(presence.View):
               'slots >': 0,
               'status': 'active'}
 
-    query = org_logic.logic.getQueryForFields(fields)
+    query = org_logic.logic.getQueryForFields(fields, keys_only=True)
 
     to_json = {
         'nr_of_orgs': query.count(),
@@ -631,13 +632,30 @@ class View(presence.View):
 
     rights.setCurrentUser(id, user)
 
+    # fetch the featured documents of all programs and the featured surveys
+    # of the visible ones at once, the documents of invisible programs are
+    # shown to their hosts
+    calls = []
+
+    for entity in entities:
+      calls.append(document_view.view.getMenuFetch(entity, params))
+
+      if entity.status == 'visible':
+        calls.append(survey_view.view.getMenuFetch(entity, params))
+
+    results = iter(parallel.getForFields(calls))
+
     for entity in entities:
       items = []
+      documents = results.next()
 
       if entity.status == 'visible':
         # show the documents for this program, even for not logged in users
-        items += document_view.view.getMenusForScope(entity, params)
-        items += survey_view.view.getMenusForScope(entity, params)
+        surveys = results.next()
+        items += document_view.view.getMenusForScope(entity, params,
+                                                     entities=documents)
+        items += survey_view.view.getMenusForScope(entity, params,
+                                                   entities=surveys)
         items += self._getTimeDependentEntries(entity, params, id, user)
 
       try:
@@ -648,7 +666,8 @@ class View(presence.View):
 
         if entity.status == 'invisible':
           # still add the document links so hosts can see how it looks like
-          items += document_view.view.getMenusForScope(entity, params)
+          items += document_view.view.getMenusForScope(entity, params,
+                                                       entities=documents)
           items += self._getTimeDependentEntries(entity, params, id, user)
 
         items += [(redirects.getReviewOverviewRedirect(
@@ -682,7 +701,7 @@ class View(presence.View):
         items += [(redirects.getCreateProjectSurveyRedirect(entity, 'program'),
             "Create a New Project Survey", 'any_access')]
         # add link to list all Program Surveys
-        items += [(redirects.getListProjectSurveyRedirect(entity, 'program'),
+        items += [(redirects.getListProjectSurveysRedirect(entity, 'program'),
             "List Project Surveys", 'any_access')]
         # add link to create a new Program Survey
         items += [(redirects.getCreateGradeSurveyRedirect(entity, 'program'),
@@ -727,7 +746,7 @@ class View(presence.View):
           'scope': program_entity,
           }
 
-      if org_app_logic.logic.getForFields(filter, unique=True):
+      if org_app_logic.logic.getKeysForFields(filter, unique=True):
         # add the 'List my Organization Applications' link
         items += [
             (redirects.getListSelfRedirect(program_entity,
@@ -110,6 +110,8 @@ class View(presence_with_tos.View):
                    ('^seed_many$', 'soc.models.seed_db.seed_many', "Seed Many"),
                    ('^new_seed_many$', 'soc.models.seed_db.new_seed_many',
                     "New Seed Many"),
+                   ('^seed_scenario$', 'soc.models.seed_db.seed_scenario',
+                    "Seed Scenario"),
                    ]
 
     new_params['extra_django_patterns'] = patterns
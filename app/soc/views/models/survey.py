@@ -23,6 +23,7 @@ __authors__ = [
   '"Lennard de Rijk" <ljvderijk@gmail.com>',
   ]
 
+import copy
 import datetime
 import re
 import string
@@ -37,6 +38,7 @@ from soc.cache import home
 from soc.logic import cleaning
 from soc.logic import dicts
 from soc.logic.models.survey import logic as survey_logic
+from soc.logic.models.survey_aggregate import logic as aggregate_logic
 from soc.logic.models.user import logic as user_logic
 from soc.models.survey import Survey
 from soc.models.survey_record import SurveyRecord
@@ -367,8 +369,11 @@ class View(base.View):
 
     results = surveys.SurveyResults()
 
+    # individual records are only listed on request, see getResultsPaging
+    records, limit, offset = self.getResultsPaging(request)
     context['survey_records'] = results.render(self._entity, self._params,
-                                               filter={})
+                                               filter={}, limit=limit,
+                                               offset=offset, records=records)
 
     super(View, self)._editContext(request, context)
 
@@ -426,7 +431,8 @@ class View(base.View):
 
       # there is a SurveyContent already
       survey_content = entity.survey_content
-      schema = eval(survey_content.schema)
+      # the schema is modified below, so don't touch the cached one
+      schema = copy.deepcopy(survey_content.getSchema())
 
       for question_name in survey_content.dynamic_properties():
 
@@ -640,19 +646,37 @@ class View(base.View):
 
       filter = self._params.get('filter') or {}
 
+      show_records, limit, offset = self.getResultsPaging(request)
+
       # if user can edit the survey, show everyone's results
       if can_write:
         filter['survey'] = entity
+
+        # the statistics are read from the aggregate, so listing the
+        # individual records is only done when asked for
+        total, statistics = aggregate_logic.getStatisticsOrRebuild(
+            entity, results_logic)
+
+        if total is None:
+          # the statistics are being recounted, list the records meanwhile
+          show_records = True
+          context['statistics_rebuilding'] = True
+
+        context['statistics_total'] = total
+        context['statistics'] = statistics
+        context['records_shown'] = show_records
       else:
         filter.update({'user': user, 'survey': entity})
+        show_records = True
 
-      limit = self._params.get('limit') or 1000
-      offset = self._params.get('offset') or 0
       order = self._params.get('order') or []
       idx = self._params.get('idx') or 0
 
-      records = results_logic.getForFields(filter=filter, limit=limit,
-                                        offset=offset, order=order)
+      if show_records:
+        records = results_logic.getForFields(filter=filter, limit=limit,
+                                             offset=offset, order=order)
+      else:
+        records = []
 
     updates = dicts.rename(params, params['list_params'])
     context.update(updates)
@@ -662,6 +686,28 @@ class View(base.View):
     template = 'soc/survey/results_page.html'
     return responses.respond(request, template, context=context)
 
+  def getResultsPaging(self, request):
+    """Returns which page of survey records is requested.
+
+    Returns:
+      A (records, limit, offset) tuple, records is True iff the
+      individual records should be listed.
+    """
+
+    records = 'records' in request.GET
+
+    try:
+      limit = int(request.GET.get('limit', surveys.DEF_RESULTS_LIMIT))
+      offset = int(request.GET.get('offset', 0))
+    except ValueError:
+      limit = surveys.DEF_RESULTS_LIMIT
+      offset = 0
+
+    limit = max(1, min(limit, 1000))
+    offset = max(0, offset)
+
+    return records, limit, offset
+
   @decorators.merge_params
   @decorators.check_access
   def exportSerialized(self, request, access_type, page_name=None,
@@ -682,8 +728,7 @@ class View(base.View):
     content = ((prop, getattr(sur.survey_content, prop)) for prop in dynamic)
     json['survey_content'] = dict(content)
 
-    schema =  sur.survey_content.schema
-    json['survey_content']['schema'] = eval(sur.survey_content.schema)
+    json['survey_content']['schema'] = sur.survey_content.getSchema()
 
     data = simplejson.dumps(json, indent=2)
 
@@ -727,6 +772,48 @@ class View(base.View):
 
     return entity, context
 
+  def getMenuFetch(self, entity, params):
+    """Returns how getMenusForScope fetches the featured surveys of entity.
+
+    This allows the menus of several entities to be fetched at once with
+    soc.logic.parallel.getForFields.
+
+    Returns:
+      A (logic, kwargs) tuple, kwargs being the arguments for getForFields.
+    """
+
+    filter = {
+        'prefix' : params['url_name'],
+        'scope_path': entity.key().id_or_name(),
+        'is_featured': True,
+        }
+
+    return self._logic, {'filter': filter}
+
+  def getMenusForScope(self, entity, params, entities=None):
+    """Returns the menu items for the featured surveys of an entity.
+
+    Args:
+      entity: the entity for which the entries should be constructed
+      params: a dict with params for the View of entity
+      entities: the featured surveys of entity, as fetched with the
+                arguments from getMenuFetch
+    """
+
+    if entities is None:
+      logic, kwargs = self.getMenuFetch(entity, params)
+      entities = logic.getForFields(**kwargs)
+
+    submenus = []
+
+    # add a link to all featured surveys
+    for entity in entities:
+      submenu = (redirects.getPublicRedirect(entity, self._params),
+                 entity.short_name, 'show')
+      submenus.append(submenu)
+
+    return submenus
+
 
 view = View()
 
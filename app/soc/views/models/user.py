@@ -71,6 +71,7 @@ class View(base.View):
     new_params['edit_template'] = 'soc/user/edit.html'
     new_params['pickable'] = True
     new_params['cache_pick'] = True
+    new_params['pick_prefix_fields'] = ['link_id', 'name']
 
     new_params['sidebar_heading'] = 'Users'
 
@@ -1,8 +1,36 @@
 from google.appengine.ext import db
+import hashlib
 import string
-    
+
+TAG_SHARDS = 10
+"The number of shards the entities tagged with a single tag are spread over."
+
+TAG_COUNT_UPDATE_INTERVAL = 10
+"""The minimum number of seconds between two updates of the tagged_count
+that is stored in a Tag entity, 0 stores the count on every change.  A
+count that could not be stored is stored when the tag is read again."""
+
+TAG_CACHE_TIME = 3600
+"The number of seconds the lists of tags are cached."
+
+TAG_CACHE_LIMIT = 1000
+"The maximum number of tags that is cached for each list of tags."
+
+TAG_CACHE_ORDERS = {
+    'tags_by_name_asc': (lambda tag: tag.tag, False),
+    'tags_by_name_desc': (lambda tag: tag.tag, True),
+    'popular_tags': (lambda tag: tag.tagged_count, True),
+}
+"""The cached lists of tags, with the key and direction they are sorted by."""
+
 class Tag(db.Model):
-    "Google AppEngine model for store of tags."
+    """Google AppEngine model for store of tags.
+
+    The entities that have been tagged with a tag are stored as TaggedKey
+    entities, which are spread over TAG_SHARDS TagShard entity groups.
+    Tagging different entities with the same tag therefore does not
+    contend on a single entity.  Tags that still have keys in the legacy
+    tagged list are moved over by migrate_tagged()."""
     
     tag = db.StringProperty(required=True)
     "The actual string value of the tag."
@@ -10,50 +38,193 @@ class Tag(db.Model):
     added = db.DateTimeProperty(auto_now_add=True)
     "The date and time that the tag was first added to the datastore."
     
-    tagged = db.ListProperty(db.Key)
-    "A List of db.Key values for the datastore objects that have been tagged with this tag value."
-    
     tagged_count = db.IntegerProperty(default=0)
-    "The number of entities in tagged."
+    """The number of entities that have been tagged with this tag.  The
+    value that is stored is updated at most once every
+    TAG_COUNT_UPDATE_INTERVAL seconds, the exact value is kept in the
+    TagShard entities of this tag."""
+
+    tagged = db.ListProperty(db.Key, default=[])
+    """The db.Key values of the entities that were tagged with this tag
+    before TaggedKey entities were used.  It is kept so that these tags are
+    not lost when the Tag is stored, migrate_tagged() empties it."""
 
     @classmethod
     def __key_name(cls, tag_name):
         return cls.__name__ + '_' + tag_name
+
+    @classmethod
+    def __dirty_name(cls, tag_name):
+        "Returns the memcache key that marks a tagged_count as not stored."
+        return cls.__name__ + '_count_dirty_' + tag_name
+
+    def __shard_key(self, index):
+        "Returns the key of the TagShard with the given index for this tag."
+        return db.Key.from_path(TagShard.kind(),
+                                '%s_%d' % (self.key().name(), index))
+
+    def __shard_key_for(self, key):
+        "Returns the key of the TagShard that key is stored in."
+        digest = hashlib.md5(str(key)).hexdigest()
+        return self.__shard_key(int(digest[:8], 16) % TAG_SHARDS)
+
+    def __tagged_key_key(self, key):
+        "Returns the key of the TaggedKey entity for key."
+        return db.Key.from_path(TaggedKey.kind(), str(key),
+                                parent=self.__shard_key_for(key))
+
+    def get_tagged_count(self):
+        "Returns the exact number of entities tagged with this tag."
+        shard_keys = [self.__shard_key(i) for i in range(TAG_SHARDS)]
+        return sum([i.count for i in TagShard.get(shard_keys) if i])
+
+    def get_tagged(self, limit=1000):
+        "Returns the keys of the entities that have been tagged with this tag."
+        query = db.Query(TaggedKey).filter('tag =', self)
+        return [i.tagged for i in query.fetch(limit)]
+
+    def __store_count(self):
+        """Stores tagged_count at most once every TAG_COUNT_UPDATE_INTERVAL
+        seconds.  Otherwise the tag is marked as dirty, so that the count is
+        stored when the tag is read again, see __store_dirty_counts."""
+        from google.appengine.api import memcache
+
+        lock_name = self.__class__.__name__ + '_count_lock_' + self.tag
+        dirty_name = self.__class__.__dirty_name(self.tag)
+        if not TAG_COUNT_UPDATE_INTERVAL or \
+                memcache.add(lock_name, 1, TAG_COUNT_UPDATE_INTERVAL):
+            # clear the mark first, so that a change made while storing
+            # the count marks the tag again
+            memcache.delete(dirty_name)
+            self.put()
+        else:
+            memcache.set(dirty_name, 1)
+
+    def __update_count(self):
+        "Updates tagged_count with the count from the shards and stores it."
+        self.tagged_count = self.get_tagged_count()
+        self.__store_count()
+        self.__class__.__update_cached_tag(self)
+
+    @classmethod
+    def __store_dirty_counts(cls, tags):
+        """Stores the exact tagged_count of the tags that are marked as dirty.
+        Only a single memcache call is made when none of them are."""
+        from google.appengine.api import memcache
+
+        if not tags:
+            return
+        dirty = memcache.get_multi([cls.__dirty_name(i.tag) for i in tags])
+        for tag in tags:
+            if cls.__dirty_name(tag.tag) in dirty:
+                tag.tagged_count = tag.get_tagged_count()
+                tag.__store_count()
+
+    def migrate_tagged(self):
+        """Moves the keys in the legacy tagged list to TaggedKey entities and
+        stores the exact count.  Returns the number of keys that were moved."""
+        keys = list(self.tagged)
+        for key in keys:
+            self.__add_tagged_key(key)
+        self.tagged = []
+        self.tagged_count = self.get_tagged_count()
+        self.put()
+        self.__class__.__update_cached_tag(self)
+        return len(keys)
+
+    @classmethod
+    def migrate_tagged_lists(cls, limit=100):
+        """Migrates at most limit tags that still have keys in the legacy
+        tagged list, see migrate_tagged().  Returns the number of tags that
+        were migrated, call it until it returns 0."""
+        # empty lists are not indexed, so only unmigrated tags are returned
+        tags = {}
+        for tag in db.Query(cls).order('tagged').fetch(limit):
+            tags[tag.key()] = tag
+        for tag in tags.values():
+            tag.migrate_tagged()
+        return len(tags)
+
+    def __migrate_if_needed(self):
+        "Migrates the legacy tagged list before the tagged keys are changed."
+        if self.tagged:
+            self.migrate_tagged()
     
     def remove_tagged(self, key):
+        self.__migrate_if_needed()
+        tagged_key_key = self.__tagged_key_key(key)
         def remove_tagged_txn():
-            if key in self.tagged:
-                self.tagged.remove(key)
-                self.tagged_count -= 1
-                self.put()
+            tagged_key = TaggedKey.get(tagged_key_key)
+            if tagged_key is not None:
+                shard = TagShard.get(tagged_key_key.parent())
+                shard.count -= 1
+                shard.put()
+                tagged_key.delete()
         db.run_in_transaction(remove_tagged_txn)
-        self.__class__.expire_cached_tags()
+        self.__update_count()
 
-    def add_tagged(self, key):
+    def __add_tagged_key(self, key):
+        "Stores a TaggedKey for key, unless key is already tagged."
+        tagged_key_key = self.__tagged_key_key(key)
         def add_tagged_txn():
-            if key not in self.tagged:
-                self.tagged.append(key)
-                self.tagged_count += 1
-                self.put()
+            if TaggedKey.get(tagged_key_key) is None:
+                shard_key = tagged_key_key.parent()
+                shard = TagShard.get(shard_key)
+                if shard is None:
+                    shard = TagShard(key_name=shard_key.name())
+                shard.count += 1
+                tagged_key = TaggedKey(parent=shard, key_name=str(key),
+                                       tag=self, tagged=key)
+                db.put([shard, tagged_key])
         db.run_in_transaction(add_tagged_txn)
-        self.__class__.expire_cached_tags()
+
+    def add_tagged(self, key):
+        self.__migrate_if_needed()
+        self.__add_tagged_key(key)
+        self.__update_count()
     
     def clear_tagged(self):
-        def clear_tagged_txn():
-            self.tagged = []
-            self.tagged_count = 0
-            self.put()
-        db.run_in_transaction(clear_tagged_txn)
-        self.__class__.expire_cached_tags()
+        self.tagged = []
+        for index in range(TAG_SHARDS):
+            shard_key = self.__shard_key(index)
+            query = db.Query(TaggedKey, keys_only=True).ancestor(shard_key)
+            tagged_key_keys = query.fetch(1000)
+            while tagged_key_keys:
+                def clear_tagged_txn():
+                    # queries are not allowed in transactions, so only the
+                    # entities that still exist are removed and counted
+                    existing = [i for i in TaggedKey.get(tagged_key_keys) if i]
+                    shard = TagShard.get(shard_key)
+                    shard.count -= len(existing)
+                    shard.put()
+                    db.delete(existing)
+                db.run_in_transaction(clear_tagged_txn)
+                tagged_key_keys = query.fetch(1000)
+        self.tagged_count = 0
+        self.put()
+        self.__class__.__update_cached_tag(self)
         
     @classmethod
     def get_by_name(cls, tag_name):
-        return cls.get_by_key_name(cls.__key_name(tag_name))
+        tag = cls.get_by_key_name(cls.__key_name(tag_name))
+        if tag is not None:
+            tag.__migrate_if_needed()
+            tag.tagged_count = tag.get_tagged_count()
+            cls.__store_dirty_counts([tag])
+        return tag
     
     @classmethod
     def get_tags_for_key(cls, key):
-        "Set the tags for the datastore object represented by key."
-        tags = db.Query(cls).filter('tagged =', key).fetch(1000)
+        "Get the tags for the datastore object represented by key."
+        query = db.Query(TaggedKey).filter('tagged =', key)
+        tag_keys = [TaggedKey.tag.get_value_for_datastore(i)
+                    for i in query.fetch(1000)]
+        tag_keys = [i for i in tag_keys if i.kind() == cls.kind()]
+        tags = [i for i in cls.get(tag_keys) if i is not None]
+        # tags that have not been migrated yet still list the key themselves
+        legacy = db.Query(cls).filter('tagged =', key).fetch(1000)
+        tags += [i for i in legacy if i.key() not in tag_keys]
+        cls.__store_dirty_counts(tags)
         return tags
     
     @classmethod
@@ -68,6 +239,7 @@ class Tag(db.Model):
                 new_tag.put()
                 return new_tag
             existing_tag = db.run_in_transaction(create_tag_txn)
+            cls.__update_cached_tag(existing_tag)
         return existing_tag
     
     @classmethod
@@ -76,8 +248,9 @@ class Tag(db.Model):
         most frequently-used first.  If limit is given, return only that many tags; otherwise,
         return all."""
         tag_list = db.Query(cls).filter('tagged_count >', 0).order("-tagged_count").fetch(limit)
-            
-        return tag_list
+        cls.__store_dirty_counts(tag_list)
+        tag_list.sort(key=lambda tag: tag.tagged_count, reverse=True)
+        return [i for i in tag_list if i.tagged_count > 0]
 
     @classmethod
     def get_tags_by_name(cls, limit=1000, ascending=True):
@@ -85,48 +258,112 @@ class Tag(db.Model):
         If a limit is given, return only that many tags; otherwise, return all.
         If ascending is True, sort from a-z; otherwise, sort from z-a."""
 
-        from google.appengine.api import memcache
-
-        cache_name = cls.__name__ + '_tags_by_name'
         if ascending:
-            cache_name += '_asc'
-        else:
-            cache_name += '_desc'
-            
-        tags = memcache.get(cache_name)
-        if tags is None or len(tags) < limit:
+            cache_kind = 'tags_by_name_asc'
             order_by = "tag"
-            if not ascending:
-                order_by = "-tag"
-            
-            tags = db.Query(cls).order(order_by).fetch(limit)
-            memcache.add(cache_name, tags, 3600)
         else:
-            if len(tags) > limit:
-                # Return only as many as requested.
-                tags = tags[:limit]
-                
-        return tags
-        
+            cache_kind = 'tags_by_name_desc'
+            order_by = "-tag"
+
+        def fetch(fetch_limit):
+            return db.Query(cls).order(order_by).fetch(fetch_limit)
+
+        return cls.__get_cached_tags(cache_kind, limit, fetch)
     
     @classmethod
     def popular_tags(cls, limit=5):
+        return cls.__get_cached_tags('popular_tags', limit,
+                                     cls.get_tags_by_frequency)
+
+    @classmethod
+    def expire_cached_tags(cls):
         from google.appengine.api import memcache
         
-        tags = memcache.get(cls.__name__ + '_popular_tags')
-        if tags is None:
-            tags = cls.get_tags_by_frequency(limit)
-            memcache.add(cls.__name__ + '_popular_tags', tags, 3600)
-        
+        for cache_kind in TAG_CACHE_ORDERS:
+            memcache.delete(cls.__cache_name(cache_kind))
+
+    @classmethod
+    def __cache_name(cls, cache_kind):
+        return cls.__name__ + '_' + cache_kind
+
+    @classmethod
+    def __get_cached_tags(cls, cache_kind, limit, fetch):
+        """Return the first limit tags of a cached list of tags, fetch is
+        called to retrieve the tags if not enough of them are cached.  The
+        cache holds the largest prefix of the list fetched so far, but no
+        more than TAG_CACHE_LIMIT tags.  A prefix that is shorter than the
+        amount of tags it was fetched with is known to be complete."""
+        from google.appengine.api import memcache
+
+        cache_name = cls.__cache_name(cache_kind)
+        cached = memcache.get(cache_name)
+
+        if cached is not None:
+            tags, complete = cached
+            if complete or len(tags) >= limit:
+                return tags[:limit]
+
+        tags = fetch(limit)
+        complete = len(tags) < limit
+
+        if len(tags) > TAG_CACHE_LIMIT:
+            complete = False
+
+        memcache.set(cache_name, (tags[:TAG_CACHE_LIMIT], complete),
+                     TAG_CACHE_TIME)
+
         return tags
 
     @classmethod
-    def expire_cached_tags(cls):
+    def __update_cached_tag(cls, tag):
+        """Update the cached lists of tags after the count of tag has changed
+        or the tag has been created, instead of expiring the lists.  A tag
+        is only added to a list when its position falls within the cached
+        prefix, so that the prefix never skips a tag that exists."""
         from google.appengine.api import memcache
-        
-        memcache.delete(cls.__name__ + '_popular_tags')
-        memcache.delete(cls.__name__ + '_tags_by_name_asc')
-        memcache.delete(cls.__name__ + '_tags_by_name_desc')
+
+        for cache_kind, (sort_key, reverse) in TAG_CACHE_ORDERS.items():
+            cache_name = cls.__cache_name(cache_kind)
+            cached = memcache.get(cache_name)
+            if cached is None:
+                continue
+
+            tags, complete = cached
+            tags = [i for i in tags if i.tag != tag.tag]
+
+            if cache_kind != 'popular_tags' or tag.tagged_count > 0:
+                position = len(tags)
+                for index, other in enumerate(tags):
+                    if sort_key(tag) != sort_key(other) and \
+                            (sort_key(tag) < sort_key(other)) != reverse:
+                        position = index
+                        break
+
+                if position < len(tags) or complete:
+                    tags.insert(position, tag)
+
+            if len(tags) > TAG_CACHE_LIMIT:
+                tags = tags[:TAG_CACHE_LIMIT]
+                complete = False
+
+            memcache.set(cache_name, (tags, complete), TAG_CACHE_TIME)
+
+class TagShard(db.Model):
+    """One of the TAG_SHARDS entity groups that hold the entities tagged with
+    a Tag.  The key name is <tag key name>_<shard index>."""
+
+    count = db.IntegerProperty(default=0)
+    "The number of TaggedKey entities in this shard."
+
+class TaggedKey(db.Model):
+    """Records that an entity has been tagged with a Tag.  The parent is the
+    TagShard of the tag the key hashes to, the key name is str(tagged)."""
+
+    tag = db.ReferenceProperty(Tag, collection_name='tagged_keys')
+    "The Tag the entity has been tagged with."
+
+    tagged = db.Property(required=True)
+    "The db.Key of the entity that has been tagged."
 
 class Taggable:
     """A mixin class that is used for making Google AppEngine Model classes taggable.
@@ -215,6 +215,83 @@ class MyTest(unittest.TestCase):
       self.assertEqual(type(tags), type([]))
       self.assertEqual(len(tags), 4)
     
+    def testTagGetTagged(self):
+      posts = []
+      for index in range(25):
+        posts.append(Post.new_post(new_title='test post %d' % index, new_body='This is a test post.', new_tags='shared'))
+
+      shared_tag = Tag.get_by_name('shared')
+      self.assertEqual(shared_tag.tagged_count, 25)
+      self.assertEqual(sorted(shared_tag.get_tagged()), sorted([i.key() for i in posts]))
+
+      # tagging the same entity twice does not change the count
+      shared_tag.add_tagged(posts[0].key())
+      self.assertEqual(shared_tag.tagged_count, 25)
+
+      shared_tag.clear_tagged()
+      self.assertEqual(Tag.get_by_name('shared').tagged_count, 0)
+      self.assertEqual(Tag.get_tags_for_key(posts[0].key()), [])
+
+    def testTagCountStoredOnRead(self):
+      posts = []
+      for index in range(3):
+        posts.append(Post.new_post(new_title='test post %d' % index, new_body='This is a test post.', new_tags='stale'))
+
+      # only the first change was stored, the others were within the interval
+      stored = Tag.get(Tag.get_by_name('stale').key())
+      self.assertEqual(stored.tagged_count, 1)
+
+      # reading the tag stores the exact count once the interval has passed
+      from google.appengine.api import memcache
+      memcache.flush_all()
+      memcache.set('Tag_count_dirty_stale', 1)
+      self.assertEqual(Tag.get_by_name('stale').tagged_count, 3)
+      self.assertEqual(Tag.get(stored.key()).tagged_count, 3)
+
+    def testMigrateTaggedLists(self):
+      posts = []
+      for index in range(3):
+        posts.append(Post.new_post(new_title='test post %d' % index, new_body='This is a test post.'))
+
+      # a tag as it was stored before TaggedKey entities were used
+      legacy = Tag(key_name='Tag_legacy', tag='legacy', tagged_count=2,
+                   tagged=[posts[0].key(), posts[1].key()])
+      legacy.put()
+
+      self.assertEqual([i.tag for i in Tag.get_tags_for_key(posts[0].key())], ['legacy'])
+      self.assertEqual(Tag.migrate_tagged_lists(), 1)
+      self.assertEqual(Tag.migrate_tagged_lists(), 0)
+
+      legacy = Tag.get_by_name('legacy')
+      self.assertEqual(legacy.tagged, [])
+      self.assertEqual(legacy.tagged_count, 2)
+      self.assertEqual(sorted(legacy.get_tagged()), sorted([posts[0].key(), posts[1].key()]))
+      self.assertEqual([i.tag for i in Tag.get_tags_for_key(posts[1].key())], ['legacy'])
+
+    def testTagCloudCache(self):
+      # store the counts right away so that they can be sorted on
+      import taggable
+      taggable.TAG_COUNT_UPDATE_INTERVAL = 0
+
+      Post.new_post(new_title='test post 7', new_body='This is a test post.', new_tags='alpha,beta,gamma')
+      Post.new_post(new_title='test post 8', new_body='This is a test post.', new_tags='beta,gamma')
+      Post.new_post(new_title='test post 9', new_body='This is a test post.', new_tags='gamma')
+
+      self.assertEqual([i.tag for i in Tag.get_tags_by_name(limit=1)], ['alpha'])
+      # a larger request than what is cached is retrieved and cached
+      self.assertEqual([i.tag for i in Tag.get_tags_by_name(limit=2)], ['alpha', 'beta'])
+      self.assertEqual([i.tag for i in Tag.get_tags_by_name(limit=10)], ['alpha', 'beta', 'gamma'])
+      self.assertEqual([i.tag for i in Tag.popular_tags(limit=5)], ['gamma', 'beta', 'alpha'])
+
+      # the cached lists are updated when tags are added or counts change
+      Post.new_post(new_title='test post 10', new_body='This is a test post.', new_tags='alpha,delta')
+      Post.new_post(new_title='test post 11', new_body='This is a test post.', new_tags='alpha')
+      Post.new_post(new_title='test post 12', new_body='This is a test post.', new_tags='alpha')
+      self.assertEqual([i.tag for i in Tag.get_tags_by_name(limit=10)], ['alpha', 'beta', 'delta', 'gamma'])
+      self.assertEqual([i.tag for i in Tag.popular_tags(limit=2)], ['alpha', 'gamma'])
+      self.assertEqual(Tag.popular_tags(limit=1)[0].tagged_count, 4)
+      taggable.TAG_COUNT_UPDATE_INTERVAL = 10
+
     def testTagGetByName(self):
       new_post = Post.new_post(new_title='test post 6', new_body='This is a test post.  Please continue to ignore.', new_tags='foo,bar,bletch,quux')
       assert new_post is not None
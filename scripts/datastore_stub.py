@@ -0,0 +1,656 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Indexed datastore stub for running tests and load tests locally.
+
+The DatastoreFileStub from the SDK answers every query by filtering and
+sorting all entities of the kind in Python and pickles the entire datastore
+after each write. IndexedDatastoreStub keeps the entities the same way, but
+also maintains a sorted index per property, so that queries only look at
+the entities that can match, and queries with at most one sort order stop
+as soon as enough results have been found. Entities are optionally stored
+in a sqlite database that is updated one entity at a time.
+
+Usage:
+  stub = datastore_stub.IndexedDatastoreStub('app-id', 'datastore.sqlite')
+  apiproxy_stub_map.apiproxy.RegisterStub('datastore_v3', stub)
+"""
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+]
+
+
+import bisect
+import datetime
+import operator
+import sqlite3
+
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import datastore_file_stub
+from google.appengine.api import datastore_types
+from google.appengine.datastore import datastore_pb
+from google.appengine.datastore import entity_pb
+from google.appengine.runtime import apiproxy_errors
+
+
+_KEY_PROPERTY = datastore_types._KEY_SPECIAL_PROPERTY
+
+_KEY_TAG = entity_pb.PropertyValue.kReferenceValueGroup
+
+_OPERATORS = {
+    datastore_pb.Query_Filter.LESS_THAN: operator.lt,
+    datastore_pb.Query_Filter.LESS_THAN_OR_EQUAL: operator.le,
+    datastore_pb.Query_Filter.GREATER_THAN: operator.gt,
+    datastore_pb.Query_Filter.GREATER_THAN_OR_EQUAL: operator.ge,
+    datastore_pb.Query_Filter.EQUAL: operator.eq,
+    }
+
+
+def getKeyOrder(reference):
+  """Returns a tuple that sorts the same as the key of reference.
+
+  Args:
+    reference: an entity_pb.Reference
+  """
+
+  order = [reference.app().decode('utf-8')]
+
+  for elem in reference.path().element_list():
+    order.append(repr(elem.type()))
+
+    if elem.has_name():
+      order.append(repr(elem.name().decode('utf-8')))
+    else:
+      order.append(elem.id())
+
+  return tuple(order)
+
+
+class PropertyIndex(object):
+  """Sorted index of the values of a single property of a single kind.
+  """
+
+  def __init__(self):
+    """Initializes an empty index.
+    """
+
+    #: the distinct normalized values in sort order
+    self.values = []
+
+    #: the key orders of the entities for each normalized value
+    self.keys = {}
+
+    #: the amount of entities with more than one value
+    self.multiple = 0
+
+  def add(self, value, key_order):
+    """Adds an entity with the specified value to the index.
+    """
+
+    if value not in self.keys:
+      bisect.insort(self.values, value)
+      self.keys[value] = set()
+
+    self.keys[value].add(key_order)
+
+  def remove(self, value, key_order):
+    """Removes an entity with the specified value from the index.
+    """
+
+    entities = self.keys[value]
+    entities.discard(key_order)
+
+    if not entities:
+      del self.keys[value]
+      del self.values[bisect.bisect_left(self.values, value)]
+
+  def getRange(self, filters):
+    """Returns the positions in values that can satisfy all filters.
+
+    Args:
+      filters: a list of (operator, [normalized values]) tuples
+    """
+
+    ranges = [self._getFilterRange(op, values) for op, values in filters]
+
+    if not ranges:
+      return 0, len(self.values)
+
+    # an entity with several values can satisfy each filter with a
+    # different value, so the ranges can only be intersected without them
+    if self.multiple:
+      return min(ranges, key=lambda (start, stop): stop - start)
+
+    start = max([i[0] for i in ranges])
+    stop = min([i[1] for i in ranges])
+
+    return start, max(start, stop)
+
+  def _getFilterRange(self, op, values):
+    """Returns the positions in values that can satisfy a single filter.
+    """
+
+    start = 0
+    stop = len(self.values)
+
+    # filters with more than one value are only checked on the entities
+    if len(values) != 1:
+      return start, stop
+
+    value = values[0]
+
+    if op is operator.gt:
+      start = bisect.bisect_right(self.values, value)
+    elif op in (operator.ge, operator.eq):
+      start = bisect.bisect_left(self.values, value)
+
+    if op is operator.lt:
+      stop = bisect.bisect_left(self.values, value)
+    elif op in (operator.le, operator.eq):
+      stop = bisect.bisect_right(self.values, value)
+
+    return start, max(start, stop)
+
+  def countRange(self, start, stop, bound):
+    """Returns the amount of entities in a range, or bound if that is less.
+    """
+
+    count = 0
+
+    for value in self.values[start:stop]:
+      count += len(self.keys[value])
+
+      if count >= bound:
+        return bound
+
+    return count
+
+  def walk(self, start, stop, descending):
+    """Yields the key orders of the entities in a range in index order.
+
+    Entities with the same value are yielded in key order, entities with
+    more than one value are yielded once for each of them.
+    """
+
+    values = self.values[start:stop]
+
+    if descending:
+      values.reverse()
+
+    for value in values:
+      for key_order in sorted(self.keys[value]):
+        yield key_order
+
+
+class IndexedDatastoreStub(datastore_file_stub.DatastoreFileStub):
+  """Datastore stub that keeps per property indexes of all entities.
+
+  Puts, gets, transactions and the schema are handled by the
+  DatastoreFileStub, this class keeps the indexes up to date and answers
+  queries from them. The features used by Melange are supported: equality
+  and inequality filters (IN is split up by the datastore API already),
+  __key__ filters and orders, ancestors, offset, limit and count.
+  """
+
+  def __init__(self, app_id, datastore_file=None,
+               service_name='datastore_v3', trusted=False):
+    """Initializes the stub and loads the entities in datastore_file.
+
+    Args:
+      app_id: string
+      datastore_file: string, the sqlite database the entities are stored
+          in, use None not to store them
+      service_name: service name expected for all calls
+      trusted: bool, if True this stub allows an app to access the data of
+          another app
+    """
+
+    self._indexes = {}
+    self._indexed = {}
+    self._dirty = {}
+    self._connection = None
+
+    super(IndexedDatastoreStub, self).__init__(
+        app_id, None, None, service_name=service_name, trusted=trusted)
+
+    if datastore_file and datastore_file != '/dev/null':
+      self._connection = sqlite3.connect(datastore_file,
+                                         check_same_thread=False)
+      self._connection.execute('CREATE TABLE IF NOT EXISTS entities '
+                               '(key BLOB PRIMARY KEY, entity BLOB NOT NULL)')
+      self._load()
+
+  def _getEntities(self):
+    """Returns the entities of the DatastoreFileStub by (app, kind).
+    """
+
+    return self._DatastoreFileStub__entities
+
+  def _load(self):
+    """Loads all entities stored in the sqlite database.
+    """
+
+    next_id = self._DatastoreFileStub__next_id
+
+    for (encoded,) in self._connection.execute('SELECT entity FROM entities'):
+      entity = entity_pb.EntityProto(str(encoded))
+      self._StoreEntity(entity)
+
+      last_path = entity.key().path().element_list()[-1]
+      if last_path.has_id() and last_path.id() >= next_id:
+        next_id = last_path.id() + 1
+
+    self._DatastoreFileStub__next_id = next_id
+    self._dirty = {}
+
+  def _flush(self):
+    """Stores the entities that were changed since the last flush.
+    """
+
+    if self._connection:
+      entities = self._getEntities()
+
+      for reference, app_kind in self._dirty.iteritems():
+        key = sqlite3.Binary(reference.Encode())
+        stored = entities.get(app_kind, {}).get(reference)
+
+        if stored:
+          self._connection.execute(
+              'INSERT OR REPLACE INTO entities VALUES (?, ?)',
+              (key, sqlite3.Binary(stored.encoded_protobuf)))
+        else:
+          self._connection.execute('DELETE FROM entities WHERE key = ?',
+                                   (key,))
+
+      self._connection.commit()
+
+    self._dirty = {}
+
+  def _normalize(self, value):
+    """Returns a (type tag, value) tuple that sorts like the datastore does.
+    """
+
+    tag = self._PROPERTY_TYPE_TAGS.get(value.__class__)
+
+    if isinstance(value, datetime.datetime):
+      value = datastore_types.DatetimeToTimestamp(value)
+    elif isinstance(value, datastore_types.Key):
+      value = getKeyOrder(value._ToPb())
+
+    return tag, value
+
+  def _getIndexedValues(self, entity, key_order):
+    """Returns a dictionary with the normalized indexed values of entity.
+    """
+
+    result = {_KEY_PROPERTY: [(_KEY_TAG, key_order)]}
+    unindexed = entity.unindexed_properties()
+
+    for prop, values in entity.iteritems():
+      if prop in unindexed:
+        continue
+
+      if not isinstance(values, list):
+        values = [values]
+
+      normalized = set([self._normalize(i) for i in values
+          if not isinstance(i, datastore_types._RAW_PROPERTY_TYPES)])
+
+      if normalized:
+        result[prop] = list(normalized)
+
+    return result
+
+  def _index(self, app_kind, reference, entity):
+    """Adds entity, which is stored under reference, to the indexes.
+    """
+
+    key_order = getKeyOrder(reference)
+    self._unindex(app_kind, key_order)
+
+    values = self._getIndexedValues(entity, key_order)
+    indexes = self._indexes.setdefault(app_kind, {})
+
+    for prop, normalized in values.iteritems():
+      index = indexes.get(prop)
+
+      if not index:
+        index = indexes[prop] = PropertyIndex()
+
+      for value in normalized:
+        index.add(value, key_order)
+
+      if len(normalized) > 1:
+        index.multiple += 1
+
+    self._indexed.setdefault(app_kind, {})[key_order] = (reference, values)
+
+  def _unindex(self, app_kind, key_order):
+    """Removes the entity with key_order from the indexes, if present.
+    """
+
+    indexed = self._indexed.get(app_kind, {}).pop(key_order, None)
+
+    if not indexed:
+      return
+
+    indexes = self._indexes[app_kind]
+
+    for prop, normalized in indexed[1].iteritems():
+      index = indexes[prop]
+
+      for value in normalized:
+        index.remove(value, key_order)
+
+      if len(normalized) > 1:
+        index.multiple -= 1
+
+  def _StoreEntity(self, entity):
+    """Stores the entity and adds it to the indexes.
+    """
+
+    super(IndexedDatastoreStub, self)._StoreEntity(entity)
+
+    reference = entity.key()
+    app_kind = self._AppKindForKey(reference)
+    stored = self._getEntities()[app_kind][reference]
+
+    self._index(app_kind, reference, stored.native)
+    self._dirty[reference] = app_kind
+
+  def Clear(self):
+    """Clears the datastore, the indexes and the sqlite database.
+    """
+
+    super(IndexedDatastoreStub, self).Clear()
+
+    self._indexes = {}
+    self._indexed = {}
+    self._dirty = {}
+
+    if self._connection:
+      self._connection.execute('DELETE FROM entities')
+      self._connection.commit()
+
+  def _Dynamic_Put(self, put_request, put_response):
+    super(IndexedDatastoreStub, self)._Dynamic_Put(put_request, put_response)
+
+    if not put_request.has_transaction():
+      self._flush()
+
+  def _Dynamic_Delete(self, delete_request, delete_response):
+    super(IndexedDatastoreStub, self)._Dynamic_Delete(delete_request,
+                                                      delete_response)
+
+    for reference in delete_request.key_list():
+      app_kind = self._AppKindForKey(reference)
+      self._unindex(app_kind, getKeyOrder(reference))
+      self._dirty[reference] = app_kind
+
+    if not delete_request.has_transaction():
+      self._flush()
+
+  def _Dynamic_Commit(self, transaction, transaction_response):
+    super(IndexedDatastoreStub, self)._Dynamic_Commit(transaction,
+                                                      transaction_response)
+    self._flush()
+
+  def _Dynamic_Rollback(self, transaction, transaction_response):
+    super(IndexedDatastoreStub, self)._Dynamic_Rollback(transaction,
+                                                        transaction_response)
+
+    # the entities were restored from a snapshot, bring the indexes of the
+    # entities that were changed in the transaction back in line with it
+    entities = self._getEntities()
+
+    for reference, app_kind in self._dirty.iteritems():
+      stored = entities.get(app_kind, {}).get(reference)
+
+      if stored:
+        self._index(app_kind, reference, stored.native)
+      else:
+        self._unindex(app_kind, getKeyOrder(reference))
+
+    self._flush()
+
+  def _validateQuery(self, query):
+    """Raises an ApplicationError for queries the datastore rejects.
+    """
+
+    tx_lock = self._DatastoreFileStub__tx_lock
+
+    if not tx_lock.acquire(False):
+      raise apiproxy_errors.ApplicationError(
+          datastore_pb.Error.BAD_REQUEST, 'Can\'t query inside a transaction.')
+    tx_lock.release()
+
+    self._DatastoreFileStub__ValidateAppId(query.app())
+
+    if query.has_offset() and (
+        query.offset() > datastore_file_stub._MAX_QUERY_OFFSET):
+      raise apiproxy_errors.ApplicationError(
+          datastore_pb.Error.BAD_REQUEST, 'Too big query offset.')
+
+    num_components = len(query.filter_list()) + len(query.order_list())
+    if query.has_ancestor():
+      num_components += 1
+    if num_components > datastore_file_stub._MAX_QUERY_COMPONENTS:
+      raise apiproxy_errors.ApplicationError(
+          datastore_pb.Error.BAD_REQUEST,
+          ('query is too large. may not have more than %s filters'
+           ' + sort orders ancestor total' %
+           datastore_file_stub._MAX_QUERY_COMPONENTS))
+
+  def _recordQuery(self, query):
+    """Adds query to the query history, like the DatastoreFileStub does.
+    """
+
+    clone = datastore_pb.Query()
+    clone.CopyFrom(query)
+    clone.clear_hint()
+
+    history = self._DatastoreFileStub__query_history
+    history[clone] = history.get(clone, 0) + 1
+
+  def _getFilters(self, query):
+    """Returns the filters of query as {prop: [(operator, values)]}.
+    """
+
+    filters = {}
+
+    for filt in query.filter_list():
+      assert filt.op() != datastore_pb.Query_Filter.IN
+
+      prop = filt.property(0).name().decode('utf-8')
+      values = [self._normalize(datastore_types.FromPropertyPb(i))
+                for i in filt.property_list()]
+      filters.setdefault(prop, []).append((_OPERATORS[filt.op()], values))
+
+    return filters
+
+  def _matches(self, values, filters, ancestor, key_order):
+    """Returns whether an indexed entity satisfies the query.
+
+    Args:
+      values: the normalized values of the entity by property
+      filters: the filters as returned by _getFilters
+      ancestor: the key order of the ancestor, or None
+      key_order: the key order of the entity
+    """
+
+    if ancestor and key_order[:len(ancestor)] != ancestor:
+      return False
+
+    for prop, prop_filters in filters.iteritems():
+      entity_values = values.get(prop)
+
+      if not entity_values:
+        return False
+
+      for op, filter_values in prop_filters:
+        for value in entity_values:
+          if [i for i in filter_values if op(value, i)]:
+            break
+        else:
+          return False
+
+    return True
+
+  def _walkQuery(self, indexes, indexed, filters, ancestor, order, limit):
+    """Returns the first limit matches of the query by walking one index.
+
+    Args:
+      indexes: the property indexes of the queried kind
+      indexed: the indexed entities of the queried kind
+      filters: the filters as returned by _getFilters
+      ancestor: the key order of the ancestor, or None
+      order: (property, descending) tuple of the sort order
+      limit: the maximum amount of matches to return
+    """
+
+    prop, descending = order
+    index = indexes.get(prop)
+
+    if not index:
+      return []
+
+    start, stop = index.getRange(filters.get(prop, []))
+    seen = set()
+    result = []
+
+    for key_order in index.walk(start, stop, descending):
+      if key_order in seen:
+        continue
+
+      seen.add(key_order)
+
+      if self._matches(indexed[key_order][1], filters, ancestor, key_order):
+        result.append(key_order)
+
+        if len(result) >= limit:
+          break
+
+    return result
+
+  def _scanQuery(self, indexes, indexed, filters, ancestor, orders):
+    """Returns all matches of the query, using the most selective index.
+
+    Args:
+      indexes: the property indexes of the queried kind
+      indexed: the indexed entities of the queried kind
+      filters: the filters as returned by _getFilters
+      ancestor: the key order of the ancestor, or None
+      orders: list of (property, descending) tuples
+    """
+
+    best = None
+    best_count = len(indexed) + 1
+
+    for prop, prop_filters in filters.iteritems():
+      index = indexes.get(prop)
+
+      if not index:
+        return []
+
+      start, stop = index.getRange(prop_filters)
+      count = index.countRange(start, stop, best_count)
+
+      if count < best_count:
+        best = index, start, stop
+        best_count = count
+
+    if best:
+      index, start, stop = best
+      candidates = set(index.walk(start, stop, False))
+    else:
+      candidates = indexed.keys()
+
+    result = [i for i in candidates
+              if self._matches(indexed[i][1], filters, ancestor, i)]
+
+    # the file stub leaves out entities that do not have the sort properties
+    for prop, _ in orders:
+      result = [i for i in result if prop in indexed[i][1]]
+
+    result.sort()
+
+    # sort on the last order first, as each sort is stable
+    for prop, descending in reversed(orders):
+      pick = descending and max or min
+      result.sort(key=lambda i: pick(indexed[i][1][prop]),
+                  reverse=descending)
+
+    return result
+
+  def _Dynamic_RunQuery(self, query, query_result):
+    self._validateQuery(query)
+    self._recordQuery(query)
+
+    app_kind = (query.app(), query.kind())
+    indexes = self._indexes.get(app_kind, {})
+    indexed = self._indexed.get(app_kind, {})
+
+    filters = self._getFilters(query)
+    orders = [(i.property().decode('utf-8'),
+               i.direction() == datastore_pb.Query_Order.DESCENDING)
+              for i in query.order_list()]
+
+    if orders == [(_KEY_PROPERTY, False)]:
+      orders = []
+
+    ancestor = None
+    if query.has_ancestor():
+      ancestor = getKeyOrder(query.ancestor())
+
+    offset = 0
+    if query.has_offset():
+      offset = query.offset()
+
+    limit = datastore_file_stub._MAXIMUM_RESULTS
+    if query.has_limit():
+      limit = min(limit, query.limit())
+
+    order = orders and orders[0] or (_KEY_PROPERTY, False)
+
+    # queries that have at most one sort order, and no filters on other
+    # properties than that one, are answered straight from its index
+    if len(orders) <= 1 and filters.keys() in ([], [order[0]]):
+      result = self._walkQuery(indexes, indexed, filters, ancestor, order,
+                               offset + limit)
+    else:
+      result = self._scanQuery(indexes, indexed, filters, ancestor, orders)
+
+    entities = self._getEntities().get(app_kind, {})
+    results = [entities[indexed[i][0]].native
+               for i in result[offset:offset + limit]]
+
+    cursor = datastore_file_stub._Cursor(results, query.keys_only())
+    self._DatastoreFileStub__queries[cursor.cursor] = cursor
+    cursor.PopulateQueryResult(query_result, 0)
+
+
+def register(app_id, datastore_file=None):
+  """Registers an IndexedDatastoreStub with the current API proxy.
+
+  Returns:
+    The registered stub.
+  """
+
+  stub = IndexedDatastoreStub(app_id, datastore_file)
+  apiproxy_stub_map.apiproxy.RegisterStub('datastore_v3', stub)
+
+  return stub
@@ -0,0 +1,73 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import unittest
+
+from soc.cache import forms
+
+
+class FormsCacheTest(unittest.TestCase):
+  """Tests that the forms cache only builds a form once per key.
+  """
+
+  def setUp(self):
+    self.built = 0
+    forms.flush()
+
+  def tearDown(self):
+    forms.flush()
+
+  def build(self, name):
+    self.built = self.built + 1
+    return name
+
+  def testBuildsOnce(self):
+    """Test that a form is only built once for the same key.
+    """
+
+    key = forms.key('create', 'model', ['link_id'], {'name': 'value'})
+    self.assertEqual('form', forms.getOrBuild(key, self.build, 'form'))
+    self.assertEqual('form', forms.getOrBuild(key, self.build, 'other'))
+    self.assertEqual(1, self.built)
+
+  def testDifferentKeys(self):
+    """Test that different field overrides result in different forms.
+    """
+
+    first = forms.key('create', 'model', {'name': 'first'})
+    second = forms.key('create', 'model', {'name': 'second'})
+    self.assertNotEqual(first, second)
+
+    forms.getOrBuild(first, self.build, 'first')
+    self.assertEqual('second', forms.getOrBuild(second, self.build, 'second'))
+    self.assertEqual(2, self.built)
+
+  def testUnhashableIsNotCached(self):
+    """Test that forms are not cached if the key can not be constructed.
+    """
+
+    key = forms.key('create', set(['unhashable']))
+    self.assertEqual(None, key)
+
+    forms.getOrBuild(key, self.build, 'form')
+    forms.getOrBuild(key, self.build, 'form')
+    self.assertEqual(2, self.built)
@@ -0,0 +1,108 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+__authors__ = [
+  '"Lennard de Rijk" <ljvderijk@gmail.com>',
+  ]
+
+
+import unittest
+
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import datastore_file_stub
+from google.appengine.ext import db
+from google.appengine.tools import dev_appserver_index
+
+from django.conf import settings
+from django.utils import simplejson
+
+from soc.cron import grade_activator
+from soc.logic.models.survey import GRADE_NO_RECORDS
+from soc.logic.models.survey import grading_logic
+from soc.models.grading_project_survey import GradingProjectSurvey
+from soc.models.job import Job
+from soc.models.program import Program
+from soc.models.student_project import StudentProject
+
+
+class GradeActivatorTest(unittest.TestCase):
+  """Tests for the job that activates the grades of a survey.
+  """
+
+  def setUp(self):
+    """Runs the test on a datastore that requires the indexes in index.yaml.
+    """
+
+    self.stubs = {}
+
+    stub = datastore_file_stub.DatastoreFileStub(
+        'test-app-run', None, None, require_indexes=True)
+
+    for service in ['datastore', 'datastore_v3']:
+      self.stubs[service] = apiproxy_stub_map.apiproxy.GetStub(service)
+      self._registerStub(service, stub)
+
+    dev_appserver_index.SetupIndexes('test-app-run', settings.ROOT_PATH)
+
+  def tearDown(self):
+    """Restores the datastore the other tests run on.
+    """
+
+    for service, stub in self.stubs.iteritems():
+      self._registerStub(service, stub)
+
+  def _registerStub(self, service, stub):
+    """Registers stub for service, replacing the registered one.
+    """
+
+    # pylint: disable-msg=W0212
+    apiproxy_stub_map.apiproxy._APIProxyStubMap__stub_map[service] = stub
+
+  def testMultipleBatches(self):
+    """Tests that all projects are walked when there are several batches.
+    """
+
+    user = db.Key.from_path('User', 'user')
+
+    program = Program(key_name='sponsor/program', link_id='program',
+                      scope_path='sponsor', name='Program',
+                      short_name='Program', description='Program',
+                      timeline=db.Key.from_path('Timeline', 'sponsor/program'),
+                      slots=1, apps_tasks_limit=1, workflow='gsoc')
+    program.put()
+
+    survey = GradingProjectSurvey(key_name='program/sponsor/program/survey',
+                                  link_id='survey', scope_path='sponsor/program',
+                                  scope=program, prefix='program',
+                                  title='Survey', author=user,
+                                  modified_by=user)
+    survey.put()
+
+    num_projects = grade_activator.DEF_PROJECT_STEP_SIZE * 2 + 1
+
+    for i in range(num_projects):
+      StudentProject(key_name='sponsor/program/org/%d' % i,
+                     link_id='project%d' % i, title='Project',
+                     abstract='Project', program=program,
+                     mentor=db.Key.from_path('Mentor', 'mentor'),
+                     student=db.Key.from_path('Student', 'student')).put()
+
+    job = grading_logic.activateGrades(survey)
+    grade_activator.activateGrades(job)
+
+    counts = simplejson.loads(Job.get(job.key()).text_data)
+    self.assertEqual({GRADE_NO_RECORDS: num_projects}, counts)
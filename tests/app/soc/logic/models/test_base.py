@@ -147,3 +147,65 @@ class UserTest(unittest.TestCase):
     expected = [4, 3, 2, 1]
     actual = [i.value for i in self.logic.getForFields(fields, order=order)]
     self.assertEqual(expected, actual)
+
+  def testGetKeysForFields(self):
+    """Test that keys are returned instead of entities.
+    """
+
+    fields = {'value <': 3}
+    order = ['value']
+
+    expected = [i.key() for i in self.entities[:3]]
+    actual = self.logic.getKeysForFields(fields, order=order)
+    self.assertEqual(expected, actual)
+
+  def testGetKeysForFieldsMultiFilter(self):
+    """Test that keys are returned for an 'IN' filter as well.
+    """
+
+    fields = {'value': [1, 2]}
+    order = ['value']
+
+    expected = [i.key() for i in self.entities[1:3]]
+    actual = self.logic.getKeysForFields(fields, order=order)
+    self.assertEqual(expected, actual)
+
+  def testEntityIteratorKeysOnly(self):
+    """Test that the iterator yields all keys in batches.
+    """
+
+    query_gen = lambda keys_only: self.logic.getQueryForFields(
+        keys_only=keys_only)
+
+    expected = [i.key() for i in self.entities]
+    actual = list(self.logic.entityIterator(query_gen, batch_size=2,
+                                            keys_only=True))
+    self.assertEqual(expected, actual)
+
+  def testGetForFieldsMultiFilterPaged(self):
+    """Test that an 'IN' filter can be ordered and paged.
+    """
+
+    fields = {'value': [0, 1, 3, 4, 3]}
+    order = ['-value']
+
+    expected = [3, 1]
+    actual = [i.value for i in self.logic.getForFields(
+        fields, limit=2, offset=1, order=order)]
+    self.assertEqual(expected, actual)
+
+  def testGetForFieldsMultiFilterSameAsQuery(self):
+    """Test that merging the 'IN' queries gives the datastore's results.
+    """
+
+    for i in range(5):
+      TestModel(key_name='other_%d' % i, value=i % 2).put()
+
+    fields = {'value': [1, 0, 2]}
+    order = ['value']
+
+    query = self.logic.getQueryForFields(fields, order=order)
+    expected = [i.key() for i in query.fetch(6, 2)]
+    actual = self.logic.getKeysForFields(fields, limit=6, offset=2,
+                                         order=order)
+    self.assertEqual(expected, actual)
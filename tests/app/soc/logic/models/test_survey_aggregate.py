@@ -0,0 +1,200 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+__authors__ = [
+  '"Daniel Diniz" <ajaksu@gmail.com>',
+  ]
+
+
+import unittest
+
+from django.utils import simplejson
+
+from google.appengine.api import memcache
+from google.appengine.api import users
+
+from soc.cron import survey_aggregator
+from soc.logic.models.survey_aggregate import logic as aggregate_logic
+from soc.logic.models.survey_record import logic as record_logic
+from soc.models.project_survey import ProjectSurvey
+from soc.models.survey import Survey
+from soc.models.survey import SurveyContent
+from soc.models.survey_aggregate import SurveyAggregate
+from soc.models.survey_record import SurveyRecord
+from soc.models.user import User
+
+
+class SurveyAggregateTest(unittest.TestCase):
+  """Tests for the aggregated survey statistics.
+  """
+
+  def setUp(self):
+    """Creates a survey with a choice and a text question.
+    """
+
+    user = User(key_name='author', link_id='author', name='Author',
+                account=users.User(email='author@example.com'))
+    user.put()
+    self.user = user
+
+    content = SurveyContent()
+    content.color = ['red', 'green', 'blue']
+    content.age = ''
+    content.setSchema({
+        'color': {'type': 'pick_multi', 'index': 0, 'question': 'Color?',
+                  'render': 'multi_checkbox'},
+        'age': {'type': 'short_answer', 'index': 1},
+        })
+    content.put()
+
+    self.survey = Survey(key_name='program/test/survey', link_id='survey',
+                         scope_path='test', title='Survey', author=user,
+                         modified_by=user, survey_content=content)
+    self.survey.put()
+
+  def tearDown(self):
+    memcache.flush_all()
+
+  def testCreateAndUpdate(self):
+    """Test that created and updated records are aggregated.
+    """
+
+    aggregate_logic.updateForRecord(self.survey, {},
+        {'color': 'red,blue', 'age': '20'}, True)
+    aggregate_logic.updateForRecord(self.survey, {},
+        {'color': 'blue', 'age': '30'}, True)
+
+    # the first record changes its answers
+    aggregate_logic.updateForRecord(self.survey,
+        {'color': 'red,blue', 'age': '20'}, {'color': 'green'}, False)
+
+    total, questions = aggregate_logic.getStatistics(self.survey)
+    self.assertEqual(2, total)
+
+    color, age = questions
+    self.assertEqual('Color?', color['label'])
+    self.assertEqual(2, color['answers'])
+    self.assertEqual([('red', 0), ('green', 1), ('blue', 1)],
+                     color['choices'])
+
+    self.assertEqual('age', age['label'])
+    self.assertEqual(1, age['answers'])
+    self.assertEqual(30, age['average'])
+
+  def testSameKeyName(self):
+    """Test that surveys of different kinds with the same key name are
+    counted separately.
+    """
+
+    other = ProjectSurvey(key_name=self.survey.key().name(),
+                          link_id='survey', scope_path='test',
+                          title='Survey', author=self.user,
+                          modified_by=self.user,
+                          survey_content=self.survey.survey_content)
+    other.put()
+
+    aggregate_logic.updateForRecord(self.survey, {}, {'color': 'red'}, True)
+
+    self.assertEqual(1, aggregate_logic.getStatistics(self.survey)[0])
+    self.assertEqual(0, aggregate_logic.getStatistics(other)[0])
+
+  def testNoResults(self):
+    """Test the statistics for a survey nobody has taken.
+    """
+
+    total, questions = aggregate_logic.getStatistics(self.survey)
+    self.assertEqual(0, total)
+    self.assertEqual(['color', 'age'], [i['name'] for i in questions])
+    self.assertEqual([0, 0], [i['answers'] for i in questions])
+
+  def testRebuild(self):
+    """Test that records stored without updating the statistics are counted.
+    """
+
+    # one record is counted, the others were stored directly
+    aggregate_logic.updateForRecord(self.survey, {},
+        {'color': 'red', 'age': '20'}, True)
+
+    for color, age in [('red', '20'), ('red,blue', '40')]:
+      SurveyRecord(user=self.user, survey=self.survey, color=color,
+                   age=age).put()
+
+    total, _ = aggregate_logic.getStatisticsOrRebuild(self.survey,
+                                                      record_logic)
+    self.assertEqual(1, total)
+
+    job = aggregate_logic.startRebuild(self.survey, SurveyRecord.kind())
+    survey_aggregator.rebuildSurveyAggregate(job)
+
+    total, questions = aggregate_logic.getStatistics(self.survey)
+    self.assertEqual(2, total)
+
+    color, age = questions
+    self.assertEqual([('red', 2), ('blue', 1)], color['choices'])
+    self.assertEqual(30, age['average'])
+
+    # the statistics are stored in the first shard only
+    self.assertEqual(1, SurveyAggregate.all().count())
+
+  def testRebuildKeepsChanges(self):
+    """Test that changes made while a rebuild runs are kept.
+    """
+
+    for color in ['red', 'blue']:
+      record = SurveyRecord(user=self.user, survey=self.survey, color=color)
+      record.put()
+      aggregate_logic.updateForRecord(self.survey, {}, {'color': color},
+                                      True)
+
+    job = aggregate_logic.startRebuild(self.survey, SurveyRecord.kind())
+    data = simplejson.loads(job.text_data)
+    data['snapshot'] = aggregate_logic.getSnapshot(self.survey)
+    job.text_data = simplejson.dumps(data)
+    job.put()
+
+    # counted after the snapshot, the rebuild does not walk a record for it
+    for i in range(5):
+      aggregate_logic.updateForRecord(self.survey, {}, {'color': 'green'},
+                                      True)
+
+    survey_aggregator.rebuildSurveyAggregate(job)
+
+    total, questions = aggregate_logic.getStatistics(self.survey)
+    self.assertEqual(7, total)
+    self.assertEqual([('red', 1), ('green', 5), ('blue', 1)],
+                     questions[0]['choices'])
+
+  def testRebuildWhenEmpty(self):
+    """Test that a rebuild is started for records that were never counted.
+    """
+
+    SurveyRecord(user=self.user, survey=self.survey, color='green').put()
+
+    total, _ = aggregate_logic.getStatisticsOrRebuild(self.survey,
+                                                      record_logic)
+    self.assertEqual(None, total)
+
+    # the rebuild that was started is reused
+    job = aggregate_logic.startRebuild(self.survey, SurveyRecord.kind())
+    self.assertEqual(job.key(), aggregate_logic.startRebuild(
+        self.survey, SurveyRecord.kind()).key())
+
+    survey_aggregator.rebuildSurveyAggregate(job)
+
+    total, _ = aggregate_logic.getStatisticsOrRebuild(self.survey,
+                                                      record_logic)
+    self.assertEqual(1, total)
@@ -27,6 +27,7 @@ from google.appengine.api import users
 from soc.models import user
 from soc.logic import accounts
 from soc.logic.models.user import logic as user_logic
+from soc.profiling import queries
 
 
 class UserTest(unittest.TestCase):
@@ -126,3 +127,28 @@ class UserTest(unittest.TestCase):
 
     denormalized = accounts.denormalizeAccount(entity.account)
     self.failUnlessEqual(account.email().lower(), denormalized.email())
+
+  def testGetForFieldsByKeyName(self):
+    """Test that lookups on the key fields do not run a query.
+    """
+
+    queries.clearStats()
+
+    entity = user_logic.getForFields({'link_id': 'current_user'}, unique=True)
+    self.failUnlessEqual('current_user', entity.link_id)
+
+    entities = user_logic.getForFields({'link_id': 'current_user',
+                                        'status': ['valid']})
+    self.failUnlessEqual([entity.key()], [i.key() for i in entities])
+
+    self.failUnlessEqual([], queries.getStats())
+
+  def testGetForFieldsByKeyNameFiltered(self):
+    """Test that the other fields of a key field lookup are checked.
+    """
+
+    fields = {'link_id': 'current_user', 'status': 'invalid'}
+    self.failUnlessEqual(None, user_logic.getForFields(fields, unique=True))
+
+    fields = {'link_id': 'current_user'}
+    self.failUnlessEqual([], user_logic.getForFields(fields, offset=1))
@@ -0,0 +1,132 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import unittest
+
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import datastore
+
+from soc.logic import parallel
+from soc.profiling import rpc
+
+from tests.app.soc.logic.models.test_model import TestModelLogic
+from tests.app.soc.models.test_model import TestModel
+
+
+class ParallelTest(unittest.TestCase):
+  """Tests for running getForFields calls concurrently.
+  """
+
+  def setUp(self):
+    """Stores a few TestModel entities.
+    """
+
+    for i in range(10):
+      TestModel(key_name='test_%d' % i, value=i).put()
+
+    self.logic = TestModelLogic()
+
+  def testSameAsGetForFields(self):
+    """Tests that the results are the same as those of getForFields.
+    """
+
+    calls = [
+        {'filter': {'value <': 5}, 'order': ['-value']},
+        {'filter': {'value': 3}, 'unique': True},
+        {'filter': {'value': 42}, 'unique': True},
+        {'filter': {'value': [2, 7]}},
+        {'limit': 3, 'offset': 2, 'order': ['value']},
+        ]
+
+    expected = [self.logic.getForFields(**i) for i in calls]
+    actual = parallel.getForFields([(self.logic, i) for i in calls])
+
+    def values(result):
+      if isinstance(result, list):
+        return [i.value for i in result]
+      return result and result.value
+
+    self.assertEqual([values(i) for i in expected],
+                     [values(i) for i in actual])
+
+  def _checkFallback(self):
+    """Checks that the calls are fetched one by one with getForFields.
+    """
+
+    calls = [
+        {'filter': {'value <': 5}, 'order': ['-value']},
+        {'filter': {'value': 3}, 'unique': True},
+        ]
+
+    rpc.install()
+    stats = rpc.start('/test')
+
+    try:
+      actual = parallel.getForFields([(self.logic, i) for i in calls])
+    finally:
+      rpc.stop()
+
+    self.assertEqual([4, 3, 2, 1, 0], [i.value for i in actual[0]])
+    self.assertEqual(3, actual[1].value)
+    self.assertEqual(2, stats.calls[('datastore_v3', 'RunQuery')][0])
+
+  def testMissingInternals(self):
+    """Tests that the calls are fetched one by one without the SDK internals.
+    """
+
+    original = parallel.DEF_SDK_INTERNALS
+    parallel.DEF_SDK_INTERNALS = original + [(datastore, '_MissingInternal')]
+
+    try:
+      self.assertFalse(parallel.hasSDKInternals())
+      self._checkFallback()
+    finally:
+      parallel.DEF_SDK_INTERNALS = original
+
+  def testChangedInternals(self):
+    """Tests that the calls are fetched one by one if the SDK internals
+    do not behave as expected.
+    """
+
+    original = apiproxy_stub_map.CreateRPC
+    apiproxy_stub_map.CreateRPC = lambda: None
+
+    try:
+      self._checkFallback()
+    finally:
+      apiproxy_stub_map.CreateRPC = original
+
+  def testAccounted(self):
+    """Tests that the RPCs are seen by the RPC accounting hooks.
+    """
+
+    rpc.install()
+    stats = rpc.start('/test')
+
+    try:
+      parallel.getForFields([(self.logic, {'filter': {'value': 1}}),
+                             (self.logic, {'filter': {'value': 2}})])
+    finally:
+      rpc.stop()
+
+    self.assertEqual(2, stats.calls[('datastore_v3', 'RunQuery')][0])
+    self.assertEqual(2, stats.calls[('datastore_v3', 'Next')][0])
@@ -0,0 +1,228 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import logging
+import os
+import tempfile
+import unittest
+
+from google.appengine.ext import db
+
+from soc.logic import planner
+from soc.logic.models import base
+from soc.profiling import queries
+
+
+class PlannerTestEntity(db.Model):
+  """Model used to test the query planner.
+  """
+
+  scope = db.StringProperty()
+  status = db.StringProperty()
+  score = db.IntegerProperty()
+  tags = db.StringListProperty()
+
+
+DEF_INDEX_YAML = """indexes:
+
+- kind: PlannerTestEntity
+  properties:
+  - name: status
+  - name: scope
+  - name: score
+    direction: desc
+"""
+
+
+class PlannerTest(unittest.TestCase):
+  """Tests for checking queries against index.yaml.
+  """
+
+  def setUp(self):
+    """Stores a few entities and forgets the known indexes.
+    """
+
+    for i in range(8):
+      PlannerTestEntity(key_name='entity_%d' % i, scope='a' * (i % 2 + 1),
+                        status=['new', 'pending'][i % 2], score=i % 4,
+                        tags=['t%d' % i, 't%d' % (i + 1)]).put()
+
+    self.logic = base.Logic(PlannerTestEntity)
+    planner.setIndexes([])
+
+  def tearDown(self):
+    """Loads index.yaml again on the next check.
+    """
+
+    planner.setIndexes(None)
+
+  def _loadIndexes(self):
+    """Loads DEF_INDEX_YAML as the known indexes.
+    """
+
+    handle, path = tempfile.mkstemp()
+    os.write(handle, DEF_INDEX_YAML)
+    os.close(handle)
+
+    try:
+      planner.setIndexes(planner.loadIndexes(path))
+    finally:
+      os.remove(path)
+
+  def testCovered(self):
+    """Tests that queries are checked against the loaded indexes.
+    """
+
+    filter = {'scope': 'a', 'status': 'new'}
+    order = ['-score']
+
+    self.assertTrue(planner.isCovered(self.logic.getQueryForFields(filter)))
+
+    query = self.logic.getQueryForFields(filter, order=order)
+    self.assertFalse(planner.isCovered(query))
+
+    uncovered = planner.getUncovered()
+    self.assertEqual(1, len(uncovered))
+    self.assertTrue('- name: score' in uncovered[0]['definition'])
+
+    self._loadIndexes()
+    self.assertTrue(planner.isCovered(query))
+    self.assertEqual([], planner.getUncovered())
+
+  def testMissingIndexFile(self):
+    """Tests that a missing index file is reported once and not retried.
+    """
+
+    errors = []
+    original_error = logging.error
+    original_file = planner.DEF_INDEX_FILE
+
+    logging.error = lambda *args: errors.append(args)
+    planner.DEF_INDEX_FILE = 'missing_index.yaml'
+    planner.setIndexes(None)
+
+    try:
+      query = self.logic.getQueryForFields({'scope': 'a'}, order=['-score'])
+      other = self.logic.getQueryForFields({'status': 'a'}, order=['score'])
+
+      self.assertTrue(planner.isCovered(query))
+      self.assertTrue(planner.isCovered(query))
+      self.assertTrue(planner.isCovered(other))
+    finally:
+      logging.error = original_error
+      planner.DEF_INDEX_FILE = original_file
+
+    self.assertEqual(1, len(errors))
+    self.assertEqual([], planner.getUncovered())
+
+  def testFallback(self):
+    """Tests that uncovered bounded queries are filtered in memory.
+    """
+
+    filter = {'scope': 'a', 'score >': 0, 'tags': ['t2', 't6', 't5']}
+    order = ['-score']
+
+    queries.clearStats()
+
+    expected = ['entity_2', 'entity_6']
+    actual = [i.key().name() for i in self.logic.getForFields(filter,
+                                                              order=order)]
+    self.assertEqual(expected, actual)
+
+    # each value of the IN filter is queried with only the equality filters
+    shapes = [i['shape'] for i in queries.getStats()]
+    self.assertEqual(['PlannerTestEntity(scope =, tags =)'], shapes)
+
+    # the datastore stub does not require indexes, it gives the same result
+    query = self.logic.getQueryForFields(filter, order=order)
+    self.assertEqual(expected, [i.key().name() for i in query])
+
+  def testFallbackLimit(self):
+    """Tests that nothing is returned if the fallback could be incomplete.
+    """
+
+    filter = {'scope': 'a', 'score >': 0}
+    order = ['-score']
+
+    original_limit = planner.DEF_FALLBACK_LIMIT
+    errors = []
+    original_error = logging.error
+    logging.error = lambda *args: errors.append(args)
+
+    try:
+      planner.DEF_FALLBACK_LIMIT = 5
+      actual = self.logic.getForFields(filter, order=order)
+      self.assertEqual(['entity_2', 'entity_6'],
+                       [i.key().name() for i in actual])
+
+      # four entities have scope 'a', a limit of four could miss some
+
+      planner.DEF_FALLBACK_LIMIT = 4
+      self.assertEqual([], self.logic.getForFields(filter, order=order))
+    finally:
+      planner.DEF_FALLBACK_LIMIT = original_limit
+      logging.error = original_error
+
+    self.assertEqual(1, len(errors))
+
+  def testBoundingFields(self):
+    """Tests that the scope does not bound kinds scoped to a program.
+    """
+
+    from soc.logic.models.mentor import logic as mentor_logic
+    from soc.logic.models.student import logic as student_logic
+
+    self.assertEqual(['scope', 'org'], mentor_logic.getBoundingFields())
+    self.assertEqual(['org'], student_logic.getBoundingFields())
+
+    fallback = planner.getFallbackFilter(
+        PlannerTestEntity, {'scope': 'a', 'score >': 1}, ['score'], ['org'])
+    self.assertEqual(None, fallback)
+
+  def testFallbackFilter(self):
+    """Tests that only queries with a bounding equality filter fall back.
+    """
+
+    model = PlannerTestEntity
+
+    self.assertEqual(None, planner.getFallbackFilter(
+        model, {'status': 'new', 'score >': 1}, ['score']))
+
+    fallback = planner.getFallbackFilter(
+        model, {'scope': 'a', 'status': ['new'], 'score >': 1}, ['score'])
+    self.assertEqual({'scope': 'a', 'status': 'new'}, fallback)
+
+  def testFilterEntities(self):
+    """Tests that list properties are filtered and sorted like the datastore.
+    """
+
+    entities = PlannerTestEntity.all().fetch(10)
+
+    filter = {'tags >=': 't6'}
+
+    expected = ['entity_7', 'entity_6', 'entity_5']
+    actual = [i.key().name() for i in planner.filterEntities(
+        PlannerTestEntity, entities, filter, ['-tags'])]
+    self.assertEqual(expected, actual)
+
+    query = PlannerTestEntity.all().filter('tags >=', 't6').order('-tags')
+    self.assertEqual(expected, [i.key().name() for i in query])
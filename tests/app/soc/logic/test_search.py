@@ -0,0 +1,140 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import unittest
+
+from google.appengine.ext import db
+
+from soc.logic import search
+from soc.models.search_index import SearchDocument
+from soc.models.search_index import SearchPostingList
+
+
+class SearchTestEntity(db.Model):
+  """Model used to test the search index.
+  """
+
+  title = db.StringProperty()
+  content = db.TextProperty()
+
+
+class SearchTest(unittest.TestCase):
+  """Tests for the search index.
+  """
+
+  def setUp(self):
+    """Registers SearchTestEntity as an indexed kind.
+    """
+
+    search.DEF_INDEXED_KINDS['SearchTestEntity'] = ['title', 'content']
+
+  def tearDown(self):
+    """Removes SearchTestEntity from the indexed kinds.
+    """
+
+    del search.DEF_INDEXED_KINDS['SearchTestEntity']
+
+  def _create(self, title, content):
+    """Stores and indexes a SearchTestEntity.
+    """
+
+    entity = SearchTestEntity(title=title, content=content)
+    entity.put()
+    search.indexEntity(entity)
+    self._update()
+    return entity
+
+  def _update(self):
+    """Updates the posting lists for all pending documents.
+    """
+
+    search.updatePending(search.getPendingDocuments(100))
+
+  def testTokenize(self):
+    """Test that markup, case, stop words and duplicates are removed.
+    """
+
+    terms = search.tokenize(u'<b>The</b> Quick fox, the quick FOX a x')
+    self.assertEqual(terms, [u'quick', u'fox'])
+    self.assertEqual(search.tokenize(None), [])
+
+  def testSearch(self):
+    """Test that searching intersects the posting lists of all terms.
+    """
+
+    first = self._create('Quick fox', 'jumps over the dog')
+    second = self._create('Lazy dog', 'sleeps')
+
+    self.assertEqual(search.searchKeys('SearchTestEntity', 'dog'),
+                     sorted([first.key(), second.key()]))
+    self.assertEqual(search.searchKeys('SearchTestEntity', 'fox DOG'),
+                     [first.key()])
+    self.assertEqual(search.searchKeys('SearchTestEntity', 'fox cat'), [])
+
+    first.title = 'Slow cat'
+    first.put()
+    search.indexEntity(first)
+    self._update()
+
+    self.assertEqual(search.searchKeys('SearchTestEntity', 'fox'), [])
+    self.assertEqual(search.searchKeys('SearchTestEntity', 'cat dog'),
+                     [first.key()])
+
+    search.unindexEntity(second)
+    second.delete()
+    self._update()
+
+    self.assertEqual(search.searchKeys('SearchTestEntity', 'dog'),
+                     [first.key()])
+
+  def testPending(self):
+    """Test that the posting lists are only written by updatePending.
+    """
+
+    entity = SearchTestEntity(title='Quick fox', content='jumps')
+    entity.put()
+    search.indexEntity(entity)
+
+    self.assertEqual(SearchPostingList.all().count(), 0)
+    self.assertEqual(search.searchKeys('SearchTestEntity', 'fox'), [])
+
+    documents = search.getPendingDocuments(10)
+    self.assertEqual(len(documents), 1)
+
+    # the entity changes again before the posting lists are updated
+    entity.title = 'Slow fox'
+    entity.put()
+    search.indexEntity(entity)
+
+    search.updatePending(documents)
+
+    document = SearchDocument.get_by_key_name(str(entity.key()))
+    self.assertTrue(document.pending)
+    self.assertEqual(search.searchKeys('SearchTestEntity', 'quick fox'),
+                     [entity.key()])
+
+    self._update()
+
+    self.assertEqual(search.getPendingDocuments(10), [])
+    self.assertEqual(search.searchKeys('SearchTestEntity', 'quick'), [])
+    self.assertEqual(search.searchKeys('SearchTestEntity', 'slow fox'),
+                     [entity.key()])
@@ -0,0 +1,68 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+__authors__ = [
+  '"Daniel Diniz" <ajaksu@gmail.com>',
+  ]
+
+
+import unittest
+
+from google.appengine.api import memcache
+
+from soc.models import survey
+
+
+class SurveyContentTest(unittest.TestCase):
+  """Tests for the schema handling of SurveyContent.
+  """
+
+  def setUp(self):
+    self.schema = {
+        'first': {'type': 'short_answer', 'index': 1},
+        'second': {'type': 'long_answer', 'index': 0},
+        }
+
+  def tearDown(self):
+    memcache.flush_all()
+
+  def testParseSchema(self):
+    """Test that stored schemas are parsed, including legacy ones.
+    """
+
+    dumped = survey.dumpSchema(self.schema)
+    self.assertEqual(self.schema, survey.parseSchema(dumped))
+    self.assertEqual(self.schema, survey.parseSchema(repr(self.schema)))
+    self.assertEqual({}, survey.parseSchema(None))
+
+  def testSurveyOrder(self):
+    """Test that the survey order is computed from the schema.
+    """
+
+    content = survey.SurveyContent()
+    content.first = 'first prompt'
+    content.second = 'second prompt'
+    content.setSchema(self.schema)
+    content.put()
+
+    self.assertEqual({0: 'second', 1: 'first'}, content.getSurveyOrder())
+    self.assertEqual(['second', 'first'], content.orderedProperties())
+
+    # a fresh copy of the entity is served from the cache
+    fetched = survey.SurveyContent.get(content.key())
+    self.assertEqual(self.schema, fetched.getSchema())
+    self.assertEqual(['second', 'first'], fetched.orderedProperties())
@@ -0,0 +1,87 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import unittest
+
+from google.appengine.api import memcache
+
+from soc.profiling import latency
+
+
+class LatencyTest(unittest.TestCase):
+  """Tests for the latency histograms.
+  """
+
+  def setUp(self):
+    """Starts with an empty memcache and nothing left to flush.
+    """
+
+    latency.flush()
+    memcache.flush_all()
+
+  def testGetBucket(self):
+    """Test that latencies fall in the right bucket.
+    """
+
+    self.assertEqual(latency.getBucket(0), 0)
+    self.assertEqual(latency.getBucket(50), 1)
+    self.assertEqual(latency.getBucket(10000), len(latency.DEF_BUCKETS))
+
+  def testGetViewStats(self):
+    """Test that recorded requests are reported slowest view first.
+    """
+
+    for milliseconds in [10, 60, 70, 80, 90, 150, 160, 170, 180, 190]:
+      latency.record('slow/list', milliseconds)
+
+    latency.record('fast/public', 5)
+
+    stats = latency.getViewStats()
+
+    self.assertEqual([i['view'] for i in stats], ['slow/list', 'fast/public'])
+    self.assertEqual(stats[0]['count'], 10)
+    self.assertEqual(stats[0]['mean'], 116)
+    self.assertEqual(stats[0]['p90'], 200)
+    self.assertEqual(stats[0]['histogram'][:3], [1, 4, 5])
+    self.assertEqual(stats[1]['p90'], 50)
+
+  def testRecordIsBuffered(self):
+    """Test that counts only reach memcache when they are flushed.
+    """
+
+    latency.record('user/list', 10)
+    latency.record('user/list', 20)
+
+    bucket_key = 'latency/user/list/0'
+    self.assertEqual(memcache.get(bucket_key), None)
+
+    latency.flush()
+    self.assertEqual(int(memcache.get(bucket_key)), 2)
+
+    # a view that is registered already is not listed twice
+    latency.record('user/list', 30)
+    latency.record('user/edit', 40)
+
+    stats = latency.getViewStats()
+    self.assertEqual(sorted([i['view'] for i in stats]),
+                     ['user/edit', 'user/list'])
+    self.assertEqual(int(memcache.get(latency.DEF_VIEWS_KEY)), 2)
@@ -0,0 +1,99 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import os
+import unittest
+
+from django import http
+from django.conf import settings
+
+from soc.profiling import middleware
+from soc.profiling import rpc
+
+
+class RpcStatsMiddlewareTest(unittest.TestCase):
+  """Tests for the sampling of the RPC accounting.
+  """
+
+  def setUp(self):
+    """Creates the middleware and disables sampling.
+    """
+
+    self.middleware = middleware.RpcStatsMiddleware()
+    self.rate = getattr(settings, 'RPC_STATS_SAMPLE_RATE', 0)
+    self.is_admin = os.environ.get('USER_IS_ADMIN')
+    settings.RPC_STATS_SAMPLE_RATE = 0
+
+  def tearDown(self):
+    """Restores the sample rate and the admin status.
+    """
+
+    rpc.stop()
+    settings.RPC_STATS_SAMPLE_RATE = self.rate
+
+    if self.is_admin is None:
+      os.environ.pop('USER_IS_ADMIN', None)
+    else:
+      os.environ['USER_IS_ADMIN'] = self.is_admin
+
+  def _request(self, get=None):
+    """Returns a request to /test with the specified GET args.
+    """
+
+    request = http.HttpRequest()
+    request.path = '/test'
+    request.GET.update(get or {})
+    return request
+
+  def testNotSampled(self):
+    """Test that requests that are not sampled are not accounted.
+    """
+
+    request = self._request()
+    self.middleware.process_request(request)
+
+    self.assertEqual(rpc.getCurrent(), None)
+
+  def testSampled(self):
+    """Test that sampled requests are accounted.
+    """
+
+    settings.RPC_STATS_SAMPLE_RATE = 1
+
+    request = self._request()
+    self.middleware.process_request(request)
+
+    self.assertEqual(rpc.getCurrent().path, '/test')
+
+  def testRequestedByDeveloper(self):
+    """Test that only developers can have a request accounted.
+    """
+
+    request = self._request({middleware.DEF_FOOTER_ARG: ''})
+
+    os.environ['USER_IS_ADMIN'] = '0'
+    self.middleware.process_request(request)
+    self.assertEqual(rpc.getCurrent(), None)
+
+    os.environ['USER_IS_ADMIN'] = '1'
+    self.middleware.process_request(request)
+    self.assertEqual(rpc.getCurrent().path, '/test')
@@ -0,0 +1,62 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import unittest
+
+from soc.logic.models.user import logic as user_logic
+from soc.profiling import queries
+
+
+class QueriesTest(unittest.TestCase):
+  """Tests for the query statistics.
+  """
+
+  def setUp(self):
+    """Starts without any recorded queries.
+    """
+
+    queries.clearStats()
+
+  def testGetShape(self):
+    """Test that shapes contain the filtered properties but not the values.
+    """
+
+    filter = {'status': ['active', 'new'], 'scope': ['x'], 'link_id >=': 'a'}
+    shape = queries.getShape('Group', filter, ['-link_id'])
+
+    self.assertEqual(shape,
+        'Group(link_id >=, scope =, status IN(2)) order(-link_id)')
+
+  def testRecord(self):
+    """Test that fetches through the logic are aggregated per shape.
+    """
+
+    user_logic.getForFields({'status': 'valid'}, limit=5, offset=10)
+    user_logic.getForFields({'status': 'invalid'}, limit=20)
+
+    stats = queries.getStats()
+
+    self.assertEqual(len(stats), 1)
+    self.assertEqual(stats[0]['shape'], 'User(status =)')
+    self.assertEqual(stats[0]['count'], 2)
+    self.assertEqual(stats[0]['max_limit'], 20)
+    self.assertEqual(stats[0]['max_offset'], 10)
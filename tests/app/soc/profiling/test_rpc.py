@@ -0,0 +1,74 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import unittest
+
+from soc.logic.models.user import logic as user_logic
+from soc.models.user import User
+from soc.profiling import rpc
+
+
+class RpcTest(unittest.TestCase):
+  """Tests for the RPC accounting.
+  """
+
+  def setUp(self):
+    """Registers the accounting hooks.
+    """
+
+    rpc.install()
+
+  def tearDown(self):
+    """Makes sure no accounting continues after the test.
+    """
+
+    rpc.stop()
+
+  def testAccounting(self):
+    """Test that RPCs are counted and attributed to their logic method.
+    """
+
+    stats = rpc.start('/test')
+
+    user_logic.getFromKeyName('nobody')
+    User.get_by_key_name('nobody')
+
+    self.assertEqual(rpc.stop(), stats)
+    self.assertEqual(stats.getCount(), 2)
+    self.assertEqual(stats.calls[('datastore_v3', 'Get')][0], 2)
+
+    caller = 'soc.logic.models.user.getFromKeyName'
+    self.assertEqual(stats.callers[(caller, 'datastore_v3', 'Get')][0], 1)
+    self.assertEqual(
+        stats.callers[(rpc.DEF_UNKNOWN_CALLER, 'datastore_v3', 'Get')][0], 1)
+
+  def testNotAccounting(self):
+    """Test that nothing is recorded outside of a request.
+    """
+
+    stats = rpc.start('/test')
+    rpc.stop()
+
+    User.get_by_key_name('nobody')
+
+    self.assertEqual(stats.getCount(), 0)
+    self.assertEqual(rpc.getCurrent(), None)
@@ -0,0 +1,324 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks the RPC count and wall time of key views.
+
+A synthetic GSoC program is seeded through seed_db at each requested data
+scale, after which each view in DEF_VIEWS is requested through the Django
+test client as a developer, once with an empty memcache (cold) and once
+right after (warm). The RPC counts are compared to DEF_BUDGETS, the run
+fails if any of them is exceeded.
+
+Usage:
+  tests/benchmark.py [--scales=1,10,100] [--seed=0]
+
+The RPC counts do not depend on the machine, so they can be kept in
+DEF_BUDGETS, the wall times are reported only.
+"""
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+  ]
+
+
+import cgi
+import optparse
+import sys
+import time
+
+import run
+
+
+#: The amount of entities of each type seeded at scale 1
+DEF_SCALE_SIZES = {
+    'user': 40,
+    'org': 2,
+    'mentor': 4,
+    'student': 15,
+    'student_proposal': 20,
+    }
+
+#: The types of which the amount does not grow linearly with the scale,
+#: orgs grow with the scale but at least DEF_SCALE_SIZES['org'] exist
+DEF_SUBLINEAR_TYPES = ['org']
+
+#: The views that are benchmarked, the urls are formatted with the names
+#: of the first seeded org, student and proposal
+DEF_VIEWS = [
+    ('home', '/'),
+    ('roles', '/user/roles'),
+    ('list_proposals', '/org/list_proposals/google/gsoc2009/%(org)s'),
+    ('review', '/student_proposal/review/google/gsoc2009/%(student)s/'
+               '%(proposal)s'),
+    ('assign_slots', '/program/assign_slots/google/gsoc2009'),
+    ('slots', '/program/slots/google/gsoc2009'),
+    ('accepted_orgs', '/program/accepted_orgs/google/gsoc2009'),
+    ('survey_take', '/survey/show/program/google/gsoc2009/benchmark'),
+    ('survey_results', '/survey/results/program/google/gsoc2009/benchmark'),
+    ]
+
+#: The maximum amount of RPCs per scale, view and cache state
+DEF_BUDGETS = {
+    1: {
+        ('home', 'cold'): 380,
+        ('home', 'warm'): 30,
+        ('roles', 'cold'): 410,
+        ('roles', 'warm'): 70,
+        ('list_proposals', 'cold'): 440,
+        ('list_proposals', 'warm'): 100,
+        ('review', 'cold'): 400,
+        ('review', 'warm'): 50,
+        ('assign_slots', 'cold'): 370,
+        ('assign_slots', 'warm'): 30,
+        ('slots', 'cold'): 370,
+        ('slots', 'warm'): 20,
+        ('accepted_orgs', 'cold'): 390,
+        ('accepted_orgs', 'warm'): 30,
+        ('survey_take', 'cold'): 390,
+        ('survey_take', 'warm'): 40,
+        ('survey_results', 'cold'): 390,
+        ('survey_results', 'warm'): 40,
+        },
+    10: {
+        ('home', 'cold'): 380,
+        ('home', 'warm'): 30,
+        ('roles', 'cold'): 410,
+        ('roles', 'warm'): 70,
+        ('list_proposals', 'cold'): 480,
+        ('list_proposals', 'warm'): 130,
+        ('review', 'cold'): 400,
+        ('review', 'warm'): 50,
+        ('assign_slots', 'cold'): 370,
+        ('assign_slots', 'warm'): 30,
+        ('slots', 'cold'): 370,
+        ('slots', 'warm'): 20,
+        ('accepted_orgs', 'cold'): 390,
+        ('accepted_orgs', 'warm'): 30,
+        ('survey_take', 'cold'): 390,
+        ('survey_take', 'warm'): 40,
+        ('survey_results', 'cold'): 390,
+        ('survey_results', 'warm'): 40,
+        },
+    100: {
+        ('home', 'cold'): 380,
+        ('home', 'warm'): 30,
+        ('roles', 'cold'): 410,
+        ('roles', 'warm'): 70,
+        ('list_proposals', 'cold'): 480,
+        ('list_proposals', 'warm'): 130,
+        ('review', 'cold'): 400,
+        ('review', 'warm'): 50,
+        ('assign_slots', 'cold'): 370,
+        ('assign_slots', 'warm'): 30,
+        ('slots', 'cold'): 370,
+        ('slots', 'warm'): 20,
+        ('accepted_orgs', 'cold'): 390,
+        ('accepted_orgs', 'warm'): 30,
+        ('survey_take', 'cold'): 390,
+        ('survey_take', 'warm'): 40,
+        ('survey_results', 'cold'): 390,
+        ('survey_results', 'warm'): 40,
+        },
+    }
+
+
+def getSizes(scale):
+  """Returns the amount of entities of each type seeded at scale.
+  """
+
+  sizes = {}
+
+  for seed_type, size in DEF_SCALE_SIZES.iteritems():
+    if seed_type in DEF_SUBLINEAR_TYPES:
+      sizes[seed_type] = max(size, scale)
+    else:
+      sizes[seed_type] = size * scale
+
+  return sizes
+
+
+def follow(client, path, data=None):
+  """Requests path and follows the redirects the response leads to.
+  """
+
+  response = client.get(path, data or {})
+
+  while response.status_code == 302:
+    location = response['Location']
+    path, _, query = location.partition('?')
+    data = dict((k, v[0]) for k, v in cgi.parse_qs(query).iteritems())
+    response = client.get(path.replace('http://testserver', ''), data)
+
+  return response
+
+
+def seed(client, scale, seed_value):
+  """Seeds the datastore with a synthetic program at the specified scale.
+  """
+
+  from soc.models.survey import Survey
+  from soc.models.survey import SurveyContent
+  from soc.models.survey_record import SurveyRecord
+  from soc.models.user import User
+
+  follow(client, '/clear_db')
+  follow(client, '/seed_db')
+
+  args = dict((k, str(v)) for k, v in getSizes(scale).iteritems())
+  args['seed'] = str(seed_value)
+
+  response = follow(client, '/seed_scenario', args)
+
+  if response.content != 'Done.':
+    raise Exception('Seeding failed: %s' % response.content)
+
+  # a survey the students have taken
+  author = User.get_by_key_name('test')
+  content = SurveyContent(question='What do you think?')
+  content.setSchema({'question': {'type': 'long_answer', 'index': 0}})
+  content.put()
+
+  survey = Survey(key_name='program/google/gsoc2009/benchmark',
+                  link_id='benchmark', scope_path='google/gsoc2009',
+                  prefix='program', author=author, modified_by=author,
+                  title='Benchmark Survey', short_name='Benchmark',
+                  taking_access='user', read_access='user',
+                  survey_content=content)
+  survey.put()
+
+  records = []
+
+  for i in range(getSizes(scale)['student']):
+    user = User.get_by_key_name('scale_user_%d' % (
+        getSizes(scale)['mentor'] + i))
+    records.append(SurveyRecord(user=user, survey=survey,
+                                question='Answer %d' % i))
+
+  from google.appengine.ext import db
+  db.put(records)
+
+  # the records were stored directly, count them like the rebuild job does
+  from soc.cron import survey_aggregator
+  from soc.logic.models.survey_aggregate import logic as aggregate_logic
+
+  job = aggregate_logic.startRebuild(survey, SurveyRecord.kind())
+  survey_aggregator.rebuildSurveyAggregate(job)
+
+
+def measure(client, url):
+  """Requests url and returns the RPC count and wall time in milliseconds.
+  """
+
+  from soc.profiling import rpc
+
+  start = time.time()
+  response = client.get(url)
+  milliseconds = (time.time() - start) * 1000
+
+  if response.status_code != 200:
+    raise Exception('Requesting %s failed with status %d' % (
+        url, response.status_code))
+
+  return rpc.getLast().getCount(), milliseconds
+
+
+def benchmark(scale, seed_value):
+  """Runs the benchmark at the specified scale.
+
+  Returns:
+    A list of (view, cache state, rpc count, milliseconds) tuples.
+  """
+
+  from django.test import client
+
+  from google.appengine.api import memcache
+
+  browser = client.Client()
+  seed(browser, scale, seed_value)
+
+  names = {
+      'org': 'scale_org_0',
+      'student': 'scale_student_0',
+      'proposal': 'scale_proposal_0',
+      }
+
+  results = []
+
+  for view, url in DEF_VIEWS:
+    url = url % names
+
+    memcache.flush_all()
+    count, milliseconds = measure(browser, url)
+    results.append((view, 'cold', count, milliseconds))
+
+    count, milliseconds = measure(browser, url)
+    results.append((view, 'warm', count, milliseconds))
+
+  return results
+
+
+def main():
+  parser = optparse.OptionParser(usage=__doc__)
+  parser.add_option('--scales', default='1,10,100',
+                    help='comma separated list of data scales')
+  parser.add_option('--seed', default=0, type='int',
+                    help='the value the seeded data is derived from')
+  options, _ = parser.parse_args()
+
+  run.setup()
+
+  import os
+  os.environ['USER_IS_ADMIN'] = '1'
+
+  from django.conf import settings
+  settings.PROFILE_SAMPLE_RATE = 0
+  # the RPCs of every request are counted
+  settings.RPC_STATS_SAMPLE_RATE = 1
+
+  from soc.modules import callback
+  from soc.modules import core
+
+  callback.registerCore(core.Core())
+  callback.getCore().registerModuleCallbacks()
+
+  failures = []
+
+  for scale in [int(i) for i in options.scales.split(',')]:
+    budgets = DEF_BUDGETS.get(scale, {})
+
+    for view, state, count, milliseconds in benchmark(scale, options.seed):
+      budget = budgets.get((view, state))
+      line = '%4dx %-16s %-5s %5d RPCs %8dms' % (
+          scale, view, state, count, milliseconds)
+
+      if budget is not None:
+        line += ' (budget %d)' % budget
+
+        if count > budget:
+          line += ' OVER BUDGET'
+          failures.append(line)
+
+      print line
+
+  if failures:
+    print
+    print '%d views exceeded their RPC budget:' % len(failures)
+    print '\n'.join(failures)
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
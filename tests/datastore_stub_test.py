@@ -0,0 +1,205 @@
+#!/usr/bin/python2.5
+#
+# Copyright 2009 the Melange authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the scripts.datastore_stub module.
+"""
+
+__authors__ = [
+  '"Sverre Rabbelier" <sverre@rabbelier.nl>',
+]
+
+
+import datetime
+import os
+import random
+import tempfile
+import unittest
+
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import datastore_file_stub
+from google.appengine.ext import db
+
+from scripts import datastore_stub
+
+
+class StubTestEntity(db.Model):
+  """Model used to compare the datastore stubs.
+  """
+
+  name = db.StringProperty()
+  count = db.IntegerProperty()
+  tags = db.StringListProperty()
+  created = db.DateTimeProperty()
+  other = db.SelfReferenceProperty()
+
+
+QUERIES = [
+    lambda q: q,
+    lambda q: q.filter('count =', 3),
+    lambda q: q.filter('count >', 3).filter('count <=', 7),
+    lambda q: q.filter('count >=', 5).order('-count'),
+    lambda q: q.order('name'),
+    lambda q: q.order('-created').order('name'),
+    lambda q: q.filter('name =', 'name_2').order('-count'),
+    lambda q: q.filter('tags =', 'b').order('count'),
+    lambda q: q.filter('tags =', 'a').filter('tags =', 'c'),
+    lambda q: q.order('tags'),
+    lambda q: q.order('-tags'),
+    lambda q: q.filter('count IN', [1, 4, 8]),
+    lambda q: q.filter('count !=', 4),
+    lambda q: q.filter('__key__ >', db.Key.from_path('StubTestEntity',
+                                                     'entity_20')),
+    lambda q: q.order('-__key__'),
+    lambda q: q.filter('other =', db.Key.from_path('StubTestEntity',
+                                                   'entity_3')),
+    lambda q: q.filter('created <', datetime.datetime(2009, 1, 15)),
+    lambda q: q.ancestor(db.Key.from_path('StubTestEntity', 'entity_1')),
+    ]
+
+
+class DatastoreStubTest(unittest.TestCase):
+  """Tests that the IndexedDatastoreStub answers queries like the file stub.
+  """
+
+  def setUp(self):
+    """Replaces the API proxy so that the stubs can be swapped.
+    """
+
+    self.apiproxy = apiproxy_stub_map.apiproxy
+
+  def tearDown(self):
+    """Restores the API proxy.
+    """
+
+    apiproxy_stub_map.apiproxy = self.apiproxy
+
+  def _use(self, stub):
+    """Makes the datastore API use stub.
+    """
+
+    apiproxy_stub_map.apiproxy = apiproxy_stub_map.APIProxyStubMap()
+    apiproxy_stub_map.apiproxy.RegisterStub('datastore', stub)
+
+  def _seed(self):
+    """Stores the same pseudo random entities in the current stub.
+    """
+
+    rand = random.Random(0)
+    entities = []
+
+    for i in range(60):
+      parent = None
+      if i >= 50:
+        parent = db.Key.from_path('StubTestEntity', 'entity_1')
+
+      other = db.Key.from_path('StubTestEntity',
+                               'entity_%d' % rand.randint(0, 5))
+      created = datetime.datetime(2009, 1, 1) + datetime.timedelta(
+          days=rand.randint(0, 30))
+      tags = rand.sample(['a', 'b', 'c', 'd'], rand.randint(0, 3))
+
+      entities.append(StubTestEntity(
+          key_name='entity_%d' % i, parent=parent, name='name_%d' % (i % 7),
+          count=rand.randint(0, 9), tags=tags, created=created, other=other))
+
+    db.put(entities)
+
+  def _runQueries(self):
+    """Returns the results of all QUERIES as lists of keys.
+    """
+
+    result = []
+
+    for make_query in QUERIES:
+      query = make_query(StubTestEntity.all())
+      result.append(([i.key() for i in query.fetch(1000)], query.count(),
+                     [i.key() for i in query.fetch(5, offset=3)]))
+
+    return result
+
+  def testQueriesMatchFileStub(self):
+    """Tests that both stubs return the same results in the same order.
+    """
+
+    self._use(datastore_file_stub.DatastoreFileStub('test-app-run',
+                                                    None, None))
+    self._seed()
+    expected = self._runQueries()
+
+    self._use(datastore_stub.IndexedDatastoreStub('test-app-run'))
+    self._seed()
+    actual = self._runQueries()
+
+    for query, (want, got) in enumerate(zip(expected, actual)):
+      self.assertEqual(want, got, 'query %d differs' % query)
+
+  def testUpdateAndDelete(self):
+    """Tests that the indexes follow updates and deletes.
+    """
+
+    self._use(datastore_stub.IndexedDatastoreStub('test-app-run'))
+    self._seed()
+
+    entity = StubTestEntity.get_by_key_name('entity_0')
+    entity.count = 42
+    entity.put()
+
+    query = StubTestEntity.all().filter('count =', 42)
+    self.assertEqual([entity.key()], [i.key() for i in query])
+
+    entity.delete()
+    self.assertEqual([], query.fetch(10))
+    self.assertEqual(59, StubTestEntity.all().count())
+
+  def testRollback(self):
+    """Tests that changes in a failed transaction are not indexed.
+    """
+
+    self._use(datastore_stub.IndexedDatastoreStub('test-app-run'))
+    self._seed()
+
+    def txn():
+      entity = StubTestEntity.get_by_key_name('entity_0')
+      entity.count = 42
+      entity.put()
+      raise db.Rollback()
+
+    db.run_in_transaction(txn)
+
+    self.assertEqual(0, StubTestEntity.all().filter('count =', 42).count())
+
+  def testPersistence(self):
+    """Tests that the entities are stored in and loaded from sqlite.
+    """
+
+    handle, path = tempfile.mkstemp()
+    os.close(handle)
+
+    try:
+      self._use(datastore_stub.IndexedDatastoreStub('test-app-run', path))
+      self._seed()
+      StubTestEntity.get_by_key_name('entity_0').delete()
+      first = StubTestEntity(name='first').put()
+      expected = self._runQueries()
+
+      self._use(datastore_stub.IndexedDatastoreStub('test-app-run', path))
+      self.assertEqual(expected, self._runQueries())
+
+      # new ids continue after the ones that were stored
+      second = StubTestEntity(name='second').put()
+      self.assertTrue(second.id() > first.id())
+    finally:
+      os.remove(path)
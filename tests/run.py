@@ -58,7 +58,10 @@ class AppEngineDatastoreClearPlugin(plugins.Plugin):
       datastore.Clear()
 
 
-def main():
+def setup():
+  """Sets up the paths, environment and API stubs the tests run with.
+  """
+
   sys.path = extra_paths + sys.path
   os.environ['SERVER_SOFTWARE'] = 'Development via nose'
   os.environ['SERVER_NAME'] = 'Foo'
@@ -69,24 +72,28 @@ def main():
   os.environ['HTTP_HOST'] = 'some.testing.host.tld'
   import main as app_main
   from google.appengine.api import apiproxy_stub_map
-  from google.appengine.api import datastore_file_stub
   from google.appengine.api import mail_stub
   from google.appengine.api import user_service_stub
   from google.appengine.api import urlfetch_stub
   from google.appengine.api.memcache import memcache_stub
+  from scripts import datastore_stub
   apiproxy_stub_map.apiproxy = apiproxy_stub_map.APIProxyStubMap()
   apiproxy_stub_map.apiproxy.RegisterStub('urlfetch',
                                           urlfetch_stub.URLFetchServiceStub())
   apiproxy_stub_map.apiproxy.RegisterStub('user',
                                           user_service_stub.UserServiceStub())
   apiproxy_stub_map.apiproxy.RegisterStub('datastore',
-    datastore_file_stub.DatastoreFileStub('test-app-run', None, None))
+    datastore_stub.IndexedDatastoreStub('test-app-run'))
   apiproxy_stub_map.apiproxy.RegisterStub('memcache',
     memcache_stub.MemcacheServiceStub())
   apiproxy_stub_map.apiproxy.RegisterStub('mail', mail_stub.MailServiceStub())
   import django.test.utils
   django.test.utils.setup_test_environment()
 
+
+def main():
+  setup()
+
   from nose.plugins import cover
   plugin = cover.Coverage()
   nose.main(plugins=[AppEngineDatastoreClearPlugin(), plugin])